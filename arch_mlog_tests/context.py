@@ -1,11 +1,12 @@
 import sys
 import os
 import unittest
-import tempfile
 from mlog_arithmetic_runner import MlogProcessor
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 mlogevo = __import__("mlogevo")
+from mlogevo.backend.control_flow_graph import ControlFlowGraph
+from mlogevo.intermediate import TextQuadrupleParser
 mlogevo_main = __import__("mlogevo.__main__").__main__.main
 module_abspath = os.path.abspath(os.path.dirname(__file__))
 run_limit = 1000000
@@ -29,46 +30,74 @@ def parse_expected_results(filename: str) -> dict:
 
 
 # These tests can run in parallel
-def compile_and_test(self:unittest.TestCase, source_filename: str, basic_argv: list):
+def compile_and_test(self:unittest.TestCase, source_filename: str, options: "mlogevo.CompileOptions"):
     expected_results = parse_expected_results(source_filename)
     runner = MlogProcessor(memory_cells=8)
-    try:
-        fd, mlog_output_file = tempfile.mkstemp()
-        argv = basic_argv + ["-o", mlog_output_file, source_filename]
-        # TODO: compilation & emulation is done in main thread/process, consider moving it out
-        mlogevo_main(argv)
-        with os.fdopen(fd, "r") as f:
-            runner.assemble_code(f.read())
-            runner.run_with_limit(run_limit)
-        for (variable, (vtype, value)) in expected_results.items():
-            runner_result = runner.get_variable(variable) or 0.0
-            if vtype in ("double", "float"):
-                self.assertAlmostEqual(
-                    runner_result, value,
-                    places=6,
-                    msg=f"{source_filename}: value of `{variable}` should be `{value:.8f}`, got `{runner_result:.8f}` "
-                        f"(difference {abs(runner_result-value):.8f} >= 1e-6) "
-                )
-            else:
-                self.assertEqual(
-                    runner_result, value,
-                    msg=f"{source_filename}: value of `{variable}` should be `{value}`, got `{runner_result}`"
-                )
-    finally:
-        os.remove(mlog_output_file)
+    # TODO: compilation & emulation is done in main thread/process, consider moving it out
+    with open(source_filename, "r") as f:
+        result = mlogevo.compile_source(f, options)
+    runner.assemble_code(result.output)
+    runner.run_with_limit(run_limit)
+    for (variable, (vtype, value)) in expected_results.items():
+        runner_result = runner.get_variable(variable) or 0.0
+        if vtype in ("double", "float"):
+            self.assertAlmostEqual(
+                runner_result, value,
+                places=6,
+                msg=f"{source_filename}: value of `{variable}` should be `{value:.8f}`, got `{runner_result:.8f}` "
+                    f"(difference {abs(runner_result-value):.8f} >= 1e-6) "
+            )
+        else:
+            self.assertEqual(
+                runner_result, value,
+                msg=f"{source_filename}: value of `{variable}` should be `{value}`, got `{runner_result}`"
+            )
 
 
-def make_lambda(src_abspath, basic_argv):
+def run(optimizer, lines, machine_dependents=(), block_counts=None, function_name="f"):
+    """Run an optimizer over the IR lines of a function, returns the lines it leaves and its changes"""
+    graph = ControlFlowGraph(TextQuadrupleParser().parse(lines), machine_dependents, block_counts=block_counts)
+    changes = optimizer(graph, function_name, {}, {})
+    return [ir.dump() for ir in graph.instructions()], changes
+
+
+def compile_and_run(source: str, names, options: "mlogevo.CompileOptions", limit: int = run_limit):
+    """Compile source and run it, returns the compilation result, the values of names and the processor"""
+    result = mlogevo.compile_source(source, options)
+    runner = MlogProcessor()
+    runner.assemble_code(result.output)
+    runner.run_with_limit(limit)
+    return result, [runner.get_variable(name) for name in names], runner
+
+
+def counted_loop(body, before=(), after=(), bound="10"):
+    """IR of f() around `for (i = 0; i < bound; i++) { body }`"""
+    return [
+        "__funcbegin f default",
+        *before,
+        "set_i32 0 _i@f",
+        "goto COND",
+        ":LOOP",
+        *body,
+        "add_i32 _i@f 1 _i@f",
+        ":COND",
+        f"if _i@f lt_i32 {bound} goto LOOP",
+        *after,
+        "__funcend f",
+    ]
+
+
+def make_lambda(src_abspath, options):
     # https://stackoverflow.com/questions/19837486/lambda-in-a-loop
-    return lambda that: compile_and_test(that, src_abspath, basic_argv)
+    return lambda that: compile_and_test(that, src_abspath, options)
 
 
-def inject_class(target_class, basic_argv: list):
+def inject_class(target_class, options: "mlogevo.CompileOptions"):
     sources_dir = os.path.join(module_abspath, "sources")
     for root, dirs, files in os.walk(sources_dir):
         for filename in files:
             src_abspath = os.path.abspath(os.path.join(root, filename))
             base = os.path.splitext(filename)[0]
             setattr(target_class, "test_" + base,
-                    make_lambda(src_abspath, basic_argv)
+                    make_lambda(src_abspath, options)
             )
\ No newline at end of file
@@ -0,0 +1,60 @@
+/*
+ * This is part of the MlogEvo test suite
+ * intended for mlog architecture
+ *
+ * Constants known at compile time, through branches and loops (see -fsccp)
+ *
+ * Expected results:
+ * int quotient = 6
+ * int remainder = 4
+ * int bits = 23
+ * int taken = 100
+ * int loop_sum = 21
+ * double quarter = 0.25
+ * int debug = 0
+ * int forever = 5
+ */
+
+#define DEBUG 0
+
+int quotient, remainder, bits, taken, loop_sum, debug, forever;
+double quarter;
+
+void main() {
+    int a = 7;
+    int b = a * 3 - 1;
+    if (b > 10) {
+        quotient = b / 3;
+    } else {
+        quotient = 100;
+    }
+    if (a == 7) {
+        taken = 100;
+    } else {
+        taken = -100;
+    }
+    remainder = b % 8;
+    bits = (1 << 4) | a;
+    quarter = 1.0 / 4;
+    loop_sum = 0;
+    for (int i = 0; i < 3; i++) {
+        loop_sum = loop_sum + a;
+    }
+    debug = 0;
+    if (DEBUG) {
+        debug = 99;
+    }
+    if (0) {
+        debug = debug * 3;
+    }
+    forever = 0;
+    while (1) {
+        forever = forever + 1;
+        if (forever == 5) {
+            break;
+        }
+    }
+    // MlogArithmeticRunner stops on self-loop
+Foo:
+    goto Foo;
+}
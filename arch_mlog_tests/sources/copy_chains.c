@@ -0,0 +1,71 @@
+/*
+ * This is part of the MlogEvo test suite
+ * intended for mlog architecture
+ *
+ * Variables copied around in loops and across branches (see -fcopy-propagation)
+ *
+ * Expected results:
+ * int fib = 6765
+ * int gcd_result = 21
+ * int rotated = 14
+ * int doubled = 204
+ * int partial = 12
+ */
+
+int fib, gcd_result, rotated, doubled, partial;
+
+int accumulate(int v) {
+    int w = v;
+    int acc = 0;
+    for (int k = 0; k < 4; k++) {
+        int tmp = w;
+        acc = acc + tmp;
+        int copy = acc;
+        partial = copy;
+    }
+    return acc;
+}
+
+void main() {
+    int a = 0, b = 1;
+    for (int i = 0; i < 20; i++) {
+        int t = a + b;
+        a = b;
+        b = t;
+    }
+    fib = a;
+
+    int x = 1071, y = 462;
+    while (y != 0) {
+        int r = x % y;
+        x = y;
+        y = r;
+    }
+    gcd_result = x;
+
+    int c = 1, d = 2;
+    for (int i = 0; i < 3; i++) {
+        int t = c + d;
+        c = d * 2;
+        d = t;
+    }
+    rotated = c;
+
+    partial = 0;
+    int s = 3;
+    int u = s;
+    int q;
+    if (partial > 0) {
+        q = u;
+    } else {
+        q = u;
+    }
+    while (q < 100) {
+        int p = q;
+        q = p * 2;
+    }
+    doubled = q + accumulate(u);
+    // MlogArithmeticRunner stops on self-loop
+Foo:
+    goto Foo;
+}
@@ -0,0 +1,53 @@
+/*
+ * This is part of the MlogEvo test suite
+ * intended for mlog architecture
+ *
+ * break leaves the innermost loop, skipping the rest of its iterations
+ *
+ * Expected results:
+ * int while_count = 5
+ * int for_sum = 10
+ * int do_count = 3
+ * int inner = 6
+ */
+
+int while_count, for_sum, do_count, inner;
+
+void main() {
+    while_count = 0;
+    while (1) {
+        while_count = while_count + 1;
+        if (while_count == 5) {
+            break;
+        }
+    }
+
+    for_sum = 0;
+    for (int i = 0; i < 100; i++) {
+        if (i == 5) {
+            break;
+        }
+        for_sum = for_sum + i;
+    }
+
+    do_count = 0;
+    do {
+        do_count = do_count + 1;
+        if (do_count >= 3) {
+            break;
+        }
+    } while (do_count < 10);
+
+    inner = 0;
+    for (int i = 0; i < 3; i++) {
+        for (int j = 0; j < 10; j++) {
+            if (j == 2) {
+                break;
+            }
+            inner = inner + 1;
+        }
+    }
+    // MlogArithmeticRunner stops on self-loop
+Foo:
+    goto Foo;
+}
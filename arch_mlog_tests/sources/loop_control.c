@@ -0,0 +1,51 @@
+/*
+ * This is part of the MlogEvo test suite
+ * intended for mlog architecture
+ *
+ * break, continue and chains of if/else (see -fsimplify-cfg)
+ *
+ * Expected results:
+ * int evens = 20
+ * int odds = 25
+ * int found = 15
+ * int clipped = 21
+ */
+
+int evens, odds, found, clipped;
+
+int clip(int v) {
+    if (v > 10) {
+        return 10;
+    } else if (v < 0) {
+        return 0;
+    }
+    return v;
+}
+
+void main() {
+    evens = 0; odds = 0; found = -1; clipped = 0;
+    for (int i = 0; i < 10; i++) {
+        if (i % 2 == 0) {
+            evens = evens + i;
+        } else {
+            odds = odds + i;
+        }
+    }
+    int j = 0;
+    while (1) {
+        j = j + 3;
+        if (j > 20) {
+            break;
+        }
+        if (j % 5 == 0) {
+            found = j;
+            continue;
+        }
+    }
+    for (int k = -5; k < 20; k += 7) {
+        clipped = clipped + clip(k);
+    }
+    // MlogArithmeticRunner stops on self-loop
+Foo:
+    goto Foo;
+}
@@ -0,0 +1,120 @@
+/*
+ * This is part of the MlogEvo test suite
+ * intended for mlog architecture
+ *
+ * switch: jump tables, binary search, fall through, default, break and continue
+ *
+ * Expected results:
+ * int table = 2095
+ * int ops = 106121
+ * int classes = 354321
+ * int duff = 7
+ * int nested = 8326
+ * int defaults = 9
+ * int negatives = 410631
+ */
+
+int table, ops, classes, duff, nested, defaults, negatives;
+
+int apply(int op, int a, int b) {
+    switch (op) {
+    case 0: return a + b;
+    case 1: return a - b;
+    case 2: return a * b;
+    case 3: return a / b;
+    case 4: return a % b;
+    }
+    return 0;
+}
+
+int classify(int c) {
+    switch (c) {
+    case (1 << 3) + 2: return 1;
+    case 11: case 12: case 13: return 2;
+    default: return 3;
+    case 15: return 4;
+    case 16: break;
+    case -1000: return 6;
+    case 100000: return 7;
+    }
+    return 5;
+}
+
+int around_zero(int v) {
+    switch (v) {
+    case -3: return 1;
+    case -2: return 2;
+    case -1: return 3;
+    case 0: return 4;
+    case 1: return 5;
+    case 2: return 6;
+    case 3: return 7;
+    }
+    return 0;
+}
+
+int sparse(int v) {
+    switch (v) {
+    case -7: return 1;
+    case 3: return 2;
+    case 5: return 3;
+    case 8: return 4;
+    default: return 9;
+    }
+}
+
+void main() {
+    for (int i = 0; i < 8; i++) {
+        switch (i) {
+        case 0: table += 1; break;
+        case 1: table += 2; break;
+        case 2: table += 4; break;
+        case 3: table += 8; break;
+        case 4: table += 16;
+        case 5: table += 32; break;
+        default: table += 1000;
+        }
+    }
+    for (int i = 0; i < 5; i++) {
+        ops = ops * 10 + apply(i, 7, 3);
+    }
+    classes = classify(10) + classify(12) * 10 + classify(14) * 100 + classify(15) * 1000
+        + classify(16) * 10000 + classify(-5) * 100000;
+
+    // Duff's device
+    int n = 7;
+    int count = (n + 3) / 4;
+    switch (n % 4) {
+    case 0: do { duff++;
+    case 3:      duff++;
+    case 2:      duff++;
+    case 1:      duff++;
+            } while (--count > 0);
+    }
+
+    for (int i = 0; i < 3; i++) {
+        for (int j = 0; j < 3; j++) {
+            switch (i) {
+            case 0:
+                switch (j) { case 0: nested += 1; break; case 1: nested += 2; break; default: nested += 3; }
+                break;
+            case 1:
+                if (j == 1) continue;
+                nested += 10;
+                break;
+            case 2:
+                nested += 100;
+            }
+            nested += 1000;
+        }
+    }
+
+    negatives = around_zero(-3) + around_zero(-1) * 10 + around_zero(2) * 100 + around_zero(-4) * 1000
+        + sparse(-7) * 10000 + sparse(8) * 100000;
+
+    switch (table) { }
+    switch (table) { default: defaults = 9; }
+    // MlogArithmeticRunner stops on self-loop
+Foo:
+    goto Foo;
+}
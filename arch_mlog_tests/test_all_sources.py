@@ -3,11 +3,9 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
 from context import inject_class
+from mlogevo import CompileOptions
 
-mlogevo_arg = "-march=mlog -mtarget=mlog -I./MlogEvo-stdlib/include"
-mlogevo_basic_argv = mlogevo_arg.split()
-mlogevo_opt1_argv = mlogevo_basic_argv + ["-O1", ]
-mlogevo_opt2_argv = mlogevo_basic_argv + ["-O2", ]
+include_dirs = ["./MlogEvo-stdlib/include", ]
 
 
 class AutogeneratedOptLevel0Test(unittest.TestCase):
@@ -22,8 +20,24 @@ Don't worry, we will "inject" test cases later.
     pass
 
 
-inject_class(AutogeneratedOptLevel0Test, mlogevo_basic_argv + ["-O0", ])
-inject_class(AutogeneratedOptLevel1Test, mlogevo_opt1_argv)
+class AutogeneratedOptLevel2Test(unittest.TestCase):
+    pass
+
+
+class AutogeneratedOptLevel3Test(unittest.TestCase):
+    pass
+
+
+class AutogeneratedBuiltinPreprocessorTest(unittest.TestCase):
+    pass
+
+
+inject_class(AutogeneratedOptLevel0Test, CompileOptions(optimize_level=0, include_dirs=include_dirs))
+inject_class(AutogeneratedOptLevel1Test, CompileOptions(optimize_level=1, include_dirs=include_dirs))
+inject_class(AutogeneratedOptLevel2Test, CompileOptions(optimize_level=2, include_dirs=include_dirs))
+inject_class(AutogeneratedOptLevel3Test, CompileOptions(optimize_level=3, include_dirs=include_dirs))
+inject_class(AutogeneratedBuiltinPreprocessorTest,
+             CompileOptions(optimize_level=1, include_dirs=include_dirs, preprocessor="builtin"))
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,78 @@
+import io
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import module_abspath
+from mlogevo import CompileOptions, compile_source
+from mlogevo.frontend import CompilationError
+
+source_file = os.path.join(module_abspath, "sources", "lcse_test_1.c")
+
+
+class CompileSourceTest(unittest.TestCase):
+    def test_text_and_file_object(self):
+        with open(source_file) as f:
+            source_text = f.read()
+        options = CompileOptions(preprocessor="builtin")
+        from_text = compile_source(source_text, options, filename=source_file)
+        from_file = compile_source(io.StringIO(source_text), options)
+        self.assertEqual(from_text.output, from_file.output)
+        self.assertEqual(from_text.stats["optimized_instructions"], len(from_text.ir))
+        for stage in ("preprocess", "parse", "optimize", "output"):
+            self.assertIn(stage + "_seconds", from_text.stats)
+
+    def test_ir_round_trip(self):
+        options = CompileOptions(optimize_level=0, preprocessor="builtin")
+        with open(source_file) as f:
+            mlog = compile_source(f, options).output
+        with open(source_file) as f:
+            ir_text = compile_source(f, CompileOptions(optimize_level=0, preprocessor="builtin",
+                                                       target="mlogev_ir")).output
+        self.assertEqual(compile_source(ir_text, CompileOptions(optimize_level=0, language="mlogev_ir")).output,
+                         mlog)
+
+    def test_diagnostics_use_filename(self):
+        with self.assertRaises(CompilationError) as context:
+            compile_source("void main() {\n  y = 1;\n}\n", filename="editor.c")
+        self.assertTrue(str(context.exception.error_info["coord"]).startswith("editor.c:2"))
+
+
+def make_program(first_body: str) -> str:
+    functions = []
+    for i in range(4):
+        body = first_body if i == 0 else ""
+        body += f"if (x > {i}) {{ y{i} = x + {i}; }} else {{ y{i} = x * 2; }}\n"
+        functions.append(f"int y{i};\nvoid f{i}(int x) {{\n{body}}}\n")
+    calls = "".join(f"f{i}({i});\n" for i in range(4))
+    return "".join(functions) + f"void main() {{\n{calls}}}\n"
+
+
+class IncrementalCompileTest(unittest.TestCase):
+    def test_only_changed_function_is_optimized(self):
+        options = CompileOptions(preprocessor="builtin")
+        backend = options.make_backend()
+        backend.enable_function_cache()
+        compile_source(make_program(""), options, backend=backend)
+        self.assertEqual(backend.function_cache.misses, 5)
+
+        # the new if statement renames labels of every following function
+        edited = make_program("if (x < 0) { y0 = 1; }\n")
+        result = compile_source(edited, options, backend=backend)
+        self.assertEqual(backend.function_cache.misses, 1)
+        self.assertEqual(result.output, compile_source(edited, options).output)
+
+
+class ParallelOptimizeTest(unittest.TestCase):
+    def test_output_is_identical(self):
+        source = make_program("if (x < 0) { y0 = 1; }\n")
+        serial = compile_source(source, CompileOptions(preprocessor="builtin"))
+        options = CompileOptions(preprocessor="builtin", machine_independents=["parallel-optimize=2"])
+        backend = options.make_backend()
+        self.assertEqual(backend.parallel_optimize, 2)
+        self.assertEqual(compile_source(source, options, backend=backend).output, serial.output)
+        backend.optimize_pool.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
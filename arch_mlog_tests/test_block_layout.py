@@ -0,0 +1,184 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import compile_and_run, run
+from mlogevo import CompileOptions
+from mlogevo.backend.control_flow_graph import ControlFlowGraph
+from mlogevo.intermediate import TextQuadrupleParser
+from mlogevo.optimizer import Changes
+from mlogevo.optimizer.mi_block_layout import instrument_blocks, read_profile, reorder_blocks
+
+# 0: entry, 1: loop condition, 2: branch, 3: then, 4: else, 5: join, 6: exit
+BRANCH_IN_LOOP = [
+    "__funcbegin f default",
+    "set_i32 0 _i@f",
+    ":LOOP",
+    "ifnot _i@f lt_i32 100 goto END",
+    "ifnot _i@f gt_i32 90 goto ELSE",
+    "add_i32 _a@f 1 _a@f",
+    "goto JOIN",
+    ":ELSE",
+    "add_i32 _b@f 1 _b@f",
+    ":JOIN",
+    "add_i32 _i@f 1 _i@f",
+    "goto LOOP",
+    ":END",
+    "__funcend f",
+]
+
+HOT_LOOP = """\
+int hits, misses;
+void main() {
+    hits = 0; misses = 0;
+    for (int i = 0; i < 100; i++) {
+        if (i % 10 != 0) {
+            hits = hits + 1;
+        } else {
+            misses = misses + 1;
+        }
+    }
+Foo:
+    goto Foo;
+}
+"""
+
+
+SWITCH_IN_LOOP = """\
+int total;
+void main() {
+    total = 0;
+    for (int i = 0; i < 50; i++) {
+        switch (i % 8) {
+        case 0: total = total + 1; break;
+        case 1: total = total + 2; break;
+        case 2: total = total + 3;
+        case 3: total = total + 4; break;
+        case 4: total = total * 2; break;
+        case 5: total = total - 5; break;
+        case 6: total = total + 6; break;
+        }
+    }
+Foo:
+    goto Foo;
+}
+"""
+
+
+class ReorderBlocksTest(unittest.TestCase):
+    def test_source_order_without_profile(self):
+        # both branches are as likely
+        lines = [
+            "__funcbegin f default",
+            "ifnot _x@f gt_i32 0 goto ELSE",
+            "set_i32 1 _a@f",
+            "goto JOIN",
+            ":ELSE",
+            "set_i32 2 _a@f",
+            ":JOIN",
+            "set_i32 _a@f result@f",
+            "__funcend f",
+        ]
+        result, changes = run(reorder_blocks, lines)
+        self.assertEqual(result, lines)
+        self.assertEqual(changes, Changes.NONE)
+
+    def test_loop_rotation(self):
+        # the jump back to the condition goes away, a jump to it is made once at entry
+        result, changes = run(reorder_blocks, BRANCH_IN_LOOP)
+        self.assertEqual(changes, Changes.ALL)
+        self.assertEqual(result, [
+            "__funcbegin f default",
+            "set_i32 0 _i@f",
+            "goto LOOP",
+            ":ELSE",
+            "add_i32 _b@f 1 _b@f",
+            ":JOIN",
+            "add_i32 _i@f 1 _i@f",
+            ":LOOP",
+            "ifnot _i@f lt_i32 100 goto END",
+            "ifnot _i@f gt_i32 90 goto ELSE",
+            "add_i32 _a@f 1 _a@f",
+            "goto JOIN",
+            ":END",
+            "__funcend f",
+        ])
+
+    def test_hot_branch_falls_through(self):
+        # then runs 90 times out of 100
+        result, _ = run(reorder_blocks, BRANCH_IN_LOOP,
+                        block_counts={0: 1, 1: 101, 2: 100, 3: 90, 4: 10, 5: 100, 6: 1})
+        self.assertEqual(result, [
+            "__funcbegin f default",
+            "set_i32 0 _i@f",
+            "goto LOOP",
+            ":__MLOGEV_LAYOUT_f_2__",
+            "ifnot _i@f gt_i32 90 goto ELSE",
+            "add_i32 _a@f 1 _a@f",
+            ":JOIN",
+            "add_i32 _i@f 1 _i@f",
+            ":LOOP",
+            "if _i@f lt_i32 100 goto __MLOGEV_LAYOUT_f_2__",
+            "__return f",
+            ":ELSE",
+            "add_i32 _b@f 1 _b@f",
+            "goto JOIN",
+            "__funcend f",
+        ])
+
+    def test_loop_exit_is_unlikely(self):
+        result, _ = run(reorder_blocks, [
+            "__funcbegin f default",
+            "set_i32 0 _i@f",
+            ":LOOP",
+            "add_i32 _i@f 1 _i@f",
+            "if _i@f gteq_i32 10 goto DONE",
+            "goto LOOP",
+            ":DONE",
+            "set_i32 _i@f result@f",
+            "__funcend f",
+        ])
+        self.assertEqual(result[2:5], [":LOOP", "add_i32 _i@f 1 _i@f", "ifnot _i@f gteq_i32 10 goto LOOP"])
+        self.assertNotIn("goto LOOP", result)
+
+
+class ProfileTest(unittest.TestCase):
+    def test_instrument_blocks(self):
+        graph = ControlFlowGraph(TextQuadrupleParser().parse(BRANCH_IN_LOOP + [":Foo", "goto Foo"]))
+        self.assertEqual(instrument_blocks(graph, "f", {}, {}), Changes.INSTRUCTIONS)
+        result = [ir.dump() for ir in graph.instructions()]
+        self.assertEqual(result[:5], ["__funcbegin f default", "add_i32 __profile_f_0 1 __profile_f_0",
+                                      "set_i32 0 _i@f", ":LOOP", "add_i32 __profile_f_1 1 __profile_f_1"])
+        self.assertEqual(result[-5:], [":END", "add_i32 __profile_f_6 1 __profile_f_6", "__funcend f",
+                                       ":Foo", "goto Foo"])
+
+    def run_with_profile(self, source, names):
+        """Runs source compiled with the profile of a first run, and without"""
+        _, _, processor = compile_and_run(source, (), CompileOptions(
+            optimize_level=2, preprocessor="builtin", machine_independents=["profile-generate"]))
+        with tempfile.TemporaryDirectory() as directory:
+            report = os.path.join(directory, "report.json")
+            with open(report, "w") as f:
+                json.dump({"cycles": processor.instructions_executed, "variables": processor.variables}, f)
+            self.assertEqual(read_profile(report)["main"][0], 1)
+            result, values, with_profile = compile_and_run(source, names, CompileOptions(
+                optimize_level=2, preprocessor="builtin", machine_independents=["profile-use=" + report]))
+        _, expected, plain = compile_and_run(source, names,
+                                             CompileOptions(optimize_level=2, preprocessor="builtin"))
+        self.assertEqual(values, expected)
+        return result, with_profile, plain
+
+    def test_profile_round_trip(self):
+        _, with_profile, plain = self.run_with_profile(HOT_LOOP, ("hits", "misses"))
+        # the 90 hits no longer jump over the misses, the 10 misses jump back
+        self.assertEqual(plain.instructions_executed - with_profile.instructions_executed, 80)
+
+    def test_jump_table_profile(self):
+        result, _, _ = self.run_with_profile(SWITCH_IN_LOOP, ("total", ))
+        self.assertIn("op add @counter @counter", result.output)
+
+
+if __name__ == "__main__":
+    unittest.main()
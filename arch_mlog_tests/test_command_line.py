@@ -0,0 +1,106 @@
+import unittest
+import os
+import sys
+import io
+import json
+import subprocess
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import mlogevo_main, module_abspath
+from mlogevo.__main__ import parser as argument_parser
+from mlogevo.server import CompileServer
+
+sources_dir = os.path.join(module_abspath, "sources")
+batch_sources = ["lcse_test_1", "sum_divide_by_3", "composite_function_1"]
+
+
+class BatchCompilationTest(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.output_dir.cleanup()
+
+    def read_output(self, name):
+        with open(os.path.join(self.output_dir.name, name)) as f:
+            return f.read()
+
+    def test_parallel_output_dir_matches_single_compilation(self):
+        sources = [os.path.join(sources_dir, name + ".c") for name in batch_sources]
+        mlogevo_main(["--no-cache", "-j", "2", "--output-dir", self.output_dir.name] + sources)
+        for name, source in zip(batch_sources, sources):
+            single_output = os.path.join(self.output_dir.name, name + ".single")
+            mlogevo_main(["--no-cache", "-o", single_output, source])
+            self.assertEqual(self.read_output(name + ".mlog.txt"), self.read_output(name + ".single"))
+
+    def test_per_input_outputs_and_failures(self):
+        broken = os.path.join(self.output_dir.name, "broken.c")
+        with open(broken, "w") as f:
+            f.write("void main() { undeclared = 1; }\n")
+        good = os.path.join(sources_dir, "lcse_test_1.c")
+        outputs = [os.path.join(self.output_dir.name, name) for name in ("good.txt", "broken.txt")]
+        with self.assertRaises(SystemExit):
+            mlogevo_main(["--no-cache", "--preprocessor=builtin", good, broken, "-o", outputs[0], "-o", outputs[1]])
+        self.assertTrue(os.path.exists(outputs[0]))
+        self.assertFalse(os.path.exists(outputs[1]))
+
+
+class StartupImportTest(unittest.TestCase):
+    heavy_modules = ("pycparser", "mlogevo.optimizer", "mlogevo.output", "mlogevo.frontend.compiler")
+
+    def imported_modules(self, argv):
+        code = "import sys, runpy; sys.argv = ['mlogevo'] + sys.argv[1:]\n" \
+               "try:\n    runpy.run_module('mlogevo', run_name='__main__')\n" \
+               "finally:\n    print(' '.join(sys.modules), file=sys.stderr)"
+        process = subprocess.run([sys.executable, "-c", code] + argv, cwd=os.path.dirname(module_abspath),
+                                 capture_output=True, text=True)
+        return process.stderr.split()
+
+    def test_help_does_not_import_compiler(self):
+        modules = self.imported_modules(["--help"])
+        self.assertIn("mlogevo.driver", modules)
+        for name in self.heavy_modules:
+            self.assertNotIn(name, modules)
+
+    def test_cache_hit_does_not_import_compiler(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            argv = ["--cache-dir", cache_dir, "--preprocessor=builtin", "-o", "-",
+                    os.path.join(sources_dir, "lcse_test_1.c")]
+            self.assertIn("pycparser", self.imported_modules(argv))
+            modules = self.imported_modules(argv)
+            for name in self.heavy_modules:
+                self.assertNotIn(name, modules)
+
+
+class CompileServerTest(unittest.TestCase):
+    def serve(self, *requests):
+        lines = [request if isinstance(request, str) else json.dumps(request) for request in requests]
+        output = io.StringIO()
+        CompileServer(argument_parser, workers=1).serve_stdio(io.StringIO("\n".join(lines) + "\n"), output)
+        responses = [json.loads(line) for line in output.getvalue().splitlines()]
+        return {response["id"]: response for response in responses}
+
+    def test_requests_and_diagnostics(self):
+        source = os.path.join(sources_dir, "lcse_test_1.c")
+        with open(source) as f:
+            source_text = f.read()
+        responses = self.serve(
+            {"id": 1, "source": source_text, "filename": source, "flags": ["--no-cache", "--preprocessor=builtin"]},
+            {"id": 2, "source": "void main() { y = 1; }", "filename": "bad.c", "flags": ["--no-cache"]},
+            {"id": 3, "source": "", "flags": ["-O", "9"]},
+            "not json",
+        )
+        with tempfile.TemporaryDirectory() as output_dir:
+            output_file = os.path.join(output_dir, "out.mlog")
+            mlogevo_main(["--no-cache", "--preprocessor=builtin", "-o", output_file, source])
+            with open(output_file) as f:
+                self.assertEqual(responses[1]["output"], f.read())
+        self.assertEqual(responses[1]["status"], 0)
+        self.assertEqual(responses[2]["status"], 1)
+        self.assertTrue(responses[2]["diagnostics"][0]["coord"].startswith("bad.c:1"))
+        self.assertEqual(responses[3]["status"], 1)
+        self.assertEqual(responses[None]["status"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import mlogevo_main, module_abspath
+
+from mlogevo.compile_cache import CompilationCache, make_cache_key
+
+source_file = os.path.join(module_abspath, "sources", "lcse_test_1.c")
+
+
+class CompilationCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.output_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+        self.output_dir.cleanup()
+
+    def compile(self, output_name, extra_argv):
+        output = os.path.join(self.output_dir.name, output_name)
+        mlogevo_main(["--cache-dir", self.cache_dir.name, "-o", output, source_file] + extra_argv)
+        with open(output) as f:
+            return f.read()
+
+    def test_hit_gives_same_output(self):
+        uncached = self.compile("uncached", ["--no-cache"])
+        first = self.compile("first", [])
+        second = self.compile("second", [])
+        self.assertEqual(uncached, first)
+        self.assertEqual(first, second)
+        cache = CompilationCache(self.cache_dir.name)
+        self.assertEqual(cache.record_stats(), {"hits": 1, "misses": 1})
+
+    def test_concurrent_stats(self):
+        def record():
+            for _ in range(50):
+                cache = CompilationCache(self.cache_dir.name)
+                cache.hits, cache.misses = 1, 2
+                cache.record_stats()
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(CompilationCache(self.cache_dir.name).record_stats(), {"hits": 200, "misses": 400})
+
+    def test_flags_are_part_of_key(self):
+        self.assertNotEqual(make_cache_key("", {"O": 1}), make_cache_key("", {"O": 2}))
+        self.assertEqual(make_cache_key("x", {"O": 1}), make_cache_key("x", {"O": 1}))
+
+    def test_lru_eviction(self):
+        cache = CompilationCache(self.cache_dir.name, max_size=20)
+        cache.put("aa01", "0123456789")
+        cache.put("aa02", "0123456789")
+        os.utime(cache.entry_path("aa01"), (1, 1))
+        os.utime(cache.entry_path("aa02"), (2, 2))
+        self.assertIsNotNone(cache.get("aa01"))
+        cache.put("aa03", "0123456789")
+        self.assertIsNone(cache.get("aa02"))
+        self.assertIsNotNone(cache.get("aa01"))
+        self.assertIsNotNone(cache.get("aa03"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+import context
+from mlogevo.backend import make_backend
+from mlogevo.backend.control_flow_graph import ControlFlowGraph
+from mlogevo.intermediate import Quadruple, TextQuadrupleParser
+from mlogevo.intermediate.function import Function
+from mlogevo.optimizer import Changes
+
+# 0: entry, 1: loop header, 2: loop body, 3: if-else join, 4: else branch, 5: exit
+LOOP_FUNCTION = [
+    "__funcbegin f default",
+    "set_i32 0 _i@f",
+    ":LOOP",
+    "if _i@f gteq_i32 10 goto END",
+    "add_i32 _i@f 1 _i@f",
+    "ifnot _i@f eq_i32 5 goto SKIP",
+    "goto LOOP",
+    ":SKIP",
+    "goto LOOP",
+    ":END",
+    "__funcend f",
+]
+
+
+def make_graph(lines):
+    return ControlFlowGraph(TextQuadrupleParser().parse(lines))
+
+
+class ControlFlowGraphTest(unittest.TestCase):
+    def test_edges(self):
+        graph = make_graph(LOOP_FUNCTION)
+        self.assertEqual(graph.order, [0, 1, 2, 3, 4, 5])
+        self.assertEqual(graph.entry, 0)
+        self.assertEqual(graph.successors[1], [5, 2])
+        self.assertEqual(sorted(graph.predecessors[1]), [0, 3, 4])
+        self.assertEqual(graph.exits, [5])
+
+    def test_dominators(self):
+        graph = make_graph(LOOP_FUNCTION)
+        idom = graph.immediate_dominators()
+        self.assertEqual(idom, {0: 0, 1: 0, 2: 1, 3: 2, 4: 2, 5: 1})
+        self.assertTrue(graph.dominates(1, 4))
+        self.assertFalse(graph.dominates(3, 4))
+        self.assertEqual(graph.dominators(4), [4, 2, 1, 0])
+
+    def test_natural_loops(self):
+        graph = make_graph(LOOP_FUNCTION)
+        # back edges 3 -> 1 and 4 -> 1 make one loop
+        self.assertEqual(graph.natural_loops(), {1: {1, 2, 3, 4}})
+        self.assertEqual(graph.loop_depths(), {0: 0, 1: 1, 2: 1, 3: 1, 4: 1, 5: 0})
+
+    def test_unreachable_blocks(self):
+        graph = make_graph(["__funcbegin f default", "goto END", "set_i32 1 _x@f", ":END", "__funcend f"])
+        self.assertEqual(graph.reachable(), {0, 2})
+        self.assertFalse(graph.dominates(0, 1))
+        self.assertEqual(graph.dominators(1), [])
+        self.assertEqual([ir.dump() for ir in graph.instructions()],
+                         ["__funcbegin f default", "goto END", "set_i32 1 _x@f", ":END", "__funcend f"])
+
+
+class GraphOptimizerTest(unittest.TestCase):
+    def run_optimizers(self, optimizers):
+        backend = make_backend(optimize_level=0)
+        backend.mi_optimizers = optimizers
+        function = Function("f", None, None, None, TextQuadrupleParser().parse(LOOP_FUNCTION), [])
+        backend.run_optimize_pass(function, {"f": function}, {})
+        return function
+
+    def test_graph_is_shared_until_control_flow_changes(self):
+        graphs = []
+        blocks = []
+
+        def observe(graph, function_name, all_functions, variable_types):
+            graphs.append(graph)
+            return Changes.NONE
+
+        def remove_skip(graph, function_name, all_functions, variable_types):
+            # "goto LOOP" in place of "ifnot ... goto SKIP"
+            block = graph.blocks[2]
+            block.instructions[-1] = Quadruple("goto", "LOOP")
+            return Changes.CONTROL_FLOW
+
+        def count_blocks(block, function_name, all_functions, variable_types):
+            blocks.append(block.id)
+            return Changes.NONE
+
+        function = self.run_optimizers([
+            (observe, "basic_block_graph", 1),
+            (count_blocks, "basic_block", 2),
+            (observe, "basic_block_graph", 3),
+            (remove_skip, "basic_block_graph", 4),
+            (observe, "basic_block_graph", 5),
+        ])
+        self.assertIs(graphs[0], graphs[1])
+        self.assertIsNot(graphs[1], graphs[2])
+        self.assertEqual(graphs[2].predecessors[3], [])
+        self.assertEqual(blocks, [0, 1, 2, 3, 4, 5])
+        self.assertEqual(function.instructions[5].dump(), "goto LOOP")
+
+    def test_function_optimizers_see_block_changes(self):
+        seen = []
+
+        def drop_increment(block, function_name, all_functions, variable_types):
+            block.instructions = [ir for ir in block.instructions if ir.instruction != "add_i32"]
+            return Changes.INSTRUCTIONS
+
+        def observe(function):
+            seen.append(len(function.instructions))
+            return Changes.NONE
+
+        self.run_optimizers([(drop_increment, "basic_block", 1), (observe, "function", 2)])
+        self.assertEqual(seen, [len(LOOP_FUNCTION) - 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
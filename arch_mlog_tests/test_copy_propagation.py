@@ -0,0 +1,139 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import run
+from mlogevo.backend.control_flow_graph import ControlFlowGraph
+from mlogevo.intermediate import TextQuadrupleParser
+from mlogevo.optimizer import Changes
+from mlogevo.optimizer.mi_copy_propagation import coalesce_copies, propagate_copies
+from mlogevo.optimizer.mi_lcse import eliminate_local_common_subexpression
+
+
+class CopyPropagationTest(unittest.TestCase):
+    LINES = [
+        "__funcbegin f default",
+        "set_i32 _n@f _a@f",
+        "ifnot _n@f gt_i32 0 goto ELSE",
+        "set_i32 _a@f _b@f",
+        "goto END",
+        ":ELSE",
+        "set_i32 _a@f _b@f",
+        ":END",
+        "add_i32 _b@f 1 result@f",
+        "__funcend f",
+    ]
+
+    def test_across_branches(self):
+        result, changes = run(propagate_copies, self.LINES)
+        # both branches copy _a@f, a copy of _n@f
+        self.assertIn("add_i32 _n@f 1 result@f", result)
+        self.assertEqual(changes, Changes.INSTRUCTIONS)
+
+    def test_redefinition_in_one_branch(self):
+        lines = list(self.LINES)
+        lines[6] = "set_i32 _m@f _b@f"
+        result, _ = run(propagate_copies, lines)
+        self.assertIn("add_i32 _b@f 1 result@f", result)
+
+    def test_loop_body(self):
+        result, _ = run(propagate_copies, [
+            "__funcbegin f default",
+            "set_i32 0 _s@f",
+            ":LOOP",
+            "set_i32 _s@f _t@f",
+            "add_i32 _t@f _n@f _s@f",
+            "if _s@f lt_i32 100 goto LOOP",
+            "__funcend f",
+        ])
+        self.assertIn("add_i32 _s@f _n@f _s@f", result)
+
+    def test_strict_32bit(self):
+        # set masks under -mstrict-32bit
+        result, changes = run(propagate_copies, self.LINES, ["strict-32bit"])
+        self.assertIn("add_i32 _b@f 1 result@f", result)
+        self.assertEqual(changes, Changes.NONE)
+
+
+class CoalesceCopiesTest(unittest.TestCase):
+    def test_parameter_keeps_its_name(self):
+        result, changes = run(coalesce_copies, [
+            "__funcbegin f default",
+            "decl_i32 argument _v@f",
+            "decl_i32 default _w@f",
+            "decl_i32 default _s@f",
+            "set_i32 _v@f _w@f",
+            "set_i32 0 _s@f",
+            ":LOOP",
+            "add_i32 _s@f _w@f _s@f",
+            "if _s@f lt_i32 100 goto LOOP",
+            "set_i32 _s@f result@f",
+            "__funcend f",
+        ])
+        self.assertIn("add_i32 _s@f _v@f _s@f", result)
+        self.assertNotIn("set_i32 _v@f _w@f", result)
+        self.assertIn("set_i32 _s@f result@f", result)
+        self.assertEqual(changes, Changes.INSTRUCTIONS)
+
+    def test_interfering_copies_stay(self):
+        lines = [
+            "__funcbegin f default",
+            "decl_i32 default _a@f",
+            "decl_i32 default _b@f",
+            "decl_i32 default _t@f",
+            ":LOOP",
+            "add_i32 _a@f _b@f _t@f",
+            "set_i32 _b@f _a@f",
+            "set_i32 _t@f _b@f",
+            "if _b@f lt_i32 100 goto LOOP",
+            "set_i32 _a@f result@f",
+            "__funcend f",
+        ]
+        result, changes = run(coalesce_copies, lines)
+        self.assertEqual(result, [ir.dump() for ir in TextQuadrupleParser().parse(lines)])
+        self.assertEqual(changes, Changes.NONE)
+
+
+class LocalCommonSubexpressionTest(unittest.TestCase):
+    def optimize(self, lines):
+        graph = ControlFlowGraph(TextQuadrupleParser().parse(lines))
+        for block_id in graph.order:
+            eliminate_local_common_subexpression(graph.blocks[block_id], "f", {}, {})
+        return [ir.dump() for ir in graph.instructions()]
+
+    def test_copies_wait_for_reads(self):
+        # t = a + b; a = b; b = t
+        result = self.optimize([
+            "__funcbegin f default",
+            "add_i32 _a@f _b@f _t@f",
+            "set_i32 _b@f _a@f",
+            "set_i32 _t@f _b@f",
+            "__funcend f",
+        ])
+        self.assertEqual(result[1], "add_i32 _a@f _b@f _t@f")
+
+    def test_writes_wait_for_reads(self):
+        # t = a + b; a = b * 2; b = t
+        result = self.optimize([
+            "__funcbegin f default",
+            "add_i32 _a@f _b@f _t@f",
+            "mul_i32 _b@f 2 _a@f",
+            "set_i32 _t@f _b@f",
+            "__funcend f",
+        ])
+        self.assertLess(result.index("mul_i32 _b@f 2 _a@f"), result.index("set_i32 _t@f _b@f"))
+        self.assertEqual(result[1], "add_i32 _a@f _b@f _t@f")
+
+    def test_repeated_expression_is_copied(self):
+        result = self.optimize([
+            "__funcbegin f default",
+            "add_i32 _a@f 1 _x@f",
+            "mul_i32 _y@f 2 _z@f",
+            "add_i32 _a@f 1 _y@f",
+            "__funcend f",
+        ])
+        self.assertLess(result.index("mul_i32 _y@f 2 _z@f"), result.index("set_i32 _x@f _y@f"))
+
+
+if __name__ == "__main__":
+    unittest.main()
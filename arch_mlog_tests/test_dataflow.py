@@ -0,0 +1,151 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+import context
+from mlogevo.backend.control_flow_graph import ControlFlowGraph
+from mlogevo.intermediate import TextQuadrupleParser
+from mlogevo.optimizer.dataflow import Copy, Definition, get_available_copies, get_available_expressions, \
+    get_liveness, get_reaching_definitions
+
+# 0: entry, 1: loop header, 2: loop body, 3: exit
+LOOP_FUNCTION = [
+    "__funcbegin f default",
+    "set_i32 0 _i@f",
+    "set_i32 0 _s@f",
+    "add_i32 _n@f 1 _m@f",
+    ":LOOP",
+    "if _i@f gteq_i32 _m@f goto END",
+    "add_i32 _s@f _i@f _s@f",
+    "add_i32 _i@f 1 _i@f",
+    "set_i32 _i@f _dead@f",
+    "goto LOOP",
+    ":END",
+    "set_i32 _s@f result@f",
+    "__funcend f",
+]
+
+
+def make_graph(lines):
+    return ControlFlowGraph(TextQuadrupleParser().parse(lines))
+
+
+class LivenessTest(unittest.TestCase):
+    def test_loop(self):
+        graph = make_graph(LOOP_FUNCTION)
+        liveness = get_liveness(graph, "f")
+        names = liveness.variables.decode
+        self.assertEqual(sorted(names(liveness.live_in[0])), ["_n@f"])
+        self.assertEqual(sorted(names(liveness.live_in[1])), ["_i@f", "_m@f", "_s@f"])
+        self.assertEqual(sorted(names(liveness.live_out[3])), ["result@f"])
+        # set_i32 _i@f _dead@f: _dead@f is never read
+        after = liveness.live_after(2)
+        self.assertFalse(after[2] & liveness.variables.bit("_dead@f"))
+        self.assertIs(get_liveness(graph, "f"), liveness)
+
+    def test_calls_read_and_return_keeps_observable_variables(self):
+        graph = make_graph([
+            "__funcbegin f default",
+            "set_i32 1 _x@g",
+            "set_i32 2 _y@f",
+            "set_i32 3 counter",
+            "__call g",
+            "__funcend f",
+        ])
+        liveness = get_liveness(graph, "f")
+        after = liveness.live_after(0)
+        self.assertTrue(after[1] & liveness.variables.bit("_x@g"))
+        self.assertFalse(after[2] & liveness.variables.bit("_y@f"))
+        self.assertTrue(liveness.is_live_out(1, "counter"))
+
+    def test_asm_operands(self):
+        graph = make_graph([
+            "__funcbegin f default",
+            "set_i32 1 _a@f",
+            "__asmvbegin 1 _a@f",
+            "op add %1 %0 1",
+            "__asmvend 1 _b@f",
+            "set_i32 _b@f result@f",
+            "__funcend f",
+        ])
+        liveness = get_liveness(graph, "f")
+        self.assertEqual(liveness.variables.decode(liveness.live_in[1]), ["_b@f"])
+        self.assertTrue(liveness.live_after(0)[1] & liveness.variables.bit("_a@f"))
+        self.assertFalse(liveness.live_out[0] & liveness.variables.bit("_a@f"))
+
+
+class ReachingDefinitionsTest(unittest.TestCase):
+    def test_loop(self):
+        graph = make_graph(LOOP_FUNCTION)
+        reaching = get_reaching_definitions(graph, "f")
+        before_if = reaching.reaching_before(1)[1]
+        self.assertEqual(sorted(reaching.definitions_of_variable("_i@f", before_if)),
+                         [Definition(0, 1, "_i@f"), Definition(2, 1, "_i@f")])
+        self.assertEqual(reaching.definitions_of_variable("_n@f", before_if), [Definition(-1, -1, "_n@f")])
+
+    def test_calls_define_observable_variables(self):
+        graph = make_graph([
+            "__funcbegin f default",
+            "set_i32 1 counter",
+            "set_i32 1 _x@f",
+            "__call g",
+            "set_i32 counter _y@f",
+            "set_i32 _x@f counter",
+            "__funcend f",
+        ])
+        reaching = get_reaching_definitions(graph, "f")
+        before = reaching.reaching_before(1)
+        self.assertEqual(reaching.definitions_of_variable("counter", before[0]), [Definition(0, 3, "counter")])
+        self.assertEqual(reaching.definitions_of_variable("_x@f", before[1]), [Definition(0, 2, "_x@f")])
+
+
+class AvailableExpressionsTest(unittest.TestCase):
+    def test_loop(self):
+        graph = make_graph(LOOP_FUNCTION)
+        available = get_available_expressions(graph, "f")
+        expressions = available.expressions
+        # _n@f + 1 is computed before the loop and _n@f never changes
+        self.assertEqual(expressions.decode(available.available_in[3]), [("add_i32", "_n@f", "1")])
+        # _s@f + _i@f and _i@f + 1 are killed by their own results
+        self.assertEqual(expressions.decode(available.available_out[2]), [("add_i32", "_n@f", "1")])
+
+    def test_calls_kill_observable_operands(self):
+        graph = make_graph([
+            "__funcbegin f default",
+            "add_i32 counter 1 _a@f",
+            "add_i32 _a@f 1 _b@f",
+            "__call g",
+            "add_i32 counter 1 _c@f",
+            "__funcend f",
+        ])
+        available = get_available_expressions(graph, "f")
+        self.assertEqual(available.expressions.decode(available.available_in[1]), [("add_i32", "_a@f", "1")])
+
+
+class AvailableCopiesTest(unittest.TestCase):
+    def test_loop(self):
+        graph = make_graph(LOOP_FUNCTION)
+        available = get_available_copies(graph, "f")
+        # _dead@f = _i@f is made at the end of the body, but not before the loop
+        self.assertEqual(available.copies.decode(available.available_out[2]), [Copy("_dead@f", "_i@f")])
+        self.assertEqual(available.available_in[1], 0)
+
+    def test_chains_and_calls(self):
+        graph = make_graph([
+            "__funcbegin f default",
+            "set_i32 _n@f _a@f",
+            "set_i32 _a@f _b@f",
+            "set_i32 counter _c@f",
+            "__call g",
+            "add_i32 _b@f _c@f result@f",
+            "__funcend f",
+        ])
+        available = get_available_copies(graph, "f")
+        after_call = available.available_in[1]
+        self.assertEqual(available.source_of("_b@f", after_call), "_n@f")
+        # g may change counter
+        self.assertIsNone(available.source_of("_c@f", after_call))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import run
+from mlogevo.intermediate import TextQuadrupleParser
+from mlogevo.optimizer import Changes
+from mlogevo.optimizer.mi_dead_code_elimination import eliminate_dead_code
+
+
+class DeadCodeEliminationTest(unittest.TestCase):
+    def test_overwritten_store_and_its_inputs(self):
+        result, changes = run(eliminate_dead_code, [
+            "__funcbegin f default",
+            "mul_i32 _a@f 2 _t@f",
+            "add_i32 _t@f 1 _x@f",
+            "add_i32 _a@f 3 _x@f",
+            "set_i32 _x@f result@f",
+            "__funcend f",
+        ])
+        self.assertEqual(result, ["__funcbegin f default", "add_i32 _a@f 3 _x@f",
+                                  "set_i32 _x@f result@f", "__funcend f"])
+        self.assertEqual(changes, Changes.INSTRUCTIONS)
+
+    def test_dead_loop_variable(self):
+        result, _ = run(eliminate_dead_code, [
+            "__funcbegin f default",
+            "set_i32 0 _i@f",
+            "set_i32 0 _unused@f",
+            ":LOOP",
+            "add_i32 _unused@f _i@f _unused@f",
+            "add_i32 _i@f 1 _i@f",
+            "if _i@f lt_i32 10 goto LOOP",
+            "__funcend f",
+        ])
+        self.assertNotIn("add_i32 _unused@f _i@f _unused@f", result)
+        self.assertIn("add_i32 _i@f 1 _i@f", result)
+
+    def test_side_effects_are_kept(self):
+        lines = [
+            "__funcbegin f default",
+            "set_i32 1 _x@g",
+            "__call g",
+            "set_i32 2 counter",
+            "set_i32 retaddr@f retaddr@g",
+            "__asmvbegin 0",
+            "print 1",
+            "__asmvend 0",
+            "__asmbegin 0",
+            "printflush message1",
+            "__asmend 0",
+            "__asmbegin 1 counter",
+            "op add %1 %0 1",
+            "__asmend 1 _unused@f",
+            "goto g",
+            "__funcend f",
+        ]
+        result, _ = run(eliminate_dead_code, lines)
+        # only asm with unused outputs goes
+        expected = lines[:11] + lines[14:]
+        self.assertEqual(result, [ir.dump() for ir in TextQuadrupleParser().parse(expected)])
+
+    def test_globals_stay_in_endless_loops(self):
+        result, _ = run(eliminate_dead_code, [
+            "__funcbegin main default",
+            "set_i32 1 counter",
+            "set_i32 2 _local@main",
+            ":Foo",
+            "goto Foo",
+            "__funcend main",
+        ], function_name="main")
+        self.assertEqual(result, ["__funcbegin main default", "set_i32 1 counter", ":Foo", "goto Foo",
+                                  "__funcend main"])
+
+    def test_unreachable_blocks(self):
+        result, changes = run(eliminate_dead_code, [
+            "__funcbegin f default",
+            "set_i32 1 result@f",
+            "__return f",
+            ":DEAD",
+            "decl_i32 default _x@f",
+            "set_i32 5 counter",
+            "goto DEAD",
+            "__funcend f",
+        ])
+        self.assertEqual(result, ["__funcbegin f default", "set_i32 1 result@f", "__return f",
+                                  "decl_i32 default _x@f", "__funcend f"])
+        self.assertEqual(changes, Changes.ALL)
+
+
+if __name__ == "__main__":
+    unittest.main()
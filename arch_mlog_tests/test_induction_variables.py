@@ -0,0 +1,105 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import compile_and_run, counted_loop, run
+from mlogevo import CompileOptions
+from mlogevo.intermediate import Opcode, TextQuadrupleParser
+from mlogevo.optimizer import Changes
+from mlogevo.optimizer.mi_induction_variables import reduce_induction_variables
+
+
+def sum_loop(body, after=("set_i32 _s@f result@f", )):
+    before = ("decl_i32 default _i@f", "decl_i32 default ___vtmp_1@f", "set_i32 0 _s@f")
+    return counted_loop(body, before, after, "_n@f")
+
+
+class StrengthReductionTest(unittest.TestCase):
+    def test_linear_function_test_replacement(self):
+        result, changes = run(reduce_induction_variables, sum_loop([
+            "mul_i32 _i@f 8 ___vtmp_1@f",
+            "add_i32 ___vtmp_1@f 4 _x@f",
+            "add_i32 _s@f _x@f _s@f",
+        ]))
+        self.assertEqual(changes, Changes.INSTRUCTIONS)
+        self.assertEqual(result, [
+            "__funcbegin f default",
+            "decl_i32 default _i@f",
+            "decl_i32 default ___vtmp_1@f",
+            "decl_i32 default ___vtmp_2@f",
+            "decl_i32 default ___vtmp_3@f",
+            "set_i32 0 _s@f",
+            "set_i32 0 _i@f",
+            # the value of i * 8 + 4 before the loop, and when i reaches n
+            "mul_i32 _i@f 8 ___vtmp_2@f",
+            "add_i32 ___vtmp_2@f 4 ___vtmp_2@f",
+            "mul_i32 _n@f 8 ___vtmp_3@f",
+            "add_i32 ___vtmp_3@f 4 ___vtmp_3@f",
+            "goto COND",
+            ":LOOP",
+            "set_i32 ___vtmp_2@f _x@f",
+            "add_i32 _s@f _x@f _s@f",
+            "add_i32 ___vtmp_2@f 8 ___vtmp_2@f",
+            ":COND",
+            "if ___vtmp_2@f lt_i32 ___vtmp_3@f goto LOOP",
+            "set_i32 _s@f result@f",
+            "__funcend f",
+        ])
+
+    def test_counter_read_after_the_loop(self):
+        # i * 8 + 4 costs two instructions, its running value one
+        result, changes = run(reduce_induction_variables, sum_loop([
+            "mul_i32 _i@f 8 ___vtmp_1@f",
+            "add_i32 ___vtmp_1@f 4 _x@f",
+            "add_i32 _s@f _x@f _s@f",
+        ], ["add_i32 _s@f _i@f result@f"]))
+        self.assertEqual(changes, Changes.INSTRUCTIONS)
+        self.assertIn("add_i32 _i@f 1 _i@f", result)
+        self.assertIn("if _i@f lt_i32 _n@f goto LOOP", result)
+        self.assertNotIn("mul_i32 _i@f 8 ___vtmp_1@f", result[result.index(":LOOP"):])
+
+    def test_nothing_to_save(self):
+        lines = sum_loop(["mul_i32 _i@f 8 ___vtmp_1@f", "add_i32 _s@f ___vtmp_1@f _s@f"],
+                         ["add_i32 _s@f _i@f result@f"])
+        for machine_dependents in ((), ("strict-32bit", )):
+            result, changes = run(reduce_induction_variables, lines, machine_dependents)
+            self.assertEqual(changes, Changes.NONE)
+            self.assertEqual(result, [ir.dump() for ir in TextQuadrupleParser().parse(lines)])
+        # the sign of _k@f is unknown, i < n can not become i * k < n * k
+        lines = sum_loop(["mul_i32 _i@f _k@f ___vtmp_1@f", "add_i32 _s@f ___vtmp_1@f _s@f"])
+        self.assertEqual(run(reduce_induction_variables, lines)[1], Changes.NONE)
+        # a running sum of i * 0.1 is not i * 0.1
+        lines = sum_loop(["mul_f64 _i@f 0.1 ___vtmp_1@f", "add_f64 _s@f ___vtmp_1@f _s@f"])
+        self.assertEqual(run(reduce_induction_variables, lines)[1], Changes.NONE)
+
+    def test_counting_down(self):
+        source = """\
+int out;
+int down(int n) {
+    int total = 0;
+    for (int x = n; x > 0; x -= 2) {
+        total = total + (3 - x * 5);
+    }
+    return total;
+}
+void main() {
+    out = down(11);
+Foo:
+    goto Foo;
+}
+"""
+        # down() is inlined into main() otherwise
+        options = CompileOptions(optimize_level=2, preprocessor="builtin",
+                                 machine_independents=["no-inline-functions"])
+        result, values, _ = compile_and_run(source, ("out", ), options)
+        self.assertEqual(values, [-162])
+        self.assertNotIn("_x@down", result.output)
+        # 3 - x * 5 counts up by 10, until x > 0 no longer holds
+        down = [ir for ir in result.ir if ir.src1.endswith("@down") or ir.dest.endswith("@down")]
+        exit_test = next(ir for ir in down if ir.opcode is Opcode.IF)
+        self.assertEqual((exit_test.relop, exit_test.src2), ("lt_i32", "3"))
+        self.assertIn(f"add_i32 {exit_test.src1} 10 {exit_test.src1}", [ir.dump() for ir in down])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import compile_and_run
+from mlogevo import CompileOptions
+from mlogevo.backend.call_graph import CallGraph
+from mlogevo.intermediate import TextQuadrupleParser
+from mlogevo.intermediate.function import Function
+
+SOURCE = """\
+int out1, out2, big1;
+int square(int x) { int y = x * x; return y + 1; }
+int pick(int a, int b) { if (a > b) return square(a); return square(b) + a; }
+int counter() { int c; c = c + 1; return c; }
+__attribute__((noinline)) int next(int x) { return x + 1; }
+int big(int x) {
+    int s = x * 3;
+    s = s ^ (x << 2); s = s + x / 7; s = s - (x % 5); s = s * (x | 9);
+    s = s + x * 13; s = s ^ (x << 3); s = s + x / 17; s = s - (x % 15); s = s * (x | 19);
+    return s;
+}
+void main() {
+    out1 = pick(3, 4);
+    out2 = 0;
+    for (int i = 0; i < 5; i++) {
+        out2 = out2 + pick(i, 2);
+    }
+    counter(); counter();
+    out1 = out1 + counter() * 1000 + next(1) * 1000000;
+    big1 = big(3) + big(5) + big(7) + big(out1) + big(out2);
+Foo:
+    goto Foo;
+}
+"""
+
+
+def function(name, lines):
+    instructions = TextQuadrupleParser().parse([f"__funcbegin {name} default", *lines, f"__funcend {name}"])
+    return Function(name, None, [], {}, instructions, ["default"])
+
+
+def run(source, optimize_level=2, machine_dependents=(), machine_independents=()):
+    result, values, _ = compile_and_run(source, ("out1", "out2", "big1"), CompileOptions(
+        optimize_level=optimize_level, preprocessor="builtin", machine_dependents=list(machine_dependents),
+        machine_independents=list(machine_independents)))
+    return result, values
+
+
+class CallGraphTest(unittest.TestCase):
+    def test_bottom_up(self):
+        graph = CallGraph({
+            "main": function("main", ["__call f", "__call g", "__call f"]),
+            "f": function("f", ["__call g"]),
+            "g": function("g", []),
+            "r": function("r", ["__call s"]),
+            "s": function("s", ["__call r"]),
+        })
+        self.assertEqual(graph.callers["f"], {"main": 2})
+        self.assertEqual(graph.callers["g"], {"main": 1, "f": 1})
+        order = graph.bottom_up()
+        self.assertEqual(order[:3], ["g", "f", "main"])
+        self.assertEqual(sorted(order[3:]), ["r", "s"])
+        self.assertEqual(graph.reachable(["f"]), {"f", "g"})
+        self.assertTrue(graph.is_recursive("r"))
+        self.assertFalse(graph.is_recursive("main"))
+
+
+class InlineFunctionsTest(unittest.TestCase):
+    # pick(3, 4) = 20, the sum of pick(i, 2) = 45, next(1) = 2
+    EXPECTED = [2003020, 45]
+
+    def test_inlined_program(self):
+        result, values = run(SOURCE, optimize_level=0)
+        self.assertEqual(values[:2], self.EXPECTED)
+        big1 = values[2]
+        result, values = run(SOURCE)
+        self.assertEqual(values, [*self.EXPECTED, big1])
+        # square into pick, then pick and counter into main
+        self.assertEqual(result.stats["inlined_functions"], 3)
+        self.assertEqual(result.stats["inlined_calls"], 7)
+        lines = result.output.splitlines()
+        self.assertNotIn("retaddr@square", result.output)
+        self.assertNotIn("retaddr@pick", result.output)
+        # the value of c is kept between calls
+        self.assertIn("op add _c@counter _c@counter 1", lines)
+        self.assertEqual(lines[0], "set out1 20")
+        for name in ("next", "big"):
+            self.assertIn(f"op add retaddr@{name} @counter 1", lines)
+
+    def test_disabled(self):
+        result, values = run(SOURCE, machine_independents=["no-inline-functions"])
+        self.assertEqual(values[:2], self.EXPECTED)
+        self.assertNotIn("inlined_functions", result.stats)
+        self.assertIn("op add retaddr@pick @counter 1", result.output.splitlines())
+
+    def test_instruction_limit(self):
+        source = """\
+int out1, out2, big1;
+int big(int x) {
+    int s = x * 3;
+    s = s ^ (x << 2); s = s + x / 7; s = s - (x % 5); s = s * (x | 9);
+    return s;
+}
+void main() {
+    for (int i = 0; i < 5; i++) {
+        out1 = out1 + big(i);
+        out2 = out2 + big(i + 1);
+    }
+Foo:
+    goto Foo;
+}
+"""
+        _, expected = run(source, optimize_level=0)
+        result, values = run(source)
+        self.assertEqual(values, expected)
+        self.assertEqual(result.stats["inlined_functions"], 1)
+        # the calls in the loop are worth a few more instructions, if there is room for them
+        kept, _ = run(source, machine_independents=["no-inline-functions"])
+        size = len(kept.output.splitlines())
+        self.assertGreater(len(result.output.splitlines()), size)
+        result, values = run(source, machine_dependents=[f"max-instructions={size}"])
+        self.assertEqual(values, expected)
+        self.assertEqual(result.stats["inlined_functions"], 0)
+        self.assertEqual(result.output, kept.output)
+
+    def test_nested_calls(self):
+        source = """\
+int out1, out2, big1;
+int cond(int a, int b) { if (b) return a * 100; return a * 5; }
+int add3(int a, int b, int c) { return a + b * 10 + c * 100; }
+void main() {
+    out1 = cond(7, 0) + cond(7, 1);
+    out2 = add3(1, add3(2, 3, 4), 5);
+    big1 = add3(add3(1, 1, 1), 2, add3(3, 0, 0));
+Foo:
+    goto Foo;
+}
+"""
+        for optimize_level in range(4):
+            _, values = run(source, optimize_level)
+            self.assertEqual(values, [735, 4821, 431])
+
+
+if __name__ == "__main__":
+    unittest.main()
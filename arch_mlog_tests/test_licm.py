@@ -0,0 +1,159 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import compile_and_run, counted_loop, run
+from mlogevo import CompileOptions
+from mlogevo.intermediate import TextQuadrupleParser
+from mlogevo.optimizer import Changes
+from mlogevo.optimizer.mi_licm import move_loop_invariants
+
+SENSOR_X = [
+    "__asmbegin 1 _unit@f",
+    "sensor %0 %1 @x",
+    "__asmend 1 _x@f",
+]
+
+
+class LoopInvariantCodeMotionTest(unittest.TestCase):
+    def test_invariant_chain_moves_before_the_goto(self):
+        result, changes = run(move_loop_invariants, counted_loop([
+            "mul_i32 _a@f _b@f _t@f",
+            "add_i32 _t@f 1 _k@f",
+            "add_i32 _s@f _k@f _s@f",
+        ]))
+        self.assertEqual(changes, Changes.INSTRUCTIONS)
+        self.assertEqual(result[:7], ["__funcbegin f default", "set_i32 0 _i@f", "mul_i32 _a@f _b@f _t@f",
+                                      "add_i32 _t@f 1 _k@f", "goto COND", ":LOOP", "add_i32 _s@f _k@f _s@f"])
+
+    def test_variant_values_stay(self):
+        lines = counted_loop([
+            # operand written in the loop
+            "mul_i32 _i@f 2 _t@f",
+            # read before written
+            "add_i32 _s@f _u@f _s@f",
+            "set_i32 _a@f _u@f",
+            # written twice
+            "set_i32 1 _v@f",
+            "add_i32 _v@f _t@f _v@f",
+            # changes by itself
+            "add_i32 @time 1 _w@f",
+        ])
+        result, changes = run(move_loop_invariants, lines)
+        self.assertEqual(result, [ir.dump() for ir in TextQuadrupleParser().parse(lines)])
+        self.assertEqual(changes, Changes.NONE)
+
+    def test_value_read_after_the_loop(self):
+        # the store is conditional: hoisting it would change result@f when the loop never stores
+        lines = counted_loop([
+            "ifnot _i@f eq_i32 5 goto SKIP",
+            "add_i32 _a@f 1 _x@f",
+            ":SKIP",
+        ], ["set_i32 0 _x@f"])
+        lines.insert(-1, "set_i32 _x@f result@f")
+        result, changes = run(move_loop_invariants, lines)
+        self.assertEqual(changes, Changes.NONE)
+        # on every iteration, before the exit
+        lines = counted_loop([], ["set_i32 0 _x@f"])
+        lines[-2:-1] = ["add_i32 _a@f 1 _x@f", "if _i@f lt_i32 10 goto LOOP", "set_i32 _x@f result@f"]
+        result, changes = run(move_loop_invariants, lines)
+        self.assertEqual(changes, Changes.INSTRUCTIONS)
+        self.assertEqual(result[3], "add_i32 _a@f 1 _x@f")
+
+    def test_calls_may_change_globals(self):
+        result, changes = run(move_loop_invariants, counted_loop([
+            "add_i32 counter 1 _t@f",
+            "add_i32 _a@f 1 total",
+            "add_i32 _a@f 2 _u@f",
+            "__call g",
+        ]))
+        self.assertEqual(changes, Changes.INSTRUCTIONS)
+        self.assertEqual(result[2:4], ["add_i32 _a@f 2 _u@f", "goto COND"])
+        self.assertIn("add_i32 counter 1 _t@f", result)
+        self.assertIn("add_i32 _a@f 1 total", result)
+
+    def test_preheader_is_made(self):
+        # the loop is entered from two places
+        result, changes = run(move_loop_invariants, [
+            "__funcbegin f default",
+            "if _c@f eq_i32 0 goto LOOP",
+            "set_i32 1 _i@f",
+            ":LOOP",
+            "add_i32 _a@f _b@f _t@f",
+            "add_i32 _s@f _t@f _s@f",
+            "add_i32 _i@f 1 _i@f",
+            "if _i@f lt_i32 10 goto LOOP",
+            "__funcend f",
+        ])
+        self.assertEqual(changes, Changes.ALL)
+        self.assertEqual(result, [
+            "__funcbegin f default",
+            "if _c@f eq_i32 0 goto __MLOGEV_PREHEADER_f_0__",
+            "set_i32 1 _i@f",
+            ":__MLOGEV_PREHEADER_f_0__",
+            "add_i32 _a@f _b@f _t@f",
+            ":LOOP",
+            "add_i32 _s@f _t@f _s@f",
+            "add_i32 _i@f 1 _i@f",
+            "if _i@f lt_i32 10 goto LOOP",
+            "__funcend f",
+        ])
+
+
+class AsmMotionTest(unittest.TestCase):
+    def test_sensor_read_in_counted_loop(self):
+        result, changes = run(move_loop_invariants, counted_loop([*SENSOR_X, "add_i32 _s@f _x@f _s@f"]))
+        self.assertEqual(changes, Changes.INSTRUCTIONS)
+        self.assertEqual(result[2:4], ["\n".join(SENSOR_X), "goto COND"])
+
+    def test_polling_loop(self):
+        # waits for the sensor to change
+        lines = [
+            "__funcbegin f default",
+            ":WAIT",
+            *SENSOR_X,
+            "if _x@f lt_f64 10 goto WAIT",
+            "__funcend f",
+        ]
+        result, changes = run(move_loop_invariants, lines)
+        self.assertEqual(changes, Changes.NONE)
+        # never ends
+        result, changes = run(move_loop_invariants, ["__funcbegin f default", "set_i32 0 _s@f", ":WAIT",
+                                                     *SENSOR_X, "add_i32 _s@f _x@f _s@f", "goto WAIT", "__funcend f"])
+        self.assertEqual(changes, Changes.NONE)
+
+    def test_asm_volatile_in_loop(self):
+        lines = counted_loop([*SENSOR_X, "add_i32 _s@f _x@f _s@f", "__asmvbegin 0", "wait 1", "__asmvend 0"])
+        result, changes = run(move_loop_invariants, lines)
+        self.assertEqual(changes, Changes.NONE)
+        self.assertEqual(result, [ir.dump() for ir in TextQuadrupleParser().parse(lines)])
+
+    def test_compiled_loop(self):
+        source = """\
+int out;
+int work(int a, int b) {
+    int total = 0;
+    for (int i = 0; i < 10; i++) {
+        int k = a * b + 1;
+        total = total + k * i;
+    }
+    return total;
+}
+void main() {
+    out = work(3, 4);
+Foo:
+    goto Foo;
+}
+"""
+        cycles = []
+        for options in ([], ["licm"]):
+            _, values, processor = compile_and_run(source, ("out", ), CompileOptions(
+                optimize_level=1, preprocessor="builtin", machine_independents=options))
+            cycles.append(processor.instructions_executed)
+            self.assertEqual(values, [585])
+        # a * b + 1 runs once
+        self.assertEqual(cycles[0] - cycles[1], 18)
+
+
+if __name__ == "__main__":
+    unittest.main()
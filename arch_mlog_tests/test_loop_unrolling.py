@@ -0,0 +1,142 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import compile_and_run, counted_loop
+from mlogevo import CompileOptions
+from mlogevo.backend.control_flow_graph import ControlFlowGraph
+from mlogevo.intermediate import TextQuadrupleParser
+from mlogevo.optimizer.mi_loop_unrolling import find_counted_loop
+
+SOURCE = """\
+int evens, odds, total;
+void main() {
+    evens = 0; odds = 0; total = 0;
+    for (int i = 0; i < 10; i++) {
+        if (i % 2 == 0) {
+            evens = evens + i;
+        } else {
+            odds = odds + i;
+        }
+    }
+    for (int k = 0; k < 100; k++) {
+        total = total + k % 7;
+    }
+Foo:
+    goto Foo;
+}
+"""
+
+
+def find_loop(lines):
+    graph = ControlFlowGraph(TextQuadrupleParser().parse(lines))
+    loops = graph.natural_loops()
+    ((header, body), ) = loops.items()
+    return find_counted_loop(graph, header, body, "f")
+
+
+def run(source, optimize_level=3, machine_dependents=()):
+    result, values, processor = compile_and_run(source, ("evens", "odds", "total"), CompileOptions(
+        optimize_level=optimize_level, preprocessor="builtin", machine_dependents=list(machine_dependents)))
+    return result, processor.instructions_executed, values
+
+
+class TripCountTest(unittest.TestCase):
+    def test_test_before_body(self):
+        loop = find_loop(counted_loop(["add_i32 _s@f _i@f _s@f"]))
+        # the test runs 11 times
+        self.assertEqual(loop.trips, 11)
+        self.assertEqual(loop.label, "COND")
+
+    def test_test_after_body(self):
+        loop = find_loop([
+            "__funcbegin f default",
+            "set_i32 20 _i@f",
+            ":LOOP",
+            "add_i32 _s@f _i@f _s@f",
+            "sub_i32 _i@f 3 _i@f",
+            "ifnot 0 gteq_i32 _i@f goto LOOP",
+            "__funcend f",
+        ])
+        # 20, 17, ..., 2
+        self.assertEqual(loop.trips, 7)
+
+    def test_unknown_trip_count(self):
+        lines = [
+            "__funcbegin f default",
+            "set_i32 0 _i@f",
+            ":LOOP",
+            "add_i32 _s@f _i@f _s@f",
+            "add_i32 _i@f 1 _i@f",
+            "if _i@f lt_i32 _n@f goto LOOP",
+            "__funcend f",
+        ]
+        self.assertIsNone(find_loop(lines))
+        # the counter is also written elsewhere
+        lines[3:6] = [
+            "ifnot _s@f gt_i32 5 goto SKIP",
+            "set_i32 0 _i@f",
+            ":SKIP",
+            "add_i32 _i@f 1 _i@f",
+            "if _i@f lt_i32 10 goto LOOP",
+        ]
+        self.assertIsNone(find_loop(lines))
+
+
+class LoopUnrollingTest(unittest.TestCase):
+    def test_unrolled_program(self):
+        unrolled, unrolled_cycles, values = run(SOURCE)
+        self.assertEqual(values, [20, 25, 295])
+        self.assertEqual(unrolled.stats["unrolled_loops"], 2)
+        instructions = len(unrolled.output.splitlines())
+        self.assertEqual(unrolled.stats["instruction_budget_left"], 1000 - instructions)
+        # the first loop is gone, the second one tests once every 8 iterations
+        self.assertEqual(unrolled.output.splitlines()[:2], ["set evens 20", "set odds 25"])
+        self.assertEqual(sum(line.startswith("jump") for line in unrolled.output.splitlines()), 3)
+        kept, kept_cycles, values = run(SOURCE, optimize_level=2)
+        self.assertEqual(values, [20, 25, 295])
+        self.assertNotIn("unrolled_loops", kept.stats)
+        self.assertLess(unrolled_cycles, kept_cycles)
+
+    def test_instruction_limit(self):
+        # 20 instructions without unrolling
+        for (limit, unrolled) in ((30, 1), (40, 2), (60, 2)):
+            result, _, values = run(SOURCE, machine_dependents=[f"max-instructions={limit}"])
+            self.assertEqual(values, [20, 25, 295])
+            self.assertEqual(result.stats["unrolled_loops"], unrolled)
+            self.assertLessEqual(len(result.output.splitlines()), limit)
+            self.assertEqual(result.stats["instruction_budget_left"], limit - len(result.output.splitlines()))
+        # the program alone is larger than the limit
+        result, _, _ = run(SOURCE, machine_dependents=["max-instructions=10"])
+        self.assertEqual(result.stats["unrolled_loops"], 0)
+        self.assertLess(result.stats["instruction_budget_left"], 0)
+
+    def test_nested_loops_and_calls(self):
+        source = """\
+int evens, odds, total;
+int twice(int x) { return x * 2; }
+void main() {
+    evens = 0; odds = 0; total = 0;
+    for (int i = 0; i < 4; i++) {
+        for (int j = 0; j < 3; j++) {
+            evens = evens + i * j + 1;
+        }
+        odds = odds + twice(i);
+    }
+    for (int n = 40; n >= 0; n--) {
+        if (n % 7 == 0) continue;
+        total = total + n;
+    }
+Foo:
+    goto Foo;
+}
+"""
+        _, _, values = run(source, optimize_level=0)
+        self.assertEqual(values, [30, 12, 715])
+        result, _, values = run(source)
+        self.assertEqual(values, [30, 12, 715])
+        self.assertGreater(result.stats["unrolled_loops"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+import context
+from mlogevo.backend import make_backend
+from mlogevo.intermediate import TextQuadrupleParser
+from mlogevo.intermediate.function import Function
+from mlogevo.optimizer import Changes, OptimizerPass, PassManager
+
+FUNCTION = [
+    "__funcbegin f default",
+    "set_i32 1 _a@f",
+    "set_i32 2 _b@f",
+    "set_i32 3 _c@f",
+    ":L",
+    "goto L",
+    "__funcend f",
+]
+
+
+def make_function():
+    return Function("f", None, None, None, TextQuadrupleParser().parse(FUNCTION), [])
+
+
+def remove_one_set(function):
+    """Removes the first set instruction each time"""
+    for (i, ir) in enumerate(function.instructions):
+        if ir.instruction == "set_i32":
+            del function.instructions[i]
+            return Changes.INSTRUCTIONS
+    return Changes.NONE
+
+
+def count_sets(function):
+    return sum(ir.instruction == "set_i32" for ir in function.instructions)
+
+
+class PassManagerTest(unittest.TestCase):
+    def test_group_repeats_until_nothing_changes(self):
+        passes = [OptimizerPass(remove_one_set, "function", 1, "remove-one-set", "cleanup")]
+        function = make_function()
+        pass_manager = PassManager(passes, max_iterations=10)
+        self.assertEqual(pass_manager.run(function, {}, {}), Changes.INSTRUCTIONS)
+        self.assertEqual(count_sets(function), 0)
+        # the last run found nothing to do
+        self.assertEqual((pass_manager.statistics["remove-one-set"].runs,
+                          pass_manager.statistics["remove-one-set"].changes), (4, 3))
+        self.assertEqual(pass_manager.run(function, {}, {}), Changes.NONE)
+
+    def test_iteration_limit(self):
+        function = make_function()
+        PassManager([OptimizerPass(remove_one_set, "function", 1, "remove-one-set", "cleanup")],
+                    max_iterations=2).run(function, {}, {})
+        self.assertEqual(count_sets(function), 1)
+
+    def test_passes_without_group_run_once(self):
+        function = make_function()
+        PassManager([OptimizerPass(remove_one_set, "function", 1)], max_iterations=10).run(function, {}, {})
+        self.assertEqual(count_sets(function), 2)
+
+    def test_time_budget(self):
+        function = make_function()
+        PassManager([OptimizerPass(remove_one_set, "function", 1, "remove-one-set", "cleanup")],
+                    max_iterations=10, time_budget=0.0).run(function, {}, {})
+        self.assertEqual(count_sets(function), 2)
+
+    def test_analyses_are_dropped_when_instructions_change(self):
+        graphs = []
+
+        def analyze(graph, function_name, all_functions, variable_types):
+            graphs.append(graph)
+            self.assertNotIn("seen", graph.analyses)
+            graph.analyses["seen"] = True
+            return Changes.NONE
+
+        def drop_sets(block, function_name, all_functions, variable_types):
+            length = len(block.instructions)
+            block.instructions = [ir for ir in block.instructions if ir.instruction != "set_i32"]
+            return Changes.INSTRUCTIONS if len(block.instructions) != length else Changes.NONE
+
+        function = make_function()
+        PassManager([OptimizerPass(analyze, "basic_block_graph", 1),
+                     OptimizerPass(drop_sets, "basic_block", 2),
+                     OptimizerPass(analyze, "basic_block_graph", 3)]).run(function, {}, {})
+        self.assertIs(graphs[0], graphs[1])
+        self.assertEqual(count_sets(function), 0)
+
+    def test_optimize_iterations_option(self):
+        self.assertEqual(make_backend(optimize_level=1).optimize_iterations, 1)
+        self.assertEqual(make_backend(optimize_level=3).optimize_iterations, 8)
+        backend = make_backend(optimize_level=1, machine_independents=["optimize-iterations=3",
+                                                                       "optimize-time-budget=50"])
+        self.assertEqual((backend.optimize_iterations, backend.optimize_time_budget), (3, 0.05))
+
+
+if __name__ == "__main__":
+    unittest.main()
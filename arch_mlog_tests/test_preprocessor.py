@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mlogevo.frontend.preprocessor import Preprocessor
+from mlogevo.frontend.compilation_error import CompilationError
+
+
+def preprocess(text, include_dirs=(), defines=()):
+    result = Preprocessor(list(include_dirs), list(defines)).preprocess_text(text, "test.c")
+    # drop linemarkers and blank lines
+    return [line for line in result.splitlines() if line and not line.startswith("# ")]
+
+
+class BuiltinPreprocessorTest(unittest.TestCase):
+    def test_macros(self):
+        source = "\n".join([
+            "#define CAT(a, b) a ## b",
+            "#define STR(x) #x",
+            "#define XSTR(x) STR(x)",
+            "#define PI 3.14 /* comment */",
+            "#define SQR(x) ((x) * (x))",
+            "#define f(x) (x + f(x))",
+            "int CAT(var, 1) = SQR(2);",
+            "char *s = XSTR(PI);",
+            "int g = f(f(1));",
+            "int h = SQR(1",
+            "  );",
+        ])
+        self.assertEqual(preprocess(source), [
+            "int var1 = ((2) * (2));",
+            "char *s = \"3.14\";",
+            "int g = ((1 + f(1)) + f((1 + f(1))));",
+            "int h = ((1) * (1));",
+        ])
+
+    def test_conditionals(self):
+        source = "\n".join([
+            "#if MLOGEV_ARCH == 1 && !defined(NOPE) && (7 / -2) == -3",
+            "int a = 1;",
+            "#elif 1",
+            "int a = 2;",
+            "#else",
+            "int a = 3;",
+            "#endif",
+            "#ifdef NOPE",
+            "int b;",
+            "#endif",
+        ])
+        self.assertEqual(preprocess(source, defines=["MLOGEV_ARCH=1"]), ["int a = 1;"])
+        self.assertEqual(preprocess(source, defines=["MLOGEV_ARCH=2"]), ["int a = 2;"])
+
+    def test_include_and_error(self):
+        with tempfile.TemporaryDirectory() as include_dir:
+            os.makedirs(os.path.join(include_dir, "mlogevo"))
+            with open(os.path.join(include_dir, "mlogevo", "io.h"), "w") as f:
+                f.write("#pragma once\n#define ANSWER 42\nint answer = ANSWER;\n")
+            source = "#include <mlogevo/io.h>\n#include \"mlogevo/io.h\"\n#error stop\n"
+            with self.assertRaises(CompilationError) as context:
+                preprocess(source, include_dirs=[include_dir])
+            self.assertEqual(context.exception.error_info["coord"], "test.c:3")
+            self.assertEqual(preprocess(source[:source.index("#error")], include_dirs=[include_dir]),
+                             ["int answer = 42;"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import copy
+import os
+import pickle
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+import context
+from mlogevo.intermediate import Opcode, Quadruple, TextQuadrupleParser
+
+
+class QuadrupleTest(unittest.TestCase):
+    def test_opcode_and_type_suffix(self):
+        ir = Quadruple("cvtf64_i32", "x", "", "y")
+        self.assertIs(ir.opcode, Opcode.CVTF64)
+        self.assertEqual(ir.type_suffix, "i32")
+        ir.instruction = "lteq_f64"
+        self.assertEqual((ir.opcode, ir.type_suffix), (Opcode.LTEQ, "f64"))
+        self.assertEqual(Quadruple("__funcbegin", "main", "", "default").type_suffix, "")
+        self.assertIs(Quadruple("ELIMINATED").opcode, Opcode.UNKNOWN)
+
+    def test_operand_types_follow_operands(self):
+        ir = Quadruple("add_i32", "_a@f", "0x10", "_b@f")
+        self.assertEqual((ir.src1_type, ir.src2_type), ("variable", "immediate_integer"))
+        ir.src1, ir.src2 = "2.5", ""
+        self.assertEqual((ir.src1_type, ir.src2_type), ("immediate_float", "invalid"))
+
+    def test_shared_empty_operands(self):
+        first, second = Quadruple("set_i32", "1", "", "x"), Quadruple("goto", "L")
+        self.assertIs(first.input_vars, second.input_vars)
+        self.assertEqual(len(first.raw_instructions), 0)
+
+    def test_copy_pickle_and_text_format(self):
+        lines = ["__funcbegin main default", "add_i32 _a@main 1 _b@main", "if _b@main lt_i32 3 goto L",
+                 "__asmvbegin 1 _b@main", "print %0", "__asmvend 0", ":L", "__funcend main"]
+        ir_list = TextQuadrupleParser().parse(lines)
+        self.assertEqual("\n".join(ir.dump() for ir in ir_list), "\n".join(lines))
+        for ir in ir_list:
+            self.assertEqual(copy.copy(ir), ir)
+            self.assertEqual(pickle.loads(pickle.dumps(ir)), ir)
+        self.assertEqual(ir_list[1].src1_type, "variable")
+        self.assertEqual(ir_list[1].src2_type, "immediate_integer")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import compile_and_run
+from mlogevo import CompileOptions, compile_source
+
+SOURCE = """\
+int out;
+int helper(int x) { return x * 3; }
+int unused1(int x) { return helper(x) + 1; }
+int unused2(int x) { return unused1(x) * 2; }
+__attribute__((used)) int from_asm(int x) { return x - 1; }
+inline int calls_helper(int x) { return helper(x) + 7; }
+int in_dead_code(int x) { return x + 100; }
+void main() {
+    int k = 5;
+    out = calls_helper(2);
+    if (k < 0) {
+        out = in_dead_code(out);
+    }
+Foo:
+    goto Foo;
+}
+"""
+
+
+def compile_with(optimize_level, machine_independents=()):
+    return compile_source(SOURCE, CompileOptions(optimize_level=optimize_level, preprocessor="builtin",
+                                                 machine_independents=list(machine_independents)))
+
+
+class RemoveUnusedFunctionsTest(unittest.TestCase):
+    def test_removed(self):
+        result, values, _ = compile_and_run(SOURCE, ("out", ), CompileOptions(optimize_level=0, preprocessor="builtin"))
+        self.assertEqual(values, [13])
+        self.assertEqual(result.stats["removed_functions"], 2)
+        self.assertNotIn("unused", result.output)
+        for name in ("helper", "from_asm", "calls_helper", "in_dead_code"):
+            self.assertIn(f"set @counter retaddr@{name}", result.output.splitlines())
+
+    def test_called_from_unreachable_code(self):
+        result = compile_with(1)
+        self.assertEqual(result.stats["removed_functions"], 3)
+        self.assertNotIn("in_dead_code", result.output)
+        self.assertIn("set @counter retaddr@from_asm", result.output.splitlines())
+
+    def test_kept(self):
+        result = compile_with(1, ["no-remove-unused-functions"])
+        self.assertNotIn("removed_functions", result.stats)
+        for name in ("unused1", "unused2", "in_dead_code"):
+            self.assertIn(f"set @counter retaddr@{name}", result.output.splitlines())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import run
+from mlogevo.intermediate import Opcode
+from mlogevo.optimizer.constant_folding import evaluate, format_number, parse_number
+from mlogevo.optimizer.mi_sccp import propagate_constants
+
+
+class ConstantFoldingTest(unittest.TestCase):
+    def test_mlog_arithmetic(self):
+        # op idiv floors, op mod keeps the sign of the dividend
+        self.assertEqual(evaluate(Opcode.DIV, "i32", -7, 2), -4)
+        self.assertEqual(evaluate(Opcode.DIV, "f64", -7, 2), -3.5)
+        self.assertEqual(evaluate(Opcode.REM, "i32", -7, 3), -1)
+        # shifts of longs, the count is taken modulo 64
+        self.assertEqual(evaluate(Opcode.LSH, "i32", 1, 65), 2)
+        self.assertEqual(evaluate(Opcode.LSH, "i32", 1, 63), float(-(1 << 63)))
+        self.assertEqual(evaluate(Opcode.RSH, "i32", -8, 1), -4)
+        self.assertEqual(evaluate(Opcode.AND, "i32", 7.9, 3), 3)
+        # op xor x a 0xFFFFFFFF
+        self.assertEqual(evaluate(Opcode.NOT, "i32", 0), 0xFFFFFFFF)
+        self.assertEqual(evaluate(Opcode.EQ, "f64", 0.1 + 0.2, 0.3), 1)
+        self.assertIsNone(evaluate(Opcode.DIV, "f64", 1, 0))
+        self.assertIsNone(evaluate(Opcode.REM, "i32", 1, 0))
+
+    def test_immediates(self):
+        self.assertEqual(parse_number("0x1F"), 31)
+        self.assertEqual(parse_number("-2.5"), -2.5)
+        self.assertIsNone(parse_number("_x@f"))
+        self.assertEqual(parse_number("false"), 0)
+        self.assertEqual(parse_number("true"), 1)
+        self.assertEqual(format_number(3.0), "3")
+        self.assertEqual(format_number(0.25), "0.25")
+        self.assertIsNone(format_number(1e300))
+
+
+class ConstantPropagationTest(unittest.TestCase):
+    def test_fold_across_blocks_and_branches(self):
+        result, _ = run(propagate_constants, [
+            "__funcbegin f default",
+            "set_i32 7 _a@f",
+            "mul_i32 _a@f 3 _b@f",
+            "if _b@f lteq_i32 10 goto ELSE",
+            "div_i32 _b@f 4 result@f",
+            "goto END",
+            ":ELSE",
+            "set_i32 0 result@f",
+            ":END",
+            "add_i32 result@f _n@f _c@f",
+            "__funcend f",
+        ])
+        self.assertEqual(result, [
+            "__funcbegin f default",
+            "set_i32 7 _a@f",
+            "set_i32 21 _b@f",
+            "set_i32 5 result@f",
+            "goto END",
+            ":END",
+            "add_i32 5 _n@f _c@f",
+            "__funcend f",
+        ])
+
+    def test_loops_and_calls(self):
+        result, _ = run(propagate_constants, [
+            "__funcbegin f default",
+            "set_i32 0 _i@f",
+            "set_i32 1 _k@f",
+            "set_i32 1 counter",
+            ":LOOP",
+            "mul_i32 _k@f 1 _k@f",
+            "add_i32 _i@f _k@f _i@f",
+            "__call g",
+            "add_i32 counter 1 _c@f",
+            "if _i@f lt_i32 10 goto LOOP",
+            "__funcend f",
+        ])
+        # _k@f is 1 on both edges into the loop, _i@f changes, calls may change counter
+        self.assertIn("set_i32 1 _k@f", result)
+        self.assertIn("add_i32 _i@f 1 _i@f", result)
+        self.assertIn("add_i32 counter 1 _c@f", result)
+        self.assertIn("if _i@f lt_i32 10 goto LOOP", result)
+
+    def test_constant_conditions(self):
+        # if (0) and while (1), compared with the builtin false
+        result, _ = run(propagate_constants, [
+            "__funcbegin f default",
+            "ifnot 0 ne_i32 false goto END",
+            "set_i32 99 _r@f",
+            "mul_i32 _r@f 3 s",
+            ":END",
+            ":LOOP",
+            "add_i32 n 1 n",
+            "if 1 ne_i32 false goto LOOP",
+            "__funcend f",
+        ])
+        self.assertEqual(result, [
+            "__funcbegin f default",
+            "goto END",
+            ":END",
+            ":LOOP",
+            "add_i32 n 1 n",
+            "goto LOOP",
+            "__funcend f",
+        ])
+
+    def test_strict_32bit(self):
+        lines = [
+            "__funcbegin f default",
+            "minus_i32 1 _a@f",
+            "add_i32 _a@f 2 result@f",
+            "__funcend f",
+        ]
+        self.assertEqual(run(propagate_constants, lines)[0][1:3], ["set_i32 -1 _a@f", "set_i32 1 result@f"])
+        # 4294967295 + 2, masked
+        self.assertEqual(run(propagate_constants, lines, ["strict-32bit"])[0][1:3],
+                         ["set_i32 4294967295 _a@f", "set_i32 1 result@f"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import run
+from mlogevo.optimizer import Changes
+from mlogevo.optimizer.mi_simplify_cfg import simplify_control_flow
+
+
+class SimplifyControlFlowTest(unittest.TestCase):
+    def test_jump_threading(self):
+        result, changes = run(simplify_control_flow, [
+            "__funcbegin f default",
+            ":LOOP",
+            "add_i32 _i@f 1 _i@f",
+            "if _i@f lt_i32 10 goto A",
+            "set_i32 _i@f result@f",
+            "__return f",
+            ":A",
+            ":B",
+            "goto LOOP",
+            "__funcend f",
+        ])
+        self.assertIn("if _i@f lt_i32 10 goto LOOP", result)
+        self.assertNotIn(":A", result)
+        self.assertEqual(changes, Changes.ALL)
+
+    def test_jump_to_next(self):
+        result, _ = run(simplify_control_flow, [
+            "__funcbegin f default",
+            "ifnot _a@f gt_i32 0 goto END",
+            ":IFTRUE",
+            "goto END",
+            ":END",
+            "set_i32 _a@f result@f",
+            "__funcend f",
+        ])
+        self.assertEqual(result, ["__funcbegin f default", "set_i32 _a@f result@f", "__funcend f"])
+
+    def test_inversion(self):
+        lines = [
+            "__funcbegin f default",
+            ":LOOP",
+            "add_i32 _i@f 1 _i@f",
+            "if _i@f gteq_i32 10 goto DONE",
+            "goto LOOP",
+            ":DONE",
+            "set_i32 _i@f result@f",
+            "__funcend f",
+        ]
+        result, _ = run(simplify_control_flow, lines)
+        self.assertEqual(result[2:4], ["add_i32 _i@f 1 _i@f", "ifnot _i@f gteq_i32 10 goto LOOP"])
+        self.assertNotIn("goto LOOP", result)
+        # strictEqual and notEqual are not opposite
+        lines[3] = "if _o@f eq_obj null goto DONE"
+        result, _ = run(simplify_control_flow, lines)
+        self.assertIn("goto LOOP", result)
+
+    def test_goto_return(self):
+        result, _ = run(simplify_control_flow, [
+            "__funcbegin f default",
+            "ifnot _a@f gt_i32 0 goto ELSE",
+            "set_i32 1 result@f",
+            "goto END",
+            ":ELSE",
+            "set_i32 2 result@f",
+            ":END",
+            "__funcend f",
+        ])
+        self.assertEqual(result, [
+            "__funcbegin f default",
+            "ifnot _a@f gt_i32 0 goto ELSE",
+            "set_i32 1 result@f",
+            "__return f",
+            ":ELSE",
+            "set_i32 2 result@f",
+            "__funcend f",
+        ])
+
+    def test_block_moves_after_its_only_jump(self):
+        result, _ = run(simplify_control_flow, [
+            "__funcbegin f default",
+            "set_i32 0 _i@f",
+            "goto BODY",
+            ":OTHER",
+            "set_i32 1 result@f",
+            "__return f",
+            ":BODY",
+            "add_i32 _i@f 1 _i@f",
+            "goto OTHER",
+            "__funcend f",
+        ])
+        self.assertEqual(result[:4], ["__funcbegin f default", "set_i32 0 _i@f", "add_i32 _i@f 1 _i@f",
+                                      "set_i32 1 result@f"])
+        self.assertNotIn("goto BODY", result)
+
+    def test_endless_loop_stays(self):
+        lines = [
+            "__funcbegin main default",
+            "set_i32 1 x",
+            ":Foo",
+            "goto Foo",
+            "__funcend main",
+        ]
+        result, changes = run(simplify_control_flow, lines)
+        self.assertEqual(result, lines)
+        self.assertEqual(changes, Changes.NONE)
+
+
+if __name__ == "__main__":
+    unittest.main()
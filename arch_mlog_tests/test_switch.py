@@ -0,0 +1,89 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import compile_and_run, compile_and_test, module_abspath
+from mlogevo import CompileOptions, compile_source
+from mlogevo.frontend import CompilationError
+from mlogevo.intermediate import TextQuadrupleParser
+from mlogevo.intermediate.ir_quadruple import Opcode
+
+SOURCE = """\
+int out, x = %d;
+void main() {
+    switch (x) {
+    case %s: out = 1; break;
+    case %s: out = 2; break;
+    case %s: out = 3;
+    case %s: out = out + 4; break;
+    case %s: out = 5; break;
+    default: out = 6;
+    }
+Foo:
+    goto Foo;
+}
+"""
+
+
+def compile_switch(x, cases, optimize_level=0):
+    source = SOURCE % (x, *cases)
+    result, (out, ), _ = compile_and_run(source, ("out", ),
+                                         CompileOptions(optimize_level=optimize_level, preprocessor="builtin"))
+    return result, out
+
+
+def jump_tables(result):
+    return [ir for ir in result.ir if ir.opcode is Opcode.JUMPTABLE]
+
+
+class SwitchTest(unittest.TestCase):
+    def test_dense_cases(self):
+        cases = (2, 3, 4, 5, 7)
+        for (x, expected) in ((2, 1), (3, 2), (4, 7), (5, 4), (6, 6), (7, 5), (1, 6), (8, 6), (-3, 6)):
+            result, out = compile_switch(x, cases)
+            self.assertEqual(out, expected, x)
+            tables = jump_tables(result)
+            self.assertEqual(len(tables), 1)
+            # starts at 0 rather than subtracting 2: the entries below go to default
+            self.assertEqual(tables[0].src1, "x")
+            self.assertEqual(len(tables[0].raw_instructions), 8)
+        self.assertIn("op add @counter @counter x", result.output.splitlines())
+
+    def test_sparse_cases(self):
+        cases = (-500, 3, 40, 1000, 99999)
+        for (x, expected) in ((-500, 1), (3, 2), (40, 7), (1000, 4), (99999, 5), (41, 6), (-501, 6)):
+            result, out = compile_switch(x, cases)
+            self.assertEqual(out, expected, x)
+            self.assertEqual(jump_tables(result), [])
+
+    def test_constant_index(self):
+        # y is local: known to be 5 where the table reads it, which jumps straight to its case
+        source = (SOURCE % (0, 2, 3, 4, 5, 7)).replace("switch (x)", "int y = 5;\n    switch (y)")
+        result = compile_source(source, CompileOptions(optimize_level=1, preprocessor="builtin"))
+        self.assertEqual(jump_tables(result), [])
+        self.assertEqual(result.output.splitlines()[:2], ["set x 0", "op add out out 4"])
+
+    def test_strict_32bit(self):
+        # case values are masked like the switch quantity, -7 is 4294967289 and sorts after 8
+        source = os.path.join(module_abspath, "sources", "switch_case.c")
+        for optimize_level in range(4):
+            compile_and_test(self, source, CompileOptions(optimize_level=optimize_level, preprocessor="builtin",
+                                                          machine_dependents=["strict-32bit"]))
+
+    def test_text_format(self):
+        line = "__jumptable _x@f CASE_0 DEFAULT CASE_2"
+        ir = TextQuadrupleParser().parse([line])[0]
+        self.assertEqual(ir.opcode, Opcode.JUMPTABLE)
+        self.assertEqual(list(ir.raw_instructions), ["CASE_0", "DEFAULT", "CASE_2"])
+        self.assertEqual(ir.dump(), line)
+
+    def test_errors(self):
+        for (cases, reason) in (((1, 2, 2, 3, 4), "duplicate case value 2"),
+                                ((1, 2, "x", 3, 4), "case label is not an integer constant")):
+            with self.assertRaises(CompilationError) as context:
+                compile_switch(0, cases)
+            self.assertEqual(context.exception.error_info["reason"], reason)
+
+
+if __name__ == "__main__":
+    unittest.main()
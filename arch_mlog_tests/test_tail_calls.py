@@ -0,0 +1,128 @@
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from context import compile_and_run
+from mlogevo import CompileOptions
+from mlogevo.intermediate import TextQuadrupleParser
+from mlogevo.intermediate.function import Function
+from mlogevo.optimizer import Changes
+from mlogevo.optimizer.mi_tail_calls import eliminate_tail_recursion
+
+STATE_MACHINE = """\
+int state, steps, total, done;
+void idle();
+void run();
+void dispatch() {
+    steps = steps + 1;
+    if (state == 0) { idle(); return; }
+    if (state == 1) { run(); return; }
+    total = total + 1000;
+}
+void idle() { total = total + 1; state = 1; dispatch(); }
+void run() { total = total + 10; state = 2; dispatch(); }
+__attribute__((noinline)) void start(int first) { state = first; }
+void main() {
+    steps = 0; total = 0;
+    start(0);
+    dispatch();
+    done = 1;
+Foo:
+    goto Foo;
+}
+"""
+
+
+def run(source, names, optimize_level=2, machine_independents=(), limit=10000):
+    result, values, _ = compile_and_run(source, names, CompileOptions(
+        optimize_level=optimize_level, preprocessor="builtin", machine_independents=list(machine_independents)),
+        limit=limit)
+    return result, values
+
+
+class TailRecursionTest(unittest.TestCase):
+    def test_loop(self):
+        lines = [
+            "__funcbegin f default",
+            "decl_i32 default result@f",
+            "decl_i32 argument _n@f",
+            "ifnot _n@f gt_i32 0 goto END",
+            "sub_i32 _n@f 1 _n@f",
+            "__call f",
+            "set_i32 result@f ___vtmp_1@f",
+            "set_i32 ___vtmp_1@f result@f",
+            "__return f",
+            ":END",
+            "set_i32 0 result@f",
+            "__funcend f",
+        ]
+        function = Function("f", None, [], {}, TextQuadrupleParser().parse(lines), ["default"])
+        self.assertEqual(eliminate_tail_recursion(function), Changes.ALL)
+        self.assertEqual([ir.dump() for ir in function.instructions], [
+            *lines[:3],
+            ":__MLOGEV_TAIL_RECURSION_f__",
+            *lines[3:5],
+            "goto __MLOGEV_TAIL_RECURSION_f__",
+            *lines[9:],
+        ])
+        # the result of the call is not returned
+        lines[7] = "set_i32 ___vtmp_1@f out"
+        function = Function("f", None, [], {}, TextQuadrupleParser().parse(lines), ["default"])
+        self.assertEqual(eliminate_tail_recursion(function), Changes.NONE)
+
+    def test_arguments_read_before_parameters_are_set(self):
+        source = """\
+int out1, out2;
+int sum(int n, int acc) { if (n <= 0) return acc; return sum(n - 1, acc + n); }
+int gcd(int a, int b) { if (b == 0) return a; return gcd(b, a % b); }
+void main() {
+    out1 = sum(10, 0);
+    out2 = gcd(84, 36);
+Foo:
+    goto Foo;
+}
+"""
+        for optimize_level in (1, 2):
+            result, values = run(source, ("out1", "out2"), optimize_level)
+            self.assertEqual(values, [55, 12])
+            # called from main() only
+            self.assertEqual(result.output.count("op add retaddr@sum @counter 1"),
+                             1 if optimize_level == 1 else 0)
+
+
+class SiblingCallsTest(unittest.TestCase):
+    def test_state_machine(self):
+        result, values = run(STATE_MACHINE, ("state", "steps", "total", "done"))
+        self.assertEqual(values, [2, 3, 1011, 1])
+        self.assertEqual(result.stats["tail_calls"], 4)
+        lines = result.output.splitlines()
+        self.assertIn("set retaddr@dispatch retaddr@idle", lines)
+        self.assertIn("set retaddr@idle retaddr@dispatch", lines)
+        # each call overwrites the return address of a dispatch() still running: the state machine
+        # finishes, but never returns to main()
+        result, values = run(STATE_MACHINE, ("state", "steps", "total", "done"),
+                             machine_independents=["no-optimize-sibling-calls"])
+        self.assertNotIn("tail_calls", result.stats)
+        self.assertEqual(values, [2, 3, 1011, None])
+
+    def test_main(self):
+        source = """\
+int runs, total;
+__attribute__((noinline)) void work(int k) { total = total + k; }
+void main() {
+    runs = runs + 1;
+    work(runs);
+}
+"""
+        # 6 instructions a run
+        result, values = run(source, ("runs", "total"), limit=30)
+        self.assertEqual(values, [5, 15])
+        # work() returns to the start of the program, as main() would
+        lines = result.output.splitlines()
+        entry = lines.index("op add total total _k@work")
+        call = lines.index("set retaddr@work 0")
+        self.assertRegex(lines[call + 1], rf"^jump {entry} always\b")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Scaling of the bit-vector dataflow analyses (mlogevo.optimizer.dataflow).
+
+    python benchmarks/dataflow.py [--sizes 250 500 1000 2000 4000]
+
+A synthetic function of n segments, each with a branch, a loop and fresh variables,
+so blocks and variables both grow with n. Time per block should stay roughly flat.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from mlogevo.backend.control_flow_graph import ControlFlowGraph
+from mlogevo.intermediate import Quadruple
+from mlogevo.optimizer.dataflow import AvailableExpressions, Liveness, ReachingDefinitions
+
+
+def make_function(n: int):
+    ir_list = [Quadruple("__funcbegin", "f", "", "default"), Quadruple("set_i32", "0", "", "_acc@f")]
+    for i in range(n):
+        x, y = f"_x{i}@f", f"_y{i}@f"
+        ir_list += [
+            Quadruple("add_i32", "_acc@f", str(i), x),
+            Quadruple("mul_i32", x, "3", y),
+            Quadruple("if", x, "10", f"ELSE_{i}", relop="lt_i32"),
+            Quadruple("sub_i32", y, "_acc@f", y),
+            Quadruple("goto", f"JOIN_{i}"),
+            Quadruple("label", f"ELSE_{i}"),
+            Quadruple("add_i32", y, x, y),
+            Quadruple("label", f"JOIN_{i}"),
+            Quadruple("label", f"LOOP_{i}"),
+            Quadruple("sub_i32", y, "1", y),
+            Quadruple("add_i32", "_acc@f", y, "_acc@f"),
+            Quadruple("if", y, "0", f"LOOP_{i}", relop="gt_i32"),
+        ]
+        if i % 16 == 0:
+            ir_list.append(Quadruple("__call", "g"))
+    ir_list += [Quadruple("set_i32", "_acc@f", "", "result@f"), Quadruple("__funcend", "f")]
+    return ir_list
+
+
+def best_time(function, runs: int) -> float:
+    best = None
+    for _ in range(runs):
+        begin = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250, 500, 1000, 2000, 4000])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    analyses = {"liveness": Liveness, "reaching definitions": ReachingDefinitions,
+                "available expressions": AvailableExpressions}
+    print(f"{'segments':>8} {'blocks':>7} {'instructions':>12}  " +
+          "  ".join(f"{name + ' (us/block)':>32}" for name in analyses))
+    for n in args.sizes:
+        ir_list = make_function(n)
+        graph = ControlFlowGraph(ir_list)
+        blocks = len(graph.order)
+        timings = [best_time(lambda: analysis(graph, "f"), args.runs) for analysis in analyses.values()]
+        print(f"{n:>8} {blocks:>7} {len(ir_list):>12}  " +
+              "  ".join(f"{seconds * 1000:>16.1f} ms ({seconds / blocks * 1e6:6.1f})" for seconds in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Micro-benchmark of IR construction: Quadruple objects per second.
+
+    python benchmarks/ir_construction.py [--count 200000]
+
+"construct" builds instructions from a realistic operand mix,
+"construct + types" also reads src1_type and src2_type of each of them,
+"rewrite operands" assigns src1 and reads its type, as optimizers do.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from mlogevo.intermediate import Quadruple
+
+OPERANDS = [f"_x{i}@f" for i in range(64)] + [f"___vtmp_{i}@f" for i in range(64)] \
+    + [str(i) for i in range(32)] + ["0x1F", "3.5", "-1", "@unit", "1e3"]
+
+
+def construct(count: int):
+    n = len(OPERANDS)
+    return [Quadruple("add_i32", OPERANDS[i % n], OPERANDS[(i * 7) % n], OPERANDS[(i * 3) % 128])
+            for i in range(count)]
+
+
+def construct_and_classify(count: int):
+    ir_list = construct(count)
+    for ir in ir_list:
+        ir.src1_type, ir.src2_type
+    return ir_list
+
+
+def rewrite_operands(ir_list):
+    n = len(OPERANDS)
+    for (i, ir) in enumerate(ir_list):
+        ir.src1 = OPERANDS[(i * 5) % n]
+        ir.src1_type
+
+
+def best_rate(function, count: int, runs: int) -> float:
+    best = None
+    for _ in range(runs):
+        begin = time.perf_counter()
+        function(count)
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    ir_list = construct(args.count)
+    cases = {
+        "construct": construct,
+        "construct + types": construct_and_classify,
+        "rewrite operands": lambda count: rewrite_operands(ir_list),
+    }
+    for (name, function) in cases.items():
+        print(f"{name:20} {best_rate(function, args.count, args.runs) / 1000:8.0f}k quadruples/s")
+
+
+if __name__ == '__main__':
+    main()
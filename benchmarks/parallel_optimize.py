@@ -0,0 +1,67 @@
+"""
+Compare serial and -fparallel-optimize=N optimization on a synthetic program.
+
+    python benchmarks/parallel_optimize.py [--functions 400] [--workers 4] [-O 1]
+
+Checks that outputs are identical, and prints the time spent in optimization.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from mlogevo import CompileOptions, compile_source
+
+
+def make_program(function_count: int) -> str:
+    functions = []
+    for i in range(function_count):
+        statements = []
+        for j in range(12):
+            statements.append(f"a = b * {j} + c; b = a * {j} + c; c = a + b * {j};")
+            statements.append(f"if (a > {j}) {{ g{i} = a + b; }} else {{ g{i} = g{i} - c; }}")
+        body = "\n    ".join(statements)
+        functions.append(f"int g{i};\nvoid f{i}(int a, int b) {{\n    int c = a + b;\n    {body}\n}}\n")
+    calls = "".join(f"    f{i}({i}, {i + 1});\n" for i in range(function_count))
+    return "".join(functions) + f"void main() {{\n{calls}}}\n"
+
+
+def measure(source: str, options: CompileOptions, runs: int):
+    backend = options.make_backend()
+    best = None
+    output = ""
+    for _ in range(runs):
+        result = compile_source(source, options, backend=backend)
+        output = result.output
+        if best is None or result.stats["optimize_seconds"] < best:
+            best = result.stats["optimize_seconds"]
+    return best, output
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--functions", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("-O", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    source = make_program(args.functions)
+    serial_options = CompileOptions(optimize_level=args.O, preprocessor="builtin")
+    parallel_options = CompileOptions(optimize_level=args.O, preprocessor="builtin",
+                                      machine_independents=[f"parallel-optimize={args.workers}"])
+    serial_time, serial_output = measure(source, serial_options, args.runs)
+    # the first run starts the worker processes, best of runs leaves it out
+    parallel_time, parallel_output = measure(source, parallel_options, args.runs + 1)
+    if serial_output != parallel_output:
+        print("outputs differ", file=sys.stderr)
+        exit(1)
+    print(f"{args.functions} functions, {len(serial_output.splitlines())} mlog instructions")
+    print(f"serial optimization:                      {serial_time * 1000:8.1f} ms")
+    print(f"-fparallel-optimize={args.workers:<3} optimization:      {parallel_time * 1000:8.1f} ms "
+          f"({serial_time / parallel_time:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
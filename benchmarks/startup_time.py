@@ -0,0 +1,67 @@
+"""
+Measure startup time of the mlogevo command line.
+
+    python benchmarks/startup_time.py [--runs N] [--max-ms MS]
+
+Every case runs in a fresh interpreter, the median wall time is reported.
+With --max-ms, exits with status 1 if any case is slower, so it can guard CI.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sample_source = os.path.join(repo_root, "arch_mlog_tests", "sources", "lcse_test_1.c")
+
+
+def run_once(argv, env) -> float:
+    begin = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "mlogevo"] + argv, cwd=repo_root, env=env,
+                   stdout=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - begin) * 1000
+
+
+def measure(argv, env, runs: int) -> float:
+    return statistics.median(run_once(argv, env) for _ in range(runs))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="fail if the median of any case is above this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, MLOGEVO_CACHE_DIR=cache_dir)
+        compile_argv = ["--preprocessor=builtin", "-o", "-", sample_source]
+        # warm up parser tables and the compilation cache
+        run_once(compile_argv, env)
+        cases = {
+            "python -c pass": None,
+            "mlogevo --help": ["--help"],
+            "compile (cache hit)": compile_argv,
+            "compile (--no-cache)": ["--no-cache"] + compile_argv,
+        }
+        failed = False
+        for (name, argv) in cases.items():
+            if argv is None:
+                begin = time.perf_counter()
+                subprocess.run([sys.executable, "-c", "pass"], check=True)
+                elapsed = (time.perf_counter() - begin) * 1000
+            else:
+                elapsed = measure(argv, env, args.runs)
+            print(f"{name:24} {elapsed:8.1f} ms")
+            if argv is not None and args.max_ms is not None and elapsed > args.max_ms:
+                failed = True
+    if failed:
+        print(f"startup time regressed: above {args.max_ms} ms", file=sys.stderr)
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
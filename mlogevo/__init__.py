@@ -0,0 +1,3 @@
+__version__ = "0.0.11"
+
+from .api import CompileOptions, CompileResult, compile_source
@@ -1,16 +1,27 @@
 import argparse
+import os
 import sys
 import logging
 
-from .frontend import Compiler, CompilationError
-from .backend import make_backend, ARCH_ID
-from .intermediate.quadruple_from_text import extract_functions_from_ir, TextQuadrupleParser
-from typing import Tuple
+from .frontend import CompilationError
+from .driver import compile_one, make_cache, report_compilation_error, write_output
+from typing import List
 
 parser = argparse.ArgumentParser(prog="mlogevo")
-parser.add_argument("source_file", type=str, nargs='?', default='')
-parser.add_argument("-o", type=str, nargs='?', default="a.mlog.txt",
-        help="output file, '-' for stdout", dest="output")
+parser.add_argument("source_file", type=str, nargs='*')
+parser.add_argument("-o", type=str, action="append",
+        help="output file, '-' for stdout (default: a.mlog.txt). "
+             "With several source files, give one -o for each of them", dest="output")
+parser.add_argument("--output-dir", type=str, default=None,
+        help="write outputs of all source files to this directory")
+parser.add_argument("-j", type=int, default=1, dest="jobs",
+        help="compile up to N source files in parallel, 0 for one process per CPU")
+parser.add_argument("--serve", type=str, nargs='?', const='-', default=None, metavar="SOCKET",
+        help="run a compile server reading JSON requests from a Unix socket, or stdin if SOCKET is omitted. "
+             "-j limits the number of worker processes")
+parser.add_argument("--watch", action="store_true",
+        help="recompile the source file whenever it or its headers change, "
+             "optimizing only the functions that changed")
 
 parser.add_argument("-O", type=int, choices=range(0, 4), default=1,
         help="optimize level, default 1")
@@ -26,8 +37,8 @@ parser.add_argument("-print-basic-blocks", action="store_true",
         help="dump basic blocks")
 parser.add_argument("-skip-preprocess", action="store_false",
         help="do not invoke `cpp` or `gcc -E`")
-parser.add_argument("--preprocessor", choices=("gcc", "tcc", "cpp"), default="gcc",
-        help="Preprocessor to invoke")
+parser.add_argument("--preprocessor", choices=("gcc", "tcc", "cpp", "builtin"), default="gcc",
+        help="Preprocessor to invoke, \"builtin\" runs in-process without forking")
 parser.add_argument("-x", type=str, choices=("c", "mlogev_ir"), default="c",
         help="Specify type of input file, \"C\" by default.")
 
@@ -37,6 +48,16 @@ parser.add_argument("-march", type=str, choices=("mlog", ), default="mlog",
 parser.add_argument("-mtarget", type=str, choices=("mlog", "mlogev_ir"), default="mlog",
         help="output format, default mlog")
 
+# compilation cache
+parser.add_argument("--cache-dir", type=str, default=None,
+        help="compilation cache directory (default: $MLOGEVO_CACHE_DIR or ~/.cache/mlogevo)")
+parser.add_argument("--no-cache", action="store_true",
+        help="do not read or write the compilation cache")
+parser.add_argument("--cache-size", type=int, default=64,
+        help="maximum size of the compilation cache in MiB, default 64")
+parser.add_argument("--cache-stats", action="store_true",
+        help="print compilation cache statistics to stderr")
+
 # debug logs
 parser.add_argument("--log-level", type=str, choices=("DEBUG", "INFO", "WARNING", "ERROR", "FATAL"),
         default="FATAL",
@@ -56,24 +77,21 @@ _nameToLevel = {
 }
 
 
-def use_compiler(frontend, args, cpp, cpp_args) -> Tuple:
-    try:
-        frontend_result = frontend.compile(
-            args.source_file,
-            use_cpp=args.skip_preprocess,
-            cpp_path=cpp,
-            cpp_args=cpp_args
-        )
-        return frontend_result
-    except CompilationError as exception:
-        error_info = exception.error_info
-        reason = error_info.get("reason")
-        optional_coord = error_info.get("coord", "")
-        if reason is not None:
-            print(f"{optional_coord or args.source_file}: error: {reason}", file=sys.stderr)
-            exit(1)
-        else:
-            raise exception
+def get_output_files(args) -> List[str]:
+    sources = args.source_file
+    suffix = ".mlog.txt" if args.mtarget == "mlog" else ".mlogev_ir.txt"
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        return [os.path.join(args.output_dir, os.path.splitext(os.path.basename(source))[0] + suffix)
+                for source in sources]
+    if len(sources) == 1:
+        # like gcc, the last -o wins
+        return [args.output[-1] if args.output else "a.mlog.txt"]
+    if not args.output:
+        return [os.path.splitext(source)[0] + suffix for source in sources]
+    if len(args.output) != len(sources):
+        parser.error(f"got {len(sources)} source files but {len(args.output)} -o options")
+    return args.output
 
 
 def main(argv=None):
@@ -84,41 +102,50 @@ def main(argv=None):
     logging.basicConfig(level=_nameToLevel[args.log_level])
     if args.log_file != "-":
         logging.basicConfig(filename=args.log_file, level=_nameToLevel[args.log_level])
+    if args.serve is not None:
+        from .server import serve
+        serve(parser, args)
+        return
     if not args.source_file:
         parser.print_help()
         return
 
-    cpp_args = [f"-DMLOGEV_ARCH={ARCH_ID[args.march]}", ]
-    if args.preprocessor != "cpp":
-        cpp_args.append("-E")
-    if args.I:
-        cpp_args.extend( ["-I"+path for path in args.I ] )
-    if args.D:
-        cpp_args.extend( ["-D"+path for path in args.D ] )
-    # TODO: choose compiler by -march
-    frontend = Compiler()
-    backend = make_backend(
-        arch=args.march,
-        target=args.mtarget,
-        machine_dependents=args.m or [],
-        machine_independents=args.f or [],
-        optimize_level=args.O,
-    )
-    frontend_result: Tuple = ()
-    if args.x == "c":
-        frontend_result = use_compiler(frontend, args, args.preprocessor, cpp_args)
-    elif args.x == "mlogev_ir":
-        text_parser = TextQuadrupleParser()
-        with open(args.source_file, "r") as f:
-            ir_list = text_parser.parse(f)
-            frontend_result = extract_functions_from_ir(ir_list)
-
-    result = backend.compile(frontend_result, dump_blocks=args.print_basic_blocks)
-    if args.output == '-':
-        print(result)
+    output_files = get_output_files(args)
+    if args.watch:
+        if len(args.source_file) != 1:
+            parser.error("--watch takes exactly one source file")
+        from .watch import watch
+        watch(args, args.source_file[0], output_files[0])
+        return
+    if len(args.source_file) > 1:
+        from .batch import compile_batch
+        statuses = compile_batch(args, list(zip(args.source_file, output_files)))
+        for (source_file, status) in zip(args.source_file, statuses):
+            print(f"{source_file}: {'ok' if status == 0 else 'failed'} (exit status {status})",
+                  file=sys.stderr)
+        print_cache_stats(args)
+        if any(statuses):
+            exit(1)
+        return
+
+    source_file = args.source_file[0]
+    cache = make_cache(args)
+    try:
+        result = compile_one(args, source_file, cache=cache)
+    except CompilationError as exception:
+        report_compilation_error(exception, source_file)
+        exit(1)
+    if cache is not None:
+        cache.record_stats()
+    print_cache_stats(args)
+    write_output(result, output_files[0])
+
+
+def print_cache_stats(args):
+    cache = make_cache(args)
+    if cache is None or not args.cache_stats:
         return
-    with open(args.output, "w") as f:
-        f.write(result)
+    print(cache.describe(cache.record_stats()), file=sys.stderr)
 
 
 if __name__ == '__main__':
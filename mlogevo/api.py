@@ -0,0 +1,170 @@
+"""
+Compile in memory, without argv, temporary files or stdout:
+
+    import mlogevo
+    result = mlogevo.compile_source("void main() { print(1); }", mlogevo.CompileOptions(optimize_level=2))
+    print(result.output)
+
+Raises CompilationError (or RuntimeError / CalledProcessError if the external preprocessor fails).
+"""
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, IO, List, Optional, Union, TYPE_CHECKING
+
+from .backend import ARCH_ID
+from .compile_cache import CompilationCache, make_cache_key
+# The frontend and backend are imported when needed, a cache hit does not pay for them.
+if TYPE_CHECKING:
+    from .backend import Backend
+    from .intermediate import Quadruple
+
+
+def read_text(filename: str) -> str:
+    try:
+        with open(filename) as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+@dataclass
+class CompileOptions:
+    """Same meaning as the command line options in parentheses"""
+    optimize_level: int = 1                                         # -O
+    machine_dependents: List[str] = field(default_factory=list)     # -m
+    machine_independents: List[str] = field(default_factory=list)   # -f
+    defines: List[str] = field(default_factory=list)                # -D
+    include_dirs: List[str] = field(default_factory=list)           # -I
+    preprocess: bool = True                                         # (not) -skip-preprocess
+    preprocessor: str = "gcc"                                       # --preprocessor
+    language: str = "c"                                             # -x
+    arch: str = "mlog"                                              # -march
+    target: str = "mlog"                                            # -mtarget
+    dump_blocks: bool = False                                       # -print-basic-blocks
+
+    def cache_options(self) -> dict:
+        """Options that affect the output, they are part of the cache key"""
+        return {
+            "x": self.language,
+            "O": self.optimize_level,
+            "f": self.machine_independents,
+            "m": self.machine_dependents,
+            "march": self.arch,
+            "mtarget": self.target,
+            # -fprofile-use=file: a new profile is a new output
+            "profiles": [read_text(option[len("profile-use="):]) for option in self.machine_independents
+                         if option.startswith("profile-use=")],
+        }
+
+    def cpp_args(self) -> List[str]:
+        cpp_args = [f"-DMLOGEV_ARCH={ARCH_ID[self.arch]}", ]
+        if self.preprocessor != "cpp":
+            cpp_args.append("-E")
+        cpp_args.extend(["-I" + path for path in self.include_dirs])
+        cpp_args.extend(["-D" + macro for macro in self.defines])
+        return cpp_args
+
+    def make_backend(self) -> "Backend":
+        from .backend import make_backend
+        return make_backend(
+            arch=self.arch,
+            target=self.target,
+            machine_dependents=self.machine_dependents,
+            machine_independents=self.machine_independents,
+            optimize_level=self.optimize_level,
+        )
+
+
+@dataclass
+class CompileResult:
+    # mlog text, or IR text with target "mlogev_ir"
+    output: str
+    # optimized IR, None if output came from the cache
+    ir: Optional[List["Quadruple"]]
+    # "<stage>_seconds" for preprocess, parse, optimize, output;
+    # "parsed_instructions", "optimized_instructions", "cache_hit";
+    # "removed_functions" (unused), -finline-functions: "inlined_functions", "inlined_calls";
+    # -foptimize-sibling-calls: "tail_calls";
+    # -funroll-loops: "unrolled_loops", "instruction_budget_left" (of -mmax-instructions)
+    stats: Dict[str, float]
+    # existing files named by the preprocessor's line markers: the source and its headers
+    dependencies: List[str] = field(default_factory=list)
+
+
+_line_marker = re.compile(r'^#(?: line)? \d+ "([^"]+)"', re.MULTILINE)
+
+
+def find_dependencies(preprocessed_text: str) -> List[str]:
+    names = dict.fromkeys(_line_marker.findall(preprocessed_text))
+    return [name for name in names if os.path.isfile(name)]
+
+
+def compile_source(source: Union[str, IO[str]], options: CompileOptions = None,
+                   filename: str = None, backend: "Backend" = None,
+                   cache: Optional[CompilationCache] = None) -> CompileResult:
+    """Compile source text or a readable file-like object.
+filename is used in diagnostics and to find quoted includes, by default the name of source or "<stdin>".
+backend can be reused between calls with the same options, it is created if not given."""
+    if options is None:
+        options = CompileOptions()
+    if not isinstance(source, str):
+        if filename is None:
+            filename = getattr(source, "name", None)
+        source = source.read()
+    if filename is None:
+        filename = "<stdin>"
+    stats: Dict[str, float] = {}
+
+    begin = time.perf_counter()
+    if options.language == "c":
+        from .frontend.preprocessor import preprocess_source_text
+        source = preprocess_source_text(
+            source,
+            filename,
+            use_cpp=options.preprocess,
+            cpp_path=options.preprocessor,
+            cpp_args=options.cpp_args()
+        )
+    stats["preprocess_seconds"] = time.perf_counter() - begin
+    dependencies = find_dependencies(source) if options.language == "c" else []
+
+    cache_key = ""
+    if cache is not None:
+        cache_key = make_cache_key(source, options.cache_options())
+        output = cache.get(cache_key)
+        stats["cache_hit"] = int(output is not None)
+        if output is not None:
+            return CompileResult(output=output, ir=None, stats=stats, dependencies=dependencies)
+
+    begin = time.perf_counter()
+    if backend is None:
+        backend = options.make_backend()
+    if options.language == "c":
+        # TODO: choose compiler by -march
+        from .frontend import Compiler
+        frontend_result = Compiler(strict_32bit="strict-32bit" in options.machine_dependents) \
+            .compile_text(source, filename)
+    else:
+        from .frontend.abstract_compiler import FrontendResult
+        from .intermediate.quadruple_from_text import extract_functions_from_ir, TextQuadrupleParser
+        inits, functions = extract_functions_from_ir(TextQuadrupleParser().parse(source.splitlines()))
+        frontend_result = FrontendResult(structures={}, global_instructions=inits, functions=functions)
+    stats["parse_seconds"] = time.perf_counter() - begin
+    stats["parsed_instructions"] = len(frontend_result.global_instructions) \
+        + sum(len(function.instructions) for function in frontend_result.functions.values())
+
+    begin = time.perf_counter()
+    ir_list = backend.optimize(frontend_result, dump_blocks=options.dump_blocks)
+    stats["optimize_seconds"] = time.perf_counter() - begin
+    stats["optimized_instructions"] = len(ir_list)
+    stats.update(backend.program_statistics)
+
+    begin = time.perf_counter()
+    output = backend.convert(ir_list)
+    stats["output_seconds"] = time.perf_counter() - begin
+
+    if cache is not None:
+        cache.put(cache_key, output)
+    return CompileResult(output=output, ir=ir_list, stats=stats, dependencies=dependencies)
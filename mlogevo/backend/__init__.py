@@ -1,5 +1,11 @@
-from .backend import Backend, make_backend
-
 ARCH_ID = {
     "mlog": 1,
 }
+
+
+def __getattr__(name):
+    # The backend pulls in every optimizer, import it only when it is used
+    if name in ("Backend", "make_backend"):
+        from . import backend
+        return getattr(backend, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -17,7 +17,7 @@ def mlog_replace_template(match: re.Match, variables: list, unique_number: int)
 
 def mlog_expand_asm_template(asm_inst: Quadruple, unique_number: int) -> List[str]:
     results = []
-    variables = asm_inst.output_vars + asm_inst.input_vars
+    variables = [*asm_inst.output_vars, *asm_inst.input_vars]
     replacer = lambda s: mlog_replace_template(s, variables, unique_number)
 
     for asm_line in asm_inst.raw_instructions:
@@ -1,16 +1,28 @@
-from typing import Iterable, Dict, Set
-from ..intermediate.ir_quadruple import Quadruple, COMPARISONS
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Dict, List, Optional, Set, Tuple
+from ..intermediate.ir_quadruple import Quadruple
 from ..intermediate.function import Function
 from ..output import AbstractIRConverter
-from ..output.mlog_output import IRtoMlogConverter
-from ..output.ir_output import IRDumper
 
 from .asm_template import mlog_expand_asm_template
+from .call_graph import used_functions
 from .basic_block import get_basic_blocks
 from .inline_utils import filter_inlineable_functions, inline_calls
+from .function_cache import FunctionFingerprint, OptimizedFunctionCache
+from . import parallel_optimize
 from ..optimizer import append_optimizers
+from ..optimizer.mi_block_layout import read_profile
+from ..optimizer.pass_manager import DEFAULT_ITERATIONS, DEFAULT_MAX_INSTRUCTIONS, PassManager, \
+    PassStatistics, Program
+from ..optimizer.optimizer_registry import as_changes
 from ..frontend.abstract_compiler import FrontendResult
 
+unused_functions_logger = logging.getLogger("remove-unused-functions")
+
 
 def dump_basic_blocks(name, blocks):
     n = len(blocks.keys())
@@ -27,14 +39,10 @@ def dump_basic_blocks(name, blocks):
 
 def read_variable_types(ir_list: Iterable[Quadruple], result: Dict[str, str]):
     for ir in ir_list:
-        if ir.dest == "" or ir.instruction.startswith("__"):
-            continue
-        if ir.instruction in ("if", "ifnot"):
+        # __funcbegin, if and ifnot have dest but no type
+        if ir.dest == "" or ir.type_suffix == "":
             continue
-        if ir.instruction in COMPARISONS:
-            result[ir.dest] = "i32"
-        tokens = ir.instruction.split("_")
-        result[ir.dest] = tokens[-1]
+        result[ir.dest] = ir.type_suffix
 
 
 class Backend:
@@ -43,10 +51,44 @@ class Backend:
         self.target = target
         # function_optimizers: work on the whole function
         self.mi_optimizers = []
+        # optimizers with target "program": run once all functions are optimized
+        self.program_optimizers = []
+        # -m flags, optimizers may need to know the arithmetic of the output
+        self.machine_dependents: List[str] = []
+        # -foptimize-iterations=N: repetitions of optimizer groups
+        self.optimize_iterations = 1
+        # -foptimize-time-budget=MS: seconds an optimizer may spend on a function before it is not repeated
+        self.optimize_time_budget: Optional[float] = None
+        # optimizer name -> statistics, for all functions optimized in this process
+        self.pass_statistics: Dict[str, PassStatistics] = {}
+        # -mmax-instructions=N: the output should fit in a processor, program optimizers keep to it
+        self.max_instructions = DEFAULT_MAX_INSTRUCTIONS
+        # counts instructions of the output for program optimizers, set if there are any
+        self.instruction_counter = None
+        # what program optimizers did in the last optimize(), see CompileResult.stats
+        self.program_statistics: Dict[str, float] = {}
+        # -fno-remove-unused-functions keeps functions that main() never calls
+        self.remove_unused_functions = True
         self.asm_template_handler = None
         self.output_component: AbstractIRConverter = None
+        # set by enable_function_cache(), keeps optimized functions between compile() calls
+        self.function_cache: Optional[OptimizedFunctionCache] = None
+        # -fprofile-use=file: function name -> block counts, for reorder-blocks
+        self.profile: Optional[Dict[str, Dict[int, int]]] = None
+        # -fparallel-optimize=N, N > 1 optimizes common functions in N processes
+        self.parallel_optimize = 1
+        self.optimize_pool: Optional[ProcessPoolExecutor] = None
+        # arguments of make_backend(), to make the same backend in worker processes
+        self.options: dict = {}
+
+    def enable_function_cache(self):
+        self.function_cache = OptimizedFunctionCache()
 
     def compile(self, frontend_result: FrontendResult, dump_blocks=False) -> str:
+        return self.convert(self.optimize(frontend_result, dump_blocks))
+
+    def optimize(self, frontend_result: FrontendResult, dump_blocks=False) -> List[Quadruple]:
+        """Optimize all functions and link them into one IR list, main() first"""
         inits = frontend_result.global_instructions
         all_functions = frontend_result.functions
 
@@ -54,13 +96,44 @@ class Backend:
         read_variable_types(inits, variable_types)
         for function in all_functions.values():
             read_variable_types(function.instructions, variable_types)
-        inline_functions, common_functions = filter_inlineable_functions(all_functions.values())
+        functions = list(all_functions.values())
+        removed: List[str] = []
+        if self.remove_unused_functions:
+            # not even optimized
+            used = used_functions(all_functions)
+            removed = [function.name for function in functions if function.name not in used]
+            functions = [function for function in functions if function.name in used]
+        inline_functions, common_functions = filter_inlineable_functions(functions)
 
+        # -print-basic-blocks prints while optimizing, never skip it
+        function_cache = self.function_cache if not dump_blocks else None
+        if function_cache is not None:
+            function_cache.begin()
+        inline_fingerprints: Dict[str, FunctionFingerprint] = {}
         for function in inline_functions.values():
-            self.run_optimize_pass(function, all_functions, variable_types, dump_blocks)
-        for function in common_functions.values():
-            function.instructions = inline_calls(function.name, function.instructions, inline_functions)
-            self.run_optimize_pass(function, all_functions, variable_types, dump_blocks)
+            inline_fingerprints[function.name] = self.optimize_function(
+                function, {}, all_functions, variable_types, function_cache, {}, dump_blocks)
+        if self.parallel_optimize > 1 and not dump_blocks and len(common_functions) > 1:
+            self.optimize_in_parallel(list(common_functions.values()), inline_functions, all_functions,
+                                      variable_types, function_cache, inline_fingerprints)
+        else:
+            for function in common_functions.values():
+                self.optimize_function(function, inline_functions, all_functions, variable_types,
+                                       function_cache, inline_fingerprints, dump_blocks)
+        if function_cache is not None:
+            function_cache.end()
+        self.program_statistics = {}
+        if self.program_optimizers:
+            self.run_program_passes(inits, common_functions, all_functions, variable_types)
+        if self.remove_unused_functions:
+            # calls in code that optimizers found unreachable are gone
+            used = used_functions(common_functions)
+            for name in [name for name in common_functions if name not in used]:
+                del common_functions[name]
+                removed.append(name)
+            if removed:
+                unused_functions_logger.info(f"unused functions removed: {', '.join(removed)}")
+            self.program_statistics["removed_functions"] = len(removed)
 
         ir_list = inits[:]
         # make main() the first function
@@ -69,31 +142,103 @@ class Backend:
         for (name, body) in common_functions.items():
             if name == "main": continue
             ir_list.extend(body.instructions)
+        return ir_list
+
+    def convert(self, ir_list: List[Quadruple]) -> str:
         if self.target != "mlogev_ir":
             self.convert_asm(ir_list)
         return self.output_component.convert(ir_list)
 
+    def find_optimized(self, function: Function, inline_functions: Dict[str, Function],
+                       variable_types: Dict[str, str], function_cache: Optional[OptimizedFunctionCache],
+                       inline_fingerprints: Dict[str, FunctionFingerprint]) \
+            -> Tuple[Optional[FunctionFingerprint], bool]:
+        """Returns (fingerprint, found), instructions of function are replaced if found in function_cache"""
+        if function_cache is None:
+            return None, False
+        fingerprint = function_cache.fingerprint(function, inline_functions, inline_fingerprints, variable_types)
+        cached_instructions = function_cache.get(fingerprint)
+        if cached_instructions is None:
+            return fingerprint, False
+        function.instructions = cached_instructions
+        return fingerprint, True
+
+    def optimize_function(self, function: Function, inline_functions: Dict[str, Function],
+                          all_functions, variable_types: Dict[str, str],
+                          function_cache: Optional[OptimizedFunctionCache],
+                          inline_fingerprints: Dict[str, FunctionFingerprint],
+                          dump_blocks=False) -> Optional[FunctionFingerprint]:
+        """Inline calls to inline_functions and optimize function in place.
+Returns its fingerprint, or None without function_cache."""
+        fingerprint, found = self.find_optimized(function, inline_functions, variable_types,
+                                                 function_cache, inline_fingerprints)
+        if found:
+            return fingerprint
+        if len(inline_functions) > 0:
+            function.instructions = inline_calls(function.name, function.instructions, inline_functions)
+        self.run_optimize_pass(function, all_functions, variable_types, dump_blocks)
+        if function_cache is not None:
+            function_cache.put(fingerprint, function.instructions)
+        return fingerprint
+
+    def optimize_in_parallel(self, functions: List[Function], inline_functions: Dict[str, Function],
+                             all_functions, variable_types: Dict[str, str],
+                             function_cache: Optional[OptimizedFunctionCache],
+                             inline_fingerprints: Dict[str, FunctionFingerprint]):
+        """Same as optimize_function() on each of functions, in self.parallel_optimize processes"""
+        pending = []
+        for function in functions:
+            fingerprint, found = self.find_optimized(function, inline_functions, variable_types,
+                                                     function_cache, inline_fingerprints)
+            if not found:
+                pending.append((function, fingerprint))
+        if len(pending) == 0:
+            return
+        if self.optimize_pool is None:
+            self.optimize_pool = ProcessPoolExecutor(max_workers=self.parallel_optimize,
+                                                     initializer=parallel_optimize.initialize_worker,
+                                                     initargs=(self.options, ))
+        results = parallel_optimize.optimize_functions(
+            self.optimize_pool, self.parallel_optimize, [function for (function, _) in pending],
+            inline_functions, all_functions, variable_types)
+        for ((function, fingerprint), instructions) in zip(pending, results):
+            function.instructions = instructions
+            if function_cache is not None:
+                function_cache.put(fingerprint, instructions)
+
     def run_optimize_pass(self, function: Function, all_functions, variable_types: Dict[str, str], dump_blocks=False):
-        for optimizer_triplet in self.mi_optimizers:
-            optimizer, target, rank = optimizer_triplet
-            if target == "function":
-                optimizer(function)
-            elif target == "basic_block":
-                function_basic_blocks = get_basic_blocks(function.instructions)
-                block_id_list = sorted(list(function_basic_blocks.keys()))
-                for block_id in block_id_list:
-                    block = function_basic_blocks[block_id]
-                    optimizer(block, function.name, all_functions, variable_types)
-                function_ir_list = []
-                for i in block_id_list:
-                    function_ir_list.extend(function_basic_blocks[i].instructions)
-                function.instructions = function_ir_list
+        pass_manager = PassManager(self.mi_optimizers, self.optimize_iterations, self.optimize_time_budget,
+                                   self.pass_statistics, self.machine_dependents, self.profile)
+        pass_manager.run(function, all_functions, variable_types)
 
         if dump_blocks:
             function_basic_blocks = get_basic_blocks(function.instructions)
             dump_basic_blocks(function.name, function_basic_blocks)
         return function
 
+    def run_program_passes(self, inits: List[Quadruple], common_functions: Dict[str, Function],
+                           all_functions, variable_types: Dict[str, str]):
+        """Runs program optimizers on the optimized functions, in place.
+Functions they change are optimized again by the "simplify" group."""
+        # the layout of blocks and profiles follow block numbers, they are not run again
+        simplify = [optimizer_pass for optimizer_pass in self.mi_optimizers if optimizer_pass.group == "simplify"]
+
+        def reoptimize(function: Function):
+            pass_manager = PassManager(simplify, self.optimize_iterations, self.optimize_time_budget,
+                                       self.pass_statistics, self.machine_dependents)
+            pass_manager.run(function, all_functions, variable_types)
+
+        program = Program(inits, common_functions, all_functions, variable_types, self.machine_dependents,
+                          self.max_instructions, self.instruction_counter.count_instructions, reoptimize)
+        for optimizer_pass in self.program_optimizers:
+            begin = time.perf_counter()
+            changes = as_changes(optimizer_pass.function(program))
+            statistics = self.pass_statistics.setdefault(optimizer_pass.name, PassStatistics())
+            statistics.runs += 1
+            statistics.changes += int(bool(changes))
+            statistics.seconds += time.perf_counter() - begin
+        self.program_statistics = program.statistics
+
     def convert_asm(self, ir_list):
         asm_blocks = 0
         for i in range(len(ir_list)):
@@ -116,14 +261,49 @@ def make_backend(arch="mlog", target="mlog",
         machine_dependents = []
 
     backend = Backend(arch, target)
+    backend.machine_dependents = list(machine_dependents)
+    for option in machine_dependents:
+        if option.startswith("max-instructions="):
+            backend.max_instructions = int(option[len("max-instructions="):])
+    backend.optimize_iterations = DEFAULT_ITERATIONS[min(optimize_level, len(DEFAULT_ITERATIONS) - 1)]
+    options = []
+    for option in machine_independents:
+        if option.startswith("parallel-optimize="):
+            backend.parallel_optimize = int(option[len("parallel-optimize="):]) or os.cpu_count() or 1
+            continue
+        if option.startswith("optimize-iterations="):
+            backend.optimize_iterations = int(option[len("optimize-iterations="):])
+        elif option.startswith("optimize-time-budget="):
+            backend.optimize_time_budget = int(option[len("optimize-time-budget="):]) / 1000
+        elif option == "no-remove-unused-functions":
+            backend.remove_unused_functions = False
+        elif option.startswith("profile-use="):
+            profile_file = option[len("profile-use="):]
+            if os.path.isfile(profile_file):
+                backend.profile = read_profile(profile_file)
+            else:
+                print(f"warning: profile {profile_file} not found, blocks are placed without it", file=sys.stderr)
+            # profiles are for block placement, which is on by default from -O2
+            machine_independents = list(machine_independents) + ["reorder-blocks"]
+        options.append(option)
+    # workers optimize serially
+    backend.options = dict(arch=arch, target=target, machine_independents=options,
+                           machine_dependents=machine_dependents, optimize_level=optimize_level)
     if arch == "mlog":
         backend.asm_template_handler = mlog_expand_asm_template
+    # output components are imported on demand, only one of them is used
     if target == "mlog":
+        from ..output.mlog_output import IRtoMlogConverter
         backend.output_component = IRtoMlogConverter(
             strict_32bit="strict-32bit" in machine_dependents,
             keep_labels="keep-labels" in machine_dependents,
         )
     elif target == "mlogev_ir":
+        from ..output.ir_output import IRDumper
         backend.output_component = IRDumper()
     append_optimizers(backend, machine_dependents, machine_independents, optimize_level)
+    if backend.program_optimizers:
+        # the limit is the processor's, whatever the output is
+        from ..output.mlog_output import IRtoMlogConverter
+        backend.instruction_counter = IRtoMlogConverter(strict_32bit="strict-32bit" in machine_dependents)
     return backend
@@ -11,6 +11,8 @@ class BasicBlock:
     instructions: List[Quadruple] = field(default_factory=list)
     jump_destination: int = -1
     will_continue: bool = True
+    # __jumptable: blocks of its labels, in the order of the table (-1: no such block)
+    table_destinations: List[int] = field(default_factory=list)
 
 
 BASIC_BLOCK_ENTRANCES = {
@@ -22,6 +24,8 @@ BASIC_BLOCK_EXITS = {
     "__funcend",
     "__call",
     "__return",
+    "__tailcall",
+    "__jumptable",
     "if",
     "ifnot",
     "goto",
@@ -32,7 +36,8 @@ BASIC_BLOCK_EXITS = {
 
 NO_CONTINUES = {
     "goto", "__funcend",
-    "__return",
+    "__return", "__tailcall",
+    "__jumptable",
 }
 
 
@@ -90,5 +95,7 @@ def get_basic_blocks(ir_list: List[Quadruple]) -> Dict[int, BasicBlock]:
             continue
         dest = extract_destination_label(tail)
         block.jump_destination = label_owner.get(dest, -1)
+        if tail.instruction == "__jumptable":
+            block.table_destinations = [label_owner.get(label, -1) for label in tail.raw_instructions]
 
     return basic_blocks
@@ -0,0 +1,68 @@
+"""
+Call graph of a program: which functions call which, and how many times (from __call and __tailcall).
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Set
+
+from ..intermediate.function import Function
+from ..intermediate.ir_quadruple import CALL_OPCODES
+
+
+class CallGraph:
+    def __init__(self, functions: Dict[str, Function]):
+        # caller -> callee -> number of calls in the caller
+        self.callees: Dict[str, Counter] = {name: Counter() for name in functions}
+        # callee -> caller -> number of calls in the caller
+        self.callers: Dict[str, Counter] = {name: Counter() for name in functions}
+        for (name, function) in functions.items():
+            for ir in function.instructions:
+                if ir.opcode in CALL_OPCODES:
+                    self.callees[name][ir.src1] += 1
+                    self.callers.setdefault(ir.src1, Counter())[name] += 1
+                    self.callees.setdefault(ir.src1, Counter())
+
+    def reachable(self, roots: Iterable[str]) -> Set[str]:
+        """Functions called from roots, directly or not, roots included"""
+        result = set()
+        stack = list(roots)
+        while stack:
+            name = stack.pop()
+            if name in result:
+                continue
+            result.add(name)
+            stack.extend(self.callees.get(name, ()))
+        return result
+
+    def is_recursive(self, name: str) -> bool:
+        return name in self.reachable(self.callees.get(name, ()))
+
+    def bottom_up(self) -> List[str]:
+        """All functions, callees before their callers (but for recursion)"""
+        order = []
+        visited: Set[str] = set()
+        for root in self.callees:
+            if root in visited:
+                continue
+            visited.add(root)
+            # iterative DFS, long call chains would exceed the recursion limit
+            stack = [(root, iter(self.callees[root]))]
+            while stack:
+                name, callees = stack[-1]
+                for callee in callees:
+                    if callee not in visited:
+                        visited.add(callee)
+                        stack.append((callee, iter(self.callees[callee])))
+                        break
+                else:
+                    stack.pop()
+                    order.append(name)
+        return order
+
+
+def used_functions(functions: Dict[str, Function]) -> Set[str]:
+    """Functions main() and functions with attribute "used" call, directly or not (themselves included).
+Without main(), all functions are used."""
+    if "main" not in functions:
+        return set(functions)
+    roots = [name for (name, function) in functions.items() if name == "main" or "used" in function.attributes]
+    return CallGraph(functions).reachable(roots) & functions.keys()
@@ -0,0 +1,171 @@
+"""
+Control flow graph of a function, for optimizers with target "basic_block_graph".
+
+Blocks come from get_basic_blocks() and keep their ids, which are also their order
+in the function. Optimizers may edit instructions of blocks in place, the graph
+stays valid as long as labels, jumps and block boundaries are kept; an optimizer
+that changes control flow says so (optimizer_registry.Changes) and the graph is built again.
+"""
+from typing import Dict, List, Optional, Sequence, Set
+
+from ..intermediate.ir_quadruple import Quadruple
+from .basic_block import BasicBlock, BASIC_BLOCK_EXITS, get_basic_blocks
+
+
+class ControlFlowGraph:
+    def __init__(self, ir_list: List[Quadruple], machine_dependents: Sequence[str] = (),
+                 block_counts: Optional[Dict[int, int]] = None):
+        # -m flags, for optimizers that follow the arithmetic of the output (e.g. strict-32bit)
+        self.machine_dependents = machine_dependents
+        # -fprofile-use: position in order -> times the block ran, None without a profile
+        self.block_counts = block_counts
+        self.blocks: Dict[int, BasicBlock] = get_basic_blocks(ir_list)
+        self.order: List[int] = sorted(self.blocks.keys())
+        # -1 if the function is empty
+        self.entry: int = self.order[0] if self.order else -1
+        self.successors: Dict[int, List[int]] = {block_id: [] for block_id in self.order}
+        self.predecessors: Dict[int, List[int]] = {block_id: [] for block_id in self.order}
+        for (i, block_id) in enumerate(self.order):
+            for successor in self._find_successors(self.blocks[block_id], i):
+                if successor not in self.successors[block_id]:
+                    self.successors[block_id].append(successor)
+                    self.predecessors[successor].append(block_id)
+        # blocks leaving the function: __return, __funcend, jumps to unknown labels
+        self.exits: List[int] = [block_id for block_id in self.order if not self.successors[block_id]]
+        # results of analyses on instructions (e.g. liveness) by name, cleared when instructions change
+        self.analyses: Dict[str, object] = {}
+        # computed on demand, they only depend on edges
+        self._reverse_postorder: Optional[List[int]] = None
+        self._idom: Optional[Dict[int, int]] = None
+        self._loops: Optional[Dict[int, Set[int]]] = None
+
+    def _find_successors(self, block: BasicBlock, position: int) -> List[int]:
+        result = []
+        if block.instructions and block.instructions[-1].instruction in BASIC_BLOCK_EXITS \
+                and block.jump_destination != -1:
+            result.append(block.jump_destination)
+        result.extend(destination for destination in block.table_destinations if destination != -1)
+        if block.will_continue and position + 1 < len(self.order):
+            result.append(self.order[position + 1])
+        return result
+
+    def instructions(self) -> List[Quadruple]:
+        """Instructions of all blocks, in order"""
+        result = []
+        for block_id in self.order:
+            result.extend(self.blocks[block_id].instructions)
+        return result
+
+    def reverse_postorder(self) -> List[int]:
+        """Blocks reachable from the entry, every block before its successors (back edges aside)"""
+        if self._reverse_postorder is not None:
+            return self._reverse_postorder
+        postorder = []
+        visited: Set[int] = set()
+        if self.entry != -1:
+            visited.add(self.entry)
+            # iterative DFS, large functions would exceed the recursion limit
+            stack = [(self.entry, iter(self.successors[self.entry]))]
+            while stack:
+                block_id, successors = stack[-1]
+                for successor in successors:
+                    if successor not in visited:
+                        visited.add(successor)
+                        stack.append((successor, iter(self.successors[successor])))
+                        break
+                else:
+                    stack.pop()
+                    postorder.append(block_id)
+        self._reverse_postorder = postorder[::-1]
+        return self._reverse_postorder
+
+    def reachable(self) -> Set[int]:
+        return set(self.reverse_postorder())
+
+    def immediate_dominators(self) -> Dict[int, int]:
+        """block id -> id of its immediate dominator, the entry dominates itself.
+Unreachable blocks are left out."""
+        if self._idom is not None:
+            return self._idom
+        # Cooper, Harvey & Kennedy, "A Simple, Fast Dominance Algorithm"
+        order = self.reverse_postorder()
+        rpo_index = {block_id: i for (i, block_id) in enumerate(order)}
+        idom: Dict[int, int] = {}
+        if order:
+            idom[self.entry] = self.entry
+
+        def intersect(a: int, b: int) -> int:
+            while a != b:
+                while rpo_index[a] > rpo_index[b]:
+                    a = idom[a]
+                while rpo_index[b] > rpo_index[a]:
+                    b = idom[b]
+            return a
+
+        changed = True
+        while changed:
+            changed = False
+            for block_id in order[1:]:
+                new_idom = -1
+                for predecessor in self.predecessors[block_id]:
+                    if predecessor not in idom:
+                        continue
+                    new_idom = predecessor if new_idom == -1 else intersect(predecessor, new_idom)
+                if idom.get(block_id) != new_idom:
+                    idom[block_id] = new_idom
+                    changed = True
+        self._idom = idom
+        return idom
+
+    def dominates(self, a: int, b: int) -> bool:
+        """Every path from the entry to b passes a (a block dominates itself)"""
+        idom = self.immediate_dominators()
+        if b not in idom:
+            return False
+        while b != a:
+            if idom[b] == b:
+                return False
+            b = idom[b]
+        return True
+
+    def dominators(self, block_id: int) -> List[int]:
+        """Dominators of a block, from itself up to the entry"""
+        idom = self.immediate_dominators()
+        if block_id not in idom:
+            return []
+        result = [block_id]
+        while idom[block_id] != block_id:
+            block_id = idom[block_id]
+            result.append(block_id)
+        return result
+
+    def natural_loops(self) -> Dict[int, Set[int]]:
+        """Loop header -> blocks of the loop, header included.
+A back edge goes to a block dominating its source, loops sharing a header are one loop."""
+        if self._loops is not None:
+            return self._loops
+        loops: Dict[int, Set[int]] = {}
+        reachable = self.reachable()
+        for block_id in self.reverse_postorder():
+            for header in self.successors[block_id]:
+                if not self.dominates(header, block_id):
+                    continue
+                body = loops.setdefault(header, {header})
+                stack = [block_id]
+                while stack:
+                    member = stack.pop()
+                    if member in body:
+                        continue
+                    body.add(member)
+                    stack.extend(predecessor for predecessor in self.predecessors[member]
+                                 if predecessor in reachable)
+        self._loops = loops
+        return loops
+
+    def loop_depths(self) -> Dict[int, int]:
+        """block id -> number of loops it is in"""
+        depths = {block_id: 0 for block_id in self.order}
+        for body in self.natural_loops().values():
+            for block_id in body:
+                depths[block_id] += 1
+        return depths
@@ -0,0 +1,120 @@
+"""
+Reuse optimized functions between compilations of the same program (`mlogevo --watch`).
+
+A function is fingerprinted before optimization, by its own IR, the fingerprints of
+the inline functions it calls and the types of the variables it refers to.
+Those are all the inputs of machine independent optimizers, so a function with
+an unchanged fingerprint gets its previously optimized instructions back.
+
+The frontend numbers labels across the whole program, so an edit in one function
+renames labels in the following ones. Labels are replaced by their index in the
+function (inline bodies included) before fingerprinting and caching, and renamed
+back to the current names when a cached function is reused.
+"""
+import hashlib
+from copy import copy
+from typing import Dict, Iterable, List, Optional, Set
+
+from ..intermediate.ir_quadruple import Quadruple
+from ..intermediate.function import Function
+
+
+def label_names(ir_list: Iterable[Quadruple]) -> List[str]:
+    return [ir.src1 for ir in ir_list if ir.instruction == "label"]
+
+
+def rename_labels(ir_list: Iterable[Quadruple], mapping: Dict[str, str]) -> List[Quadruple]:
+    """Returns copies of instructions, labels in mapping are renamed"""
+    # Later stages change single instructions (e.g. asm expansion), never share them
+    results = []
+    for ir in ir_list:
+        ir = copy(ir)
+        if ir.instruction in ("label", "goto"):
+            ir.src1 = mapping.get(ir.src1, ir.src1)
+        elif ir.instruction in ("if", "ifnot"):
+            ir.dest = mapping.get(ir.dest, ir.dest)
+        elif ir.instruction == "__jumptable":
+            ir.raw_instructions = [mapping.get(label, label) for label in ir.raw_instructions]
+        results.append(ir)
+    return results
+
+
+def referred_variables(ir_list: Iterable[Quadruple]) -> Set[str]:
+    names = set()
+    for ir in ir_list:
+        names.update((ir.src1, ir.src2, ir.dest))
+        names.update(ir.input_vars)
+        names.update(ir.output_vars)
+    names.discard("")
+    return names
+
+
+class FunctionFingerprint:
+    """Fingerprint of a function and the label names it had when fingerprinted"""
+    def __init__(self, key: str, labels: List[str]):
+        self.key = key
+        self.labels = labels
+
+    def canonical_labels(self) -> Dict[str, str]:
+        mapping = {}
+        for (i, name) in enumerate(self.labels):
+            mapping.setdefault(name, f"#L{i}")
+        return mapping
+
+    def current_labels(self) -> Dict[str, str]:
+        return {f"#L{i}": name for (i, name) in enumerate(self.labels)}
+
+
+class OptimizedFunctionCache:
+    def __init__(self):
+        # fingerprint -> optimized instructions with canonical labels
+        self.entries: Dict[str, List[Quadruple]] = {}
+        self.used: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def begin(self):
+        """Call before compiling a program"""
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+
+    def end(self):
+        """Call after compiling a program, forgets functions that are gone"""
+        self.entries = {key: value for (key, value) in self.entries.items() if key in self.used}
+
+    def fingerprint(self, function: Function, inline_functions: Dict[str, Function],
+                    inline_fingerprints: Dict[str, FunctionFingerprint],
+                    variable_types: Dict[str, str]) -> FunctionFingerprint:
+        """inline_functions are the optimized inline functions, with their fingerprints"""
+        labels = label_names(function.instructions)
+        for ir in function.instructions:
+            if ir.instruction == "__call" and ir.src1 in inline_fingerprints:
+                labels.extend(label_names(inline_functions[ir.src1].instructions))
+        result = FunctionFingerprint("", labels)
+        canonical_labels = result.canonical_labels()
+
+        digest = hashlib.sha256()
+        digest.update(function.name.encode())
+        for ir in rename_labels(function.instructions, canonical_labels):
+            digest.update(repr((ir.instruction, ir.src1, ir.src2, ir.dest, ir.relop,
+                                ir.input_vars, ir.output_vars, ir.raw_instructions)).encode())
+            if ir.instruction == "__call" and ir.src1 in inline_fingerprints:
+                digest.update(inline_fingerprints[ir.src1].key.encode())
+        for name in sorted(referred_variables(function.instructions)):
+            if name in variable_types:
+                digest.update(f"{name}:{variable_types[name]};".encode())
+        result.key = digest.hexdigest()
+        return result
+
+    def get(self, fingerprint: FunctionFingerprint) -> Optional[List[Quadruple]]:
+        self.used.add(fingerprint.key)
+        if fingerprint.key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return rename_labels(self.entries[fingerprint.key], fingerprint.current_labels())
+
+    def put(self, fingerprint: FunctionFingerprint, ir_list: List[Quadruple]):
+        self.used.add(fingerprint.key)
+        self.entries[fingerprint.key] = rename_labels(ir_list, fingerprint.canonical_labels())
@@ -2,7 +2,7 @@ from typing import Iterable, Tuple, List, Dict
 from copy import copy
 
 from ..intermediate import Quadruple
-from ..intermediate.ir_quadruple import NO_INPUT_INSTRUCTIONS
+from ..intermediate.ir_quadruple import NO_INPUT_INSTRUCTIONS, Opcode
 from ..intermediate.function import Function
 
 
@@ -24,7 +24,7 @@ def mlog_should_inline(function: Function) -> bool:
         if inst.instruction in ("__funcbegin", "__funcend"):
             continue
         if inst.instruction == "__call":
-            # TODO: consider inline functions that calls other functions
+            # left to -finline-functions, which inlines callees first
             return False
         if inst.instruction in ("label",):
             # size += 0
@@ -52,7 +52,7 @@ def filter_inlineable_functions(functions: Iterable[Function], arch: str = "mlog
 def redirect_variable(ir: Quadruple, from_var: str, to_var: str) -> Quadruple:
     if from_var == to_var:
         return ir
-    if ir.instruction.startswith("decl_") or ir.instruction in NO_INPUT_INSTRUCTIONS:
+    if ir.opcode is Opcode.DECL or ir.instruction in NO_INPUT_INSTRUCTIONS:
         return ir
 
     if ir.src1 == from_var:
@@ -83,7 +83,7 @@ def inline_calls(common_function_name: str,
     # A reference
     last_assignment_ir: Dict[str, Quadruple] = {}
     for ir in reversed(common_function_body):
-        if ir.instruction.startswith("set_") and ir.src1.startswith("result@"):
+        if ir.opcode is Opcode.SET and ir.src1.startswith("result@"):
             last_result_assignment[ir.src1] = ir.dest
             last_assignment_ir[ir.src1] = ir
             result_irs.append(ir)
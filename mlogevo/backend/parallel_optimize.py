@@ -0,0 +1,86 @@
+"""
+-fparallel-optimize=N: optimize common functions in N worker processes.
+
+After inlining, optimizers of a function only touch its own instructions,
+so functions are optimized independently and put back in their original order.
+Every worker makes its own Backend with the same options (optimizer functions
+are not picklable). Instructions travel as plain tuples, which pickle several
+times faster than Quadruple objects. Optimizers in workers see the names and
+attributes of other functions in all_functions, but not their instructions.
+"""
+from concurrent.futures import Executor
+from typing import Dict, List, Tuple
+
+from ..intermediate.ir_quadruple import Quadruple
+from ..intermediate.function import Function
+
+# Per-process state, created by initialize_worker()
+_worker_backend = None
+
+
+def initialize_worker(backend_options: dict):
+    global _worker_backend
+    from .backend import make_backend
+    _worker_backend = make_backend(**backend_options)
+
+
+def pack_instructions(ir_list: List[Quadruple]) -> List[Tuple]:
+    return [(ir.instruction, ir.src1, ir.src2, ir.dest, ir.relop,
+             ir.input_vars, ir.output_vars, ir.raw_instructions) for ir in ir_list]
+
+
+def unpack_instructions(packed: List[Tuple]) -> List[Quadruple]:
+    return [Quadruple(instruction, src1, src2, dest, relop,
+                      input_vars=input_vars, output_vars=output_vars, raw_instructions=raw_instructions)
+            for (instruction, src1, src2, dest, relop, input_vars, output_vars, raw_instructions) in packed]
+
+
+def pack_function(function: Function, with_instructions=True) -> Tuple:
+    # result_type and params may refer to pycparser nodes, optimizers do not read them
+    return function.name, function.attributes, pack_instructions(function.instructions) if with_instructions else []
+
+
+def unpack_function(packed: Tuple) -> Function:
+    name, attributes, instructions = packed
+    return Function(name, None, None, None, unpack_instructions(instructions), attributes)
+
+
+def optimize_chunk(functions: List[Tuple], inline_functions: List[Tuple],
+                   all_functions: List[Tuple], variable_types: Dict[str, str]) -> List[List[Tuple]]:
+    inline_functions = {packed[0]: unpack_function(packed) for packed in inline_functions}
+    all_functions = {packed[0]: unpack_function(packed) for packed in all_functions}
+    results = []
+    for packed in functions:
+        function = unpack_function(packed)
+        _worker_backend.optimize_function(function, inline_functions, all_functions, variable_types, None, {})
+        results.append(pack_instructions(function.instructions))
+    return results
+
+
+def split_evenly(functions: List[Function], chunk_count: int) -> List[List[int]]:
+    """Indexes of functions for each chunk, larger functions are placed first"""
+    chunks: List[List[int]] = [[] for _ in range(chunk_count)]
+    sizes = [0] * chunk_count
+    by_size = sorted(range(len(functions)), key=lambda i: (-len(functions[i].instructions), i))
+    for i in by_size:
+        smallest = sizes.index(min(sizes))
+        chunks[smallest].append(i)
+        sizes[smallest] += len(functions[i].instructions)
+    return [chunk for chunk in chunks if chunk]
+
+
+def optimize_functions(pool: Executor, chunk_count: int, functions: List[Function],
+                       inline_functions: Dict[str, Function], all_functions: Dict[str, Function],
+                       variable_types: Dict[str, str]) -> List[List[Quadruple]]:
+    """Returns optimized instructions of functions, in the same order"""
+    packed_inline_functions = [pack_function(function) for function in inline_functions.values()]
+    packed_all_functions = [pack_function(function, with_instructions=False) for function in all_functions.values()]
+    chunks = split_evenly(functions, chunk_count)
+    futures = [pool.submit(optimize_chunk, [pack_function(functions[i]) for i in chunk],
+                           packed_inline_functions, packed_all_functions, variable_types)
+               for chunk in chunks]
+    results: List[List[Quadruple]] = [[] for _ in functions]
+    for (chunk, future) in zip(chunks, futures):
+        for (i, packed) in zip(chunk, future.result()):
+            results[i] = unpack_instructions(packed)
+    return results
@@ -0,0 +1,73 @@
+"""
+Batch compilation: `mlogevo -j N a.c b.c c.c ...`
+
+Every worker process keeps one backend, one parser and one header cache,
+and compiles many source files with them.
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from .frontend import CompilationError
+from .driver import compile_one, make_backend_from_args, make_cache, \
+    report_compilation_error, write_output
+
+# (source_file, output_file)
+Job = Tuple[str, str]
+
+# Per-process state, created by initialize_worker()
+_worker_args = None
+_worker_backend = None
+_worker_cache = None
+
+
+def initialize_worker(args):
+    global _worker_args, _worker_backend, _worker_cache
+    _worker_args = args
+    _worker_backend = make_backend_from_args(args)
+    _worker_cache = make_cache(args)
+
+
+def compile_job(job: Job) -> Tuple[int, Optional[str]]:
+    """Returns (exit_status, result), result is kept only if output_file is '-'"""
+    source_file, output_file = job
+    try:
+        result = compile_one(_worker_args, source_file, _worker_backend, _worker_cache)
+        if output_file == '-':
+            return 0, result
+        write_output(result, output_file)
+        return 0, None
+    except CompilationError as exception:
+        report_compilation_error(exception, source_file)
+        return 1, None
+    # cpp and parser failures should not stop other files
+    except Exception as exception:
+        print(f"{source_file}: error: {exception}", file=sys.stderr)
+        return 1, None
+    finally:
+        if _worker_cache is not None:
+            _worker_cache.record_stats()
+
+
+def get_worker_count(jobs: int, file_count: int) -> int:
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    return max(1, min(jobs, file_count))
+
+
+def compile_batch(args, jobs: List[Job]) -> List[int]:
+    """Compile all jobs, print results for '-' outputs in order, returns exit status of each job"""
+    workers = get_worker_count(args.jobs, len(jobs))
+    if workers == 1:
+        initialize_worker(args)
+        results = [compile_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=initialize_worker, initargs=(args, )) as executor:
+            results = list(executor.map(compile_job, jobs))
+
+    for (status, result) in results:
+        if result is not None:
+            print(result)
+    return [status for (status, _) in results]
@@ -0,0 +1,194 @@
+"""
+Content-addressed, size-bounded compilation cache.
+
+An entry maps (preprocessed source, options, compiler build) to the final output.
+Entries are plain files under cache_dir, least recently used entries (by mtime)
+are evicted when the cache grows beyond max_size bytes.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from . import __version__
+
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+STATS_FILE = "stats.json"
+# held while stats.json is read and written back, processes sharing a cache add up their counters
+STATS_LOCK_FILE = "stats.lock"
+
+_compiler_fingerprint: str = ""
+
+
+def default_cache_dir() -> str:
+    env_dir = os.environ.get("MLOGEVO_CACHE_DIR")
+    if env_dir:
+        return env_dir
+    xdg_cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(xdg_cache, "mlogevo")
+
+
+def compiler_fingerprint() -> str:
+    """mlogevo version plus (path, size, mtime) of its modules,
+so a modified (e.g. development) build never reuses stale entries."""
+    global _compiler_fingerprint
+    if _compiler_fingerprint:
+        return _compiler_fingerprint
+    digest = hashlib.sha256(__version__.encode())
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            if not filename.endswith(".py"):
+                continue
+            stat = os.stat(os.path.join(root, filename))
+            relpath = os.path.relpath(os.path.join(root, filename), package_dir)
+            digest.update(f"{relpath}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    _compiler_fingerprint = digest.hexdigest()
+    return _compiler_fingerprint
+
+
+def make_cache_key(source_text: str, options: Dict) -> str:
+    """options: JSON-serializable flags that affect output, e.g. -O/-f/-m/-march/-mtarget"""
+    payload = json.dumps({
+        "version": __version__,
+        "build": compiler_fingerprint(),
+        "options": options,
+    }, sort_keys=True)
+    digest = hashlib.sha256(payload.encode())
+    digest.update(b"\0")
+    digest.update(source_text.encode())
+    return digest.hexdigest()
+
+
+class CompilationCache:
+    def __init__(self, cache_dir: str, max_size: int = DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key: str) -> Optional[str]:
+        path = self.entry_path(key)
+        try:
+            with open(path, "r") as f:
+                result = f.read()
+            # mtime is the LRU timestamp
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key: str, output: str):
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _atomic_write(path, output)
+        self.evict()
+
+    def entries(self) -> List[Tuple[float, int, str]]:
+        """[(mtime, size, path), ...]"""
+        results = []
+        if not os.path.isdir(self.cache_dir):
+            return results
+        for subdir in os.listdir(self.cache_dir):
+            subdir_path = os.path.join(self.cache_dir, subdir)
+            if len(subdir) != 2 or not os.path.isdir(subdir_path):
+                continue
+            for filename in os.listdir(subdir_path):
+                path = os.path.join(subdir_path, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                results.append((stat.st_mtime, stat.st_size, path))
+        return results
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache fits in max_size.
+Returns number of removed entries."""
+        entries = self.entries()
+        total_size = sum(size for (_, size, _) in entries)
+        if total_size <= self.max_size:
+            return 0
+        removed = 0
+        entries.sort()
+        for (_, size, path) in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            removed += 1
+        return removed
+
+    def record_stats(self) -> Dict[str, int]:
+        """Add hits/misses of this process to the persistent counters, return the totals."""
+        stats_path = os.path.join(self.cache_dir, STATS_FILE)
+        stats = {"hits": 0, "misses": 0}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with _file_lock(os.path.join(self.cache_dir, STATS_LOCK_FILE)):
+            try:
+                with open(stats_path, "r") as f:
+                    stats.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+            stats["hits"] += self.hits
+            stats["misses"] += self.misses
+            _atomic_write(stats_path, json.dumps(stats))
+        self.hits = self.misses = 0
+        return stats
+
+    def describe(self, stats: Dict[str, int]) -> str:
+        entries = self.entries()
+        total_size = sum(size for (_, size, _) in entries)
+        lookups = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / lookups * 100 if lookups else 0.0
+        return (f"cache {self.cache_dir}: {stats['hits']} hits, {stats['misses']} misses "
+                f"({ratio:.1f}% hit rate), {len(entries)} entries, "
+                f"{total_size} / {self.max_size} bytes")
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """Exclusive lock on path, between processes (and threads, each opens its own file)"""
+    with open(path, "a+b") as f:
+        try:
+            import fcntl
+        except ImportError:
+            import msvcrt
+            # retries for 10 seconds, then raises OSError
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            return
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _atomic_write(path: str, content: str):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,67 @@
+"""
+Compile a single source file according to parsed command line arguments.
+Shared by single-file and batch (multi-file) compilation.
+"""
+import sys
+from typing import Optional, TYPE_CHECKING
+
+from .frontend import CompilationError
+from .api import CompileOptions, compile_source
+from .compile_cache import CompilationCache, default_cache_dir
+# The frontend, backend (optimizers and outputs) are imported when needed,
+# so `mlogevo --help` or a cache hit does not pay for them.
+if TYPE_CHECKING:
+    from .backend import Backend
+
+
+def report_compilation_error(exception: CompilationError, source_file: str):
+    error_info = exception.error_info
+    reason = error_info.get("reason")
+    optional_coord = error_info.get("coord", "")
+    if reason is None:
+        raise exception
+    print(f"{optional_coord or source_file}: error: {reason}", file=sys.stderr)
+
+
+def options_from_args(args) -> CompileOptions:
+    return CompileOptions(
+        optimize_level=args.O,
+        machine_dependents=args.m or [],
+        machine_independents=args.f or [],
+        defines=args.D or [],
+        include_dirs=args.I or [],
+        preprocess=args.skip_preprocess,
+        preprocessor=args.preprocessor,
+        language=args.x,
+        arch=args.march,
+        target=args.mtarget,
+        dump_blocks=args.print_basic_blocks,
+    )
+
+
+def make_backend_from_args(args) -> "Backend":
+    return options_from_args(args).make_backend()
+
+
+def make_cache(args) -> Optional[CompilationCache]:
+    # -print-basic-blocks prints while compiling, never skip it
+    if args.no_cache or args.print_basic_blocks:
+        return None
+    return CompilationCache(args.cache_dir or default_cache_dir(), args.cache_size * 1024 * 1024)
+
+
+def compile_one(args, source_file: str, backend: "Backend" = None,
+                cache: Optional[CompilationCache] = None) -> str:
+    """Compile source_file, raises CompilationError on failure.
+The backend can be reused between calls (it is created if not given),
+while the frontend is stateful and created every time."""
+    with open(source_file, "r") as f:
+        return compile_source(f, options_from_args(args), source_file, backend, cache).output
+
+
+def write_output(result: str, output_file: str):
+    if output_file == '-':
+        print(result)
+        return
+    with open(output_file, "w") as f:
+        f.write(result)
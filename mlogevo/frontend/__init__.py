@@ -1,2 +1,9 @@
-from .compiler import Compiler
 from .compilation_error import CompilationError
+
+
+def __getattr__(name):
+    # Compiler needs pycparser, import it only when a C source is compiled
+    if name == "Compiler":
+        from .compiler import Compiler
+        return Compiler
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -12,5 +12,11 @@ class FrontendResult:
 
 
 class AbstractCompiler:
+    def preprocess(self, filename: str, use_cpp=True, cpp_path="cpp", cpp_args=None) -> str:
+        pass
+
+    def compile_text(self, text: str, filename: str = "<stdin>") -> FrontendResult:
+        pass
+
     def compile(self, filename: str, use_cpp=True, cpp_path="cpp", cpp_args=None) -> FrontendResult:
         pass
\ No newline at end of file
@@ -6,13 +6,14 @@ import os
 
 from ..intermediate import Quadruple
 from .compiler_sketch import choose_binaryop_instruction
-from .components.branch_support import BranchSupport
+from .components.switch_support import SwitchSupport
 
 
 # Stateful compiler & ast node visitor
-class Compiler(BranchSupport):
-    def __init__(self):
+class Compiler(SwitchSupport):
+    def __init__(self, strict_32bit: bool = False):
         super().__init__()
+        self.strict_32bit = strict_32bit
 
     def visit_BinaryOp(self, node):
         left_typedecl, left_var = self.visit(node.left)
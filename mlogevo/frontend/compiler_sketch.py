@@ -1,20 +1,16 @@
 from dataclasses import dataclass, field
 from typing import List, Dict, Set
-import sysconfig
-import os
 # for string constants
 from ast import literal_eval
 
 from pycparser.c_ast import \
     Compound, Constant, DeclList, Enum, FileAST, \
-    FuncDecl, Struct, TypeDecl, Typename, PtrDecl, \
+    FuncCall, FuncDecl, Struct, TypeDecl, Typename, PtrDecl, \
     Typedef, StructRef
 
 from pycparser.c_ast import NodeVisitor
-from pycparser import parse_file
 
-from pycparserext_gnuc.ext_c_parser import GnuCParser, \
-    FuncDeclExt, Asm
+from pycparserext_gnuc.ext_c_parser import FuncDeclExt, Asm
 
 from ..intermediate import Quadruple
 from ..intermediate.function import Function
@@ -27,9 +23,17 @@ from .type_util import choose_binaryop_instruction, \
     CORE_COMPARISONS
 from .mlog_object import MlogObjectDefinitionParser, convert_field_name
 from .parent_node_visitor import ParentNodeVisitor
+from . import preprocessor
+from .gnuc_parser import get_parser
 from .abstract_compiler import AbstractCompiler, FrontendResult
 
 
+def has_call(node) -> bool:
+    if isinstance(node, FuncCall):
+        return True
+    return any(has_call(child) for child in node)
+
+
 # Stateful compiler & ast node visitor
 # TODO: this stateful compiler is a mess, consider breaking it into several components
 class CompilerSketch(ParentNodeVisitor, AbstractCompiler):
@@ -50,20 +54,15 @@ class CompilerSketch(ParentNodeVisitor, AbstractCompiler):
 
         super().__init__()
 
-    def compile(self, filename: str, use_cpp=True, cpp_path="cpp", cpp_args=None) -> FrontendResult:
-        if cpp_args is None:
-            cpp_args = []
-        include_path = get_include_path()
-        if len(include_path) > 0:
-            cpp_args = cpp_args + ["-I", include_path]
-        ast = parse_file(filename,
-                         use_cpp=use_cpp,
-                         cpp_path=cpp_path,
-                         cpp_args=cpp_args,
-                         parser=GnuCParser())
+    def preprocess(self, filename: str, use_cpp=True, cpp_path="cpp", cpp_args=None) -> str:
+        return preprocessor.preprocess_source(filename, use_cpp, cpp_path, cpp_args)
+
+    def compile_text(self, text: str, filename: str = "<stdin>") -> FrontendResult:
+        ast = get_parser().parse(text, filename)
         self.visit(ast)
         referred_builtins = []
-        for field in self.referred_builtins_items:
+        # sorted: keep output (and compilation cache keys) independent of set order
+        for field in sorted(self.referred_builtins_items):
             referred_builtins.append(
                 Quadruple(
                     instruction=choose_decl_instruction(self.mlog_builtins_items[field]),
@@ -73,6 +72,10 @@ class CompilerSketch(ParentNodeVisitor, AbstractCompiler):
             )
         return FrontendResult({}, referred_builtins+self.instructions, self.functions)
 
+    def compile(self, filename: str, use_cpp=True, cpp_path="cpp", cpp_args=None) -> FrontendResult:
+        text = self.preprocess(filename, use_cpp, cpp_path, cpp_args)
+        return self.compile_text(text, filename)
+
     def push(self, instruction) -> None:
         if self.current_function is None:
             self.instructions.append(instruction)
@@ -94,9 +97,9 @@ class CompilerSketch(ParentNodeVisitor, AbstractCompiler):
                 self.peek().dest = dest_var
                 self.remove_temp_variable(src_var)
                 return
-            output_vars_ref = self.peek().output_vars
-            if len(output_vars_ref) == 1 and output_vars_ref[0] == src_var:
-                output_vars_ref[0] = dest_var
+            last_inst = self.peek()
+            if len(last_inst.output_vars) == 1 and last_inst.output_vars[0] == src_var:
+                last_inst.output_vars = [dest_var]
                 self.remove_temp_variable(src_var)
                 return
         self.push(Quadruple(copy_inst, src_var, "", dest_var))
@@ -243,7 +246,7 @@ class CompilerSketch(ParentNodeVisitor, AbstractCompiler):
             else:
                 params = [(param_decl.name, param_decl.type)
                           for param_decl in func_decl.args.params]
-            specs = [extract_attribute(attr) for attr in node.decl.funcspec] or ["default", ]
+            specs = [extract_attribute(attr) for attr in node.funcspec] or ["default", ]
             self.functions[node.name] = Function(node.name, func_decl.type, params, dict(params), [], specs)
             return
         if isinstance(node.type, Struct):
@@ -426,25 +429,47 @@ class CompilerSketch(ParentNodeVisitor, AbstractCompiler):
             raise ValueError(f"{function_name} is not a function (or not declared)")
         # if len(func.params) != len(args):
         #    raise ValueError(f"{function_name} expect {len(func.params)} params, got {len(args)}")
-        for param_decl, arg in zip(func.params, args):
+        args = list(args)
+        # f(1, f(2, 3)): parameters are set once the arguments after them make no calls
+        pending = []
+        # f(n - 1, n) in f (a tail call, see tail-recursion): all arguments are read before parameters are set
+        recursive = self.current_function is not None and self.current_function.name == function_name
+        parameters = {f"_{param_decl[0]}@{function_name}" for param_decl in func.params}
+        for (i, (param_decl, arg)) in enumerate(zip(func.params, args)):
             param_realname = f"_{param_decl[0]}@{function_name}"
             arg_typedecl, arg_varname = self.visit(arg)
             real_argument = arg_varname
             param_type = self.extract_actual_typename(param_decl[1])
             if self.extract_actual_typename(arg_typedecl) != param_type:
                 real_argument = self.static_cast(arg_varname, arg_typedecl, param_decl[1])
-            self.heuristic_assign(real_argument, param_realname, param_decl[1])
+            if recursive and real_argument in parameters:
+                copied = self.create_temp_variable(param_decl[1], True)
+                self.push(Quadruple(choose_set_instruction(param_decl[1]), real_argument, "", copied))
+                real_argument = copied
+            if recursive or any(has_call(later) for later in args[i + 1:]):
+                pending.append((real_argument, param_realname, param_decl[1]))
+            else:
+                for assignment in pending:
+                    self.heuristic_assign(*assignment)
+                pending = []
+                self.heuristic_assign(real_argument, param_realname, param_decl[1])
+        for assignment in pending:
+            self.heuristic_assign(*assignment)
         self.push(Quadruple("__call", function_name))
         decl_inst = choose_decl_instruction(func.result_type)
-        if decl_inst != "":
-            self.push(Quadruple(decl_inst, src1="default", dest=f"result@{function_name}"))
-        # Assume a function returns something
-        return func.result_type, f"result@{function_name}"
+        if decl_inst == "":
+            # Assume a function returns something
+            return func.result_type, f"result@{function_name}"
+        self.push(Quadruple(decl_inst, src1="default", dest=f"result@{function_name}"))
+        # f(1) + f(2): the next call to f overwrites result@f
+        result_var = self.create_temp_variable(func.result_type, True)
+        self.push(Quadruple(choose_set_instruction(func.result_type), f"result@{function_name}", "", result_var))
+        return func.result_type, result_var
 
     def visit_Asm(self, node: Asm):
-        result_ir = Quadruple("asm")
+        result_ir = Quadruple("asm", input_vars=[], output_vars=[], raw_instructions=[])
         if "volatile" in node.asm_keyword:
-            result_ir = Quadruple("asm_volatile")
+            result_ir.instruction = "asm_volatile"
         # node(Asm) -> template(ExprList)
         for constant in node.template:
             result_ir.raw_instructions.extend(literal_eval(constant.value).splitlines())
@@ -481,10 +506,9 @@ class CompilerSketch(ParentNodeVisitor, AbstractCompiler):
             if base_type == "struct MlogObject":
                 result_type = self.mlog_object_items[field_name]
                 result_var = self.create_temp_variable(result_type)
-                asm_ir = Quadruple("asm")
-                asm_ir.raw_instructions.append(f"sensor %0 %1 {convert_field_name(field_name)}")
-                asm_ir.input_vars.append(base_var)
-                asm_ir.output_vars.append(result_var)
+                asm_ir = Quadruple("asm",
+                                   input_vars=[base_var], output_vars=[result_var],
+                                   raw_instructions=[f"sensor %0 %1 {convert_field_name(field_name)}"])
                 self.push(asm_ir)
             elif base_type == "struct MLOG_BUILTINS":
                 result_type = self.mlog_builtins_items[field_name]
@@ -509,11 +533,3 @@ def extract_asm_operand(operand):
 
 def is_mlogev_temp_var(varname):
     return varname.startswith("__vtmp_") or varname.startswith("___vtmp_")
-
-
-def get_include_path() -> str:
-    if os.name == "posix":
-        return sysconfig.get_path("include", "posix_user")
-    elif os.name == "nt":
-        return sysconfig.get_path("include", "nt")
-    return ""
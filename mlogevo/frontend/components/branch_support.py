@@ -8,6 +8,8 @@ class BranchSupport(CompilerSketch):
         self.if_structure_count: int = 0
         self.loop_structure_count: int = 0
         self.loop_stack: list = []
+        # where break jumps to: ends of loops and switches
+        self.break_labels: list = []
 
         # Used in short-circuit evaluation
         self.short_circuit_count: int = 0
@@ -26,8 +28,13 @@ class BranchSupport(CompilerSketch):
         start_label = f"{label_prefix}_START_"
         cont_label = f"{label_prefix}_CONT_"
         end_label = f"{label_prefix}_END_"
+        self.break_labels.append(end_label)
         return current_loop, start_label, cont_label, end_label
 
+    def end_loop(self):
+        self.loop_stack.pop()
+        self.break_labels.pop()
+
     def get_faster_conditional_jump(self):
         if self.current_function is None:
             return
@@ -116,7 +123,7 @@ class BranchSupport(CompilerSketch):
         self.get_faster_conditional_jump()
         self.push(Quadruple("label", end_label))
 
-        self.loop_stack.pop()
+        self.end_loop()
 
     def visit_DoWhile(self, node):
         current_loop, start_label, cont_label, end_label = \
@@ -130,7 +137,7 @@ class BranchSupport(CompilerSketch):
         self.get_faster_conditional_jump()
         self.push(Quadruple("label", end_label))
 
-        self.loop_stack.pop()
+        self.end_loop()
 
     def visit_While(self, node):
         current_loop, start_label, cont_label, end_label = \
@@ -145,12 +152,10 @@ class BranchSupport(CompilerSketch):
         self.get_faster_conditional_jump()
         self.push(Quadruple("label", end_label))
 
-        self.loop_stack.pop()
+        self.end_loop()
 
     def visit_Break(self, node):
-        current_loop = self.loop_stack[-1]
-        end_label = f"__MLOGEV_LOOP_{current_loop}_CONT_"
-        self.push(Quadruple("goto", end_label))
+        self.push(Quadruple("goto", self.break_labels[-1]))
 
     def visit_Continue(self, node):
         current_loop = self.loop_stack[-1]
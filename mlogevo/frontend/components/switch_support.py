@@ -0,0 +1,189 @@
+from typing import Dict, List, Optional, Tuple
+
+from pycparser.c_ast import BinaryOp, Case, Constant, Default, Switch, UnaryOp
+
+from ...intermediate import Quadruple
+from ..compilation_error import CompilationError
+from ..type_util import CONVERSION_RANK, DUMMY_INT_TYPEDECL, choose_binaryop_instruction
+from .branch_support import BranchSupport
+
+# Cost of a dispatch: its instructions, plus this many for each instruction it runs
+DISPATCH_WEIGHT = 4
+# Binary search compares with up to this many cases one after another
+LINEAR_CASES = 3
+# -mstrict-32bit masks every value with this, case values too (see optimizer/constant_folding.py)
+MASK_32BIT = 0xFFFFFFFF
+
+
+def truncated_division(a: int, b: int) -> int:
+    # C rounds toward zero
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+CONSTANT_BINARY_OPERATORS = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": truncated_division,
+    "%": lambda a, b: a - truncated_division(a, b) * b,
+    "&": lambda a, b: a & b,
+    "|": lambda a, b: a | b,
+    "^": lambda a, b: a ^ b,
+    "<<": lambda a, b: a << b,
+    ">>": lambda a, b: a >> b,
+}
+
+
+def case_value(node) -> Optional[int]:
+    """Value of an integer constant expression, None if it is not one"""
+    if isinstance(node, Constant):
+        if node.type != "int":
+            return None
+        text = node.value.rstrip("uUlL")
+        if len(text) > 1 and text[0] == "0" and text[1] not in "xXbB":
+            return int(text, 8)
+        return int(text, 0)
+    if isinstance(node, UnaryOp) and node.op in ("-", "+", "~"):
+        value = case_value(node.expr)
+        if value is None:
+            return None
+        return {"-": -value, "+": value, "~": ~value}[node.op]
+    if isinstance(node, BinaryOp) and node.op in CONSTANT_BINARY_OPERATORS:
+        left, right = case_value(node.left), case_value(node.right)
+        if left is None or right is None or node.op in ("/", "%") and right == 0:
+            return None
+        return CONSTANT_BINARY_OPERATORS[node.op](left, right)
+    return None
+
+
+def collect_cases(node, result: List):
+    """case and default labels of a switch body, in order, nested switches have their own"""
+    if isinstance(node, (Case, Default)):
+        result.append(node)
+    for child in node:
+        if not isinstance(child, Switch):
+            collect_cases(child, result)
+    return result
+
+
+def search_cost(count: int) -> Tuple[int, int]:
+    """(instructions, most instructions run) of a binary search over count cases"""
+    if count <= LINEAR_CASES:
+        # if x == value goto case, ..., goto default
+        return count + 1, count + 1
+    left_size, left_run = search_cost(count // 2)
+    right_size, right_run = search_cost(count - count // 2)
+    return 1 + left_size + right_size, 1 + max(left_run, right_run)
+
+
+def table_cost(low: int, high: int) -> Tuple[int, int]:
+    """(instructions, instructions run) of a jump table from low to high"""
+    # 2 range checks, x - low, op add @counter and a jump of the table
+    overhead = 2 + (low != 0) + 1
+    return overhead + high - low + 1, overhead + 1
+
+
+def weighted(cost: Tuple[int, int]) -> int:
+    size, run = cost
+    return size + DISPATCH_WEIGHT * run
+
+
+class SwitchSupport(BranchSupport):
+    """switch and case. Dense cases dispatch with a jump table (__jumptable), in constant time,
+and sparse ones with a binary search of comparisons, whichever is cheaper (see DISPATCH_WEIGHT)"""
+    def __init__(self):
+        self.switch_structure_count: int = 0
+        # case or default node -> its label, a dict for every switch being compiled
+        self.switch_stack: list = []
+        # the switch quantity is masked, so are case values, which also sorts them as unsigned
+        self.strict_32bit: bool = False
+        super().__init__()
+
+    def visit_Switch(self, node):
+        label_prefix = f"__MLOGEV_SWITCH_{self.switch_structure_count}"
+        self.switch_structure_count += 1
+        end_label = f"{label_prefix}_END_"
+
+        cond_typedecl, cond_var = self.visit(node.cond)
+        if not 0 < CONVERSION_RANK.get(self.extract_actual_typename(cond_typedecl), 0) <= CONVERSION_RANK["long long"]:
+            raise CompilationError(reason="switch quantity is not an integer", coord=node.coord)
+
+        labels: Dict[int, str] = {}
+        cases: Dict[int, str] = {}
+        default_label = end_label
+        for (i, case) in enumerate(collect_cases(node.stmt, [])):
+            if isinstance(case, Default):
+                if default_label != end_label:
+                    raise CompilationError(reason="multiple default labels in one switch", coord=case.coord)
+                default_label = labels[id(case)] = f"{label_prefix}_DEFAULT_"
+                continue
+            value = case_value(case.expr)
+            if value is None:
+                raise CompilationError(reason="case label is not an integer constant", coord=case.coord)
+            if (value & MASK_32BIT if self.strict_32bit else value) in cases:
+                raise CompilationError(reason=f"duplicate case value {value}", coord=case.coord)
+            if self.strict_32bit:
+                value &= MASK_32BIT
+            cases[value] = labels[id(case)] = f"{label_prefix}_CASE_{i}_"
+
+        self.dispatch(cond_var, sorted(cases.items()), default_label)
+        self.break_labels.append(end_label)
+        self.switch_stack.append(labels)
+        self.visit(node.stmt)
+        self.switch_stack.pop()
+        self.break_labels.pop()
+        self.push(Quadruple("label", end_label))
+
+    def dispatch(self, cond_var: str, cases: List[Tuple[int, str]], default_label: str):
+        if not cases:
+            self.push(Quadruple("goto", default_label))
+            return
+        low, high = cases[0][0], cases[-1][0]
+        # a table starting at 0 saves x - low, entries below low go to default
+        if low > 0 and weighted(table_cost(0, high)) < weighted(table_cost(low, high)):
+            low = 0
+        if weighted(table_cost(low, high)) >= weighted(search_cost(len(cases))):
+            self.binary_search(cond_var, cases, default_label)
+            return
+        _, lt = choose_binaryop_instruction("<", DUMMY_INT_TYPEDECL, DUMMY_INT_TYPEDECL)
+        _, gt = choose_binaryop_instruction(">", DUMMY_INT_TYPEDECL, DUMMY_INT_TYPEDECL)
+        self.push(Quadruple("if", cond_var, str(low), default_label, relop=lt))
+        self.push(Quadruple("if", cond_var, str(high), default_label, relop=gt))
+        index = cond_var
+        if low != 0:
+            _, sub = choose_binaryop_instruction("-", DUMMY_INT_TYPEDECL, DUMMY_INT_TYPEDECL)
+            index = self.create_temp_variable(DUMMY_INT_TYPEDECL, True)
+            self.push(Quadruple(sub, cond_var, str(low), index))
+        case_labels = dict(cases)
+        self.push(Quadruple("__jumptable", index,
+                            raw_instructions=[case_labels.get(value, default_label) for value in range(low, high + 1)]))
+
+    def binary_search(self, cond_var: str, cases: List[Tuple[int, str]], default_label: str):
+        if len(cases) <= LINEAR_CASES:
+            _, eq = choose_binaryop_instruction("==", DUMMY_INT_TYPEDECL, DUMMY_INT_TYPEDECL)
+            for (value, label) in cases:
+                self.push(Quadruple("if", cond_var, str(value), label, relop=eq))
+            self.push(Quadruple("goto", default_label))
+            return
+        middle = len(cases) // 2
+        # every case is the middle of one search at most
+        right_label = f"{cases[middle][1]}SEARCH_"
+        _, gteq = choose_binaryop_instruction(">=", DUMMY_INT_TYPEDECL, DUMMY_INT_TYPEDECL)
+        self.push(Quadruple("if", cond_var, str(cases[middle][0]), right_label, relop=gteq))
+        self.binary_search(cond_var, cases[:middle], default_label)
+        self.push(Quadruple("label", right_label))
+        self.binary_search(cond_var, cases[middle:], default_label)
+
+    def visit_Case(self, node):
+        self.visit_case_label(node)
+
+    def visit_Default(self, node):
+        self.visit_case_label(node)
+
+    def visit_case_label(self, node):
+        if not self.switch_stack:
+            raise CompilationError(reason="case label not within a switch statement", coord=node.coord)
+        self.push(Quadruple("label", self.switch_stack[-1][id(node)]))
+        for stmt in node.stmts or ():
+            self.visit(stmt)
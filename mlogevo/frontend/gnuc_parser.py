@@ -0,0 +1,69 @@
+"""
+Create GnuCParser with ready-made PLY tables.
+
+pycparserext_gnuc ships pre-built lexer and parser tables. If the installed PLY
+(bundled in pycparser) cannot use them, PLY would regenerate the tables in every
+process. In that case we generate them once and keep them in the user cache directory.
+"""
+import importlib.util
+import os
+
+import pycparser.c_parser
+from pycparser.ply import lex, yacc
+from pycparserext_gnuc.ext_c_parser import GnuCParser
+
+from ..compile_cache import default_cache_dir
+
+# Building GnuCParser loads PLY tables, share one instance in this process
+_parser: GnuCParser = None
+
+
+def shipped_tables_usable() -> bool:
+    try:
+        from pycparserext_gnuc import lextab, yacctab
+    except ImportError:
+        return False
+    return getattr(lextab, "_tabversion", "") == lex.__tabversion__ \
+        and getattr(yacctab, "_tabversion", "") == yacc.__tabversion__
+
+
+def get_table_dir() -> str:
+    return os.path.join(default_cache_dir(), "parser_tables", f"ply-{yacc.__tabversion__}")
+
+
+def load_cached_table(table_dir: str, module_name: str):
+    """Returns the module object if table_dir has it, otherwise the name for PLY to write"""
+    path = os.path.join(table_dir, module_name + ".py")
+    if not os.path.isfile(path):
+        return module_name
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class CachedTablesGnuCParser(GnuCParser):
+    """GnuCParser that reads (or writes) its tables in table_dir"""
+    def __init__(self, table_dir: str):
+        os.makedirs(table_dir, exist_ok=True)
+        # Skip CParserBase.__init__, it insists on pycparserext_gnuc's own tables
+        pycparser.c_parser.CParser.__init__(
+            self,
+            lexer=self.lexer_class,
+            lextab=load_cached_table(table_dir, "mlogevo_gnuc_lextab"),
+            yacctab=load_cached_table(table_dir, "mlogevo_gnuc_yacctab"),
+            taboutputdir=table_dir,
+        )
+
+
+def make_parser() -> GnuCParser:
+    if shipped_tables_usable():
+        return GnuCParser()
+    return CachedTablesGnuCParser(get_table_dir())
+
+
+def get_parser() -> GnuCParser:
+    global _parser
+    if _parser is None:
+        _parser = make_parser()
+    return _parser
@@ -0,0 +1,785 @@
+"""
+A small C preprocessor written in Python, used by `--preprocessor=builtin`.
+
+It runs in-process, so no `cpp` or `gcc -E` is forked per translation unit.
+Lexed files are kept in a per-process cache (keyed by path, size and mtime),
+thus headers shared by a batch of sources are read and tokenized only once.
+
+Supported: #include, #define (object-like, function-like, variadic, # and ##),
+#undef, #if/#ifdef/#ifndef/#elif/#else/#endif, #error, #warning, #line,
+#pragma (`#pragma once` is handled, others are passed through),
+__FILE__ and __LINE__.
+"""
+import os
+import re
+import subprocess
+import sys
+import sysconfig
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from .compilation_error import CompilationError
+
+
+class PPToken(NamedTuple):
+    kind: str
+    text: str
+    # is there any whitespace before this token
+    space: bool = False
+    hideset: FrozenSet[str] = frozenset()
+
+
+class Macro(NamedTuple):
+    name: str
+    # None for object-like macros
+    params: Optional[Tuple[str, ...]]
+    variadic: bool
+    body: Tuple[PPToken, ...]
+
+
+# Stands for an empty macro argument around ##
+PLACEMARKER = PPToken("placemarker", "")
+
+# (line_number, tokens) of each logical line
+LexedFile = List[Tuple[int, List[PPToken]]]
+
+_token_pattern = re.compile(r"""
+ (?P<ws>[ \t\f\v\r]+)
+|(?P<string>L?"(?:\\.|[^"\\])*")
+|(?P<char>L?'(?:\\.|[^'\\])*')
+|(?P<ident>[A-Za-z_$][A-Za-z_0-9$]*)
+|(?P<number>\.?[0-9](?:[eEpP][+-]|[A-Za-z0-9_.])*)
+|(?P<punct>\.\.\.|<<=|>>=|->|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||[*/%+\-&^|]=|\#\#
+   |[\[\](){}.&*+\-~!/%<>^|?:;=,\#])
+|(?P<other>.)
+""", re.VERBOSE)
+
+# strings/chars are matched first, so comment markers inside them are kept
+_comment_pattern = re.compile(r"""
+ "(?:\\.|[^"\\\n])*"?
+|'(?:\\.|[^'\\\n])*'?
+|/\*.*?(?:\*/|\Z)
+|//[^\n]*
+|\n
+|[^"'/\n]+
+|/
+""", re.VERBOSE | re.DOTALL)
+
+# header_path -> ((size, mtime_ns), lexed_file)
+_lexed_file_cache: Dict[str, Tuple[Tuple[int, int], LexedFile]] = {}
+
+PREDEFINED_MACROS = {
+    "__STDC__": "1",
+    "__STDC_VERSION__": "199901L",
+}
+
+
+def tokenize(text: str) -> List[PPToken]:
+    tokens = []
+    space = False
+    for match in _token_pattern.finditer(text):
+        kind = match.lastgroup
+        if kind == "ws":
+            space = True
+            continue
+        tokens.append(PPToken(kind, match.group(), space))
+        space = False
+    return tokens
+
+
+def split_logical_lines(text: str) -> List[Tuple[int, str]]:
+    """Join continued lines and strip comments, returns [(line_number, text), ...]"""
+    # Phase 2: backslash-newline, remember where each joined line starts
+    physical_lines = text.replace("\r\n", "\n").split("\n")
+    spliced = []
+    start_numbers = []
+    current = []
+    current_start = 1
+    for line_number, line in enumerate(physical_lines, 1):
+        if line.endswith("\\"):
+            if not current:
+                current_start = line_number
+            current.append(line[:-1])
+            continue
+        if not current:
+            current_start = line_number
+        current.append(line)
+        spliced.append("".join(current))
+        start_numbers.append(current_start)
+        current = []
+    if current:
+        spliced.append("".join(current))
+        start_numbers.append(current_start)
+
+    # Phase 3: comments become a single space, they may span several lines
+    results = []
+    spliced_index = 0
+    current = []
+    current_start = start_numbers[0] if start_numbers else 1
+    for match in _comment_pattern.finditer("\n".join(spliced)):
+        chunk = match.group()
+        if chunk == "\n":
+            results.append((current_start, "".join(current)))
+            current = []
+            spliced_index += 1
+            current_start = start_numbers[spliced_index]
+        elif chunk.startswith("/*"):
+            current.append(" ")
+            spliced_index += chunk.count("\n")
+        elif chunk.startswith("//"):
+            current.append(" ")
+        else:
+            current.append(chunk)
+    results.append((current_start, "".join(current)))
+    return results
+
+
+def lex_text(text: str) -> LexedFile:
+    results = []
+    for line_number, line in split_logical_lines(text):
+        tokens = tokenize(line)
+        if tokens:
+            results.append((line_number, tokens))
+    return results
+
+
+def lex_file(path: str) -> LexedFile:
+    """Lex a file, reusing the per-process cache if the file is unchanged"""
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    cached = _lexed_file_cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with open(path, "r") as f:
+        lexed = lex_text(f.read())
+    _lexed_file_cache[path] = (signature, lexed)
+    return lexed
+
+
+def clear_cache():
+    _lexed_file_cache.clear()
+
+
+def stringify(tokens: List[PPToken]) -> PPToken:
+    parts = []
+    for token in tokens:
+        if token.space and parts:
+            parts.append(" ")
+        text = token.text
+        if token.kind in ("string", "char"):
+            text = text.replace("\\", "\\\\").replace("\"", "\\\"")
+        parts.append(text)
+    return PPToken("string", "\"" + "".join(parts) + "\"")
+
+
+def join_tokens(tokens: List[PPToken]) -> str:
+    parts = []
+    for token in tokens:
+        if token.space and parts:
+            parts.append(" ")
+        parts.append(token.text)
+    return "".join(parts)
+
+
+class Preprocessor:
+    def __init__(self, include_dirs: List[str] = None, defines: List[str] = None,
+                 undefines: List[str] = None):
+        self.include_dirs: List[str] = list(include_dirs or [])
+        self.macros: Dict[str, Macro] = {}
+        self.once_files = set()
+        self.output: List[str] = []
+        # Where we are, for __FILE__, __LINE__ and diagnostics
+        self.current_file = ""
+        self.current_line = 0
+        # Line number of the next output line in self.current_file
+        self.output_line = 0
+
+        for (name, value) in PREDEFINED_MACROS.items():
+            self.define(f"{name} {value}")
+        for definition in (defines or []):
+            name, _, value = definition.partition("=")
+            self.define(f"{name} {value or '1'}")
+        for name in (undefines or []):
+            self.macros.pop(name, None)
+
+    @classmethod
+    def from_cpp_args(cls, cpp_args: List[str]) -> "Preprocessor":
+        """Accept (a subset of) cpp command line arguments: -D, -U, -I, -E"""
+        include_dirs, defines, undefines = [], [], []
+        destinations = {"-I": include_dirs, "-D": defines, "-U": undefines}
+        args = list(cpp_args or [])
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            i += 1
+            prefix = arg[:2]
+            if prefix not in destinations:
+                # -E and friends
+                continue
+            value = arg[2:]
+            if value == "" and i < len(args):
+                value = args[i]
+                i += 1
+            destinations[prefix].append(value)
+        return cls(include_dirs, defines, undefines)
+
+    def error(self, reason: str):
+        raise CompilationError(reason=reason, coord=f"{self.current_file}:{self.current_line}")
+
+    def define(self, definition: str):
+        self.define_tokens(tokenize(definition))
+
+    def define_tokens(self, tokens: List[PPToken]):
+        if not tokens or tokens[0].kind != "ident":
+            self.error("macro names must be identifiers")
+        name = tokens[0].text
+        params = None
+        variadic = False
+        body_start = 1
+        # function-like macro: no space between name and '('
+        if len(tokens) > 1 and tokens[1].text == "(" and not tokens[1].space:
+            params = []
+            i = 2
+            while i < len(tokens) and tokens[i].text != ")":
+                token = tokens[i]
+                if token.text == "...":
+                    variadic = True
+                    params.append("__VA_ARGS__")
+                elif token.kind == "ident":
+                    params.append(token.text)
+                elif token.text != ",":
+                    self.error(f"invalid parameter list of macro `{name}`")
+                i += 1
+            if i >= len(tokens):
+                self.error(f"missing `)` in parameter list of macro `{name}`")
+            params = tuple(params)
+            body_start = i + 1
+        body = tokens[body_start:]
+        if body:
+            body[0] = body[0]._replace(space=False)
+        self.macros[name] = Macro(name, params, variadic, tuple(body))
+
+    # Preprocess entries
+    def preprocess_file(self, filename: str) -> str:
+        self.output = []
+        self.include(os.path.abspath(filename), filename)
+        return "\n".join(self.output) + "\n"
+
+    def preprocess_text(self, text: str, filename: str = "<stdin>") -> str:
+        self.output = []
+        self.run_lexed(lex_text(text), filename, os.path.dirname(os.path.abspath(filename)))
+        return "\n".join(self.output) + "\n"
+
+    def include(self, path: str, display_name: str):
+        if path in self.once_files:
+            return
+        try:
+            lexed = lex_file(path)
+        except OSError as e:
+            self.error(f"cannot read `{display_name}`: {e.strerror}")
+        self.run_lexed(lexed, display_name, os.path.dirname(path), path)
+
+    def find_include(self, header: str, is_quoted: bool, current_dir: str) -> Optional[str]:
+        search_dirs = ([current_dir] if is_quoted else []) + self.include_dirs
+        for directory in search_dirs:
+            candidate = os.path.join(directory, header)
+            if os.path.isfile(candidate):
+                return os.path.abspath(candidate)
+        return None
+
+    def emit_line_marker(self, line_number: int):
+        self.output.append(f"# {line_number} \"{self.current_file}\"")
+        self.output_line = line_number
+
+    def emit(self, line_number: int, text: str):
+        gap = line_number - self.output_line
+        if 0 <= gap < 8:
+            self.output.extend([""] * gap)
+        else:
+            self.emit_line_marker(line_number)
+        self.output.append(text)
+        self.output_line = line_number + 1
+
+    def run_lexed(self, lexed: LexedFile, display_name: str, current_dir: str, path: str = ""):
+        saved = (self.current_file, self.current_line, self.output_line)
+        self.current_file = display_name
+        self.current_line = 1
+        self.emit_line_marker(1)
+
+        # [(parent_active, this_branch_active, any_branch_taken), ...]
+        conditions: List[Tuple[bool, bool, bool]] = []
+        active = True
+        # changed by #line
+        line_offset = 0
+        i = 0
+        n = len(lexed)
+        while i < n:
+            physical_line, tokens = lexed[i]
+            line_number = physical_line + line_offset
+            i += 1
+            self.current_line = line_number
+            if tokens[0].text != "#":
+                if not active:
+                    continue
+                # function-like macro invocations may span several lines
+                line_tokens = list(tokens)
+                while self.needs_more_tokens(line_tokens) and i < n and lexed[i][1][0].text != "#":
+                    line_tokens.extend(lexed[i][1])
+                    i += 1
+                self.emit(line_number, join_tokens(self.expand(line_tokens)))
+                continue
+
+            directive = tokens[1].text if len(tokens) > 1 else ""
+            operands = tokens[2:]
+            # `# 42 "file.c"`, linemarkers in preprocessed sources
+            if len(tokens) > 1 and tokens[1].kind == "number":
+                directive = "line"
+                operands = tokens[1:]
+            if directive in ("if", "ifdef", "ifndef"):
+                if not active:
+                    conditions.append((False, False, True))
+                    continue
+                if directive == "if":
+                    taken = self.evaluate(operands) != 0
+                else:
+                    if not operands or operands[0].kind != "ident":
+                        self.error(f"no macro name given in #{directive} directive")
+                    taken = (operands[0].text in self.macros) == (directive == "ifdef")
+                conditions.append((active, taken, taken))
+                active = taken
+                continue
+            if directive in ("elif", "else"):
+                if not conditions:
+                    self.error(f"#{directive} without #if")
+                parent_active, _, any_taken = conditions.pop()
+                taken = False
+                if parent_active and not any_taken:
+                    taken = directive == "else" or self.evaluate(operands) != 0
+                conditions.append((parent_active, taken, any_taken or taken))
+                active = taken
+                continue
+            if directive == "endif":
+                if not conditions:
+                    self.error("#endif without #if")
+                active = conditions.pop()[0]
+                continue
+            if not active:
+                continue
+
+            if directive == "define":
+                self.define_tokens(operands)
+            elif directive == "undef":
+                if operands:
+                    self.macros.pop(operands[0].text, None)
+            elif directive == "include":
+                self.handle_include(operands, current_dir)
+                self.emit_line_marker(line_number + 1)
+            elif directive == "error":
+                self.error(f"#error {join_tokens(operands)}")
+            elif directive == "warning":
+                print(f"{self.current_file}:{line_number}: warning: {join_tokens(operands)}", file=sys.stderr)
+            elif directive == "pragma":
+                if len(operands) == 1 and operands[0].text == "once":
+                    if path:
+                        self.once_files.add(path)
+                else:
+                    self.emit(line_number, "#pragma " + join_tokens(operands))
+            elif directive == "line":
+                operands = self.expand(operands)
+                if not operands or operands[0].kind != "number" or not operands[0].text.isdigit():
+                    self.error("invalid #line directive")
+                if len(operands) > 1 and operands[1].kind == "string":
+                    self.current_file = operands[1].text[1:-1]
+                # the line after #line has the given number
+                line_offset = int(operands[0].text) - (physical_line + 1)
+                self.emit_line_marker(int(operands[0].text))
+            elif directive == "":
+                pass
+            else:
+                self.error(f"invalid preprocessing directive #{directive}")
+
+        if conditions:
+            self.error("unterminated conditional directive")
+        self.current_file, self.current_line, self.output_line = saved
+
+    def handle_include(self, operands: List[PPToken], current_dir: str):
+        if not operands:
+            self.error("#include expects \"FILENAME\" or <FILENAME>")
+        if operands[0].kind != "string" and operands[0].text != "<":
+            operands = self.expand(operands)
+        if operands and operands[0].kind == "string":
+            header, is_quoted = operands[0].text[1:-1], True
+        elif operands and operands[0].text == "<":
+            end = next((k for (k, token) in enumerate(operands) if token.text == ">"), -1)
+            if end < 0:
+                self.error("missing terminating > character")
+            header, is_quoted = join_tokens(operands[1:end]), False
+        else:
+            self.error("#include expects \"FILENAME\" or <FILENAME>")
+        path = self.find_include(header, is_quoted, current_dir)
+        if path is None:
+            self.error(f"{header}: No such file or directory")
+        self.include(path, path)
+
+    # Macro expansion
+    def needs_more_tokens(self, tokens: List[PPToken]) -> bool:
+        """Tell if a function-like macro invocation may continue after the end of tokens"""
+        depth = 0
+        pending_macro = False
+        for token in tokens:
+            if depth > 0:
+                if token.text == "(":
+                    depth += 1
+                elif token.text == ")":
+                    depth -= 1
+                continue
+            if pending_macro and token.text == "(":
+                depth = 1
+                pending_macro = False
+                continue
+            macro = self.macros.get(token.text)
+            pending_macro = token.kind == "ident" and macro is not None and macro.params is not None
+        return pending_macro or depth > 0
+
+    def expand(self, tokens: List[PPToken]) -> List[PPToken]:
+        """Prosser's algorithm: each token carries a hide set of macros not to expand again"""
+        result = []
+        # reversed, we pop from the end and push expansions back
+        stack = list(reversed(tokens))
+        while stack:
+            token = stack.pop()
+            if token.kind != "ident" or token.text in token.hideset:
+                result.append(token)
+                continue
+            if token.text == "__LINE__" and token.text not in self.macros:
+                result.append(PPToken("number", str(self.current_line), token.space))
+                continue
+            if token.text == "__FILE__" and token.text not in self.macros:
+                result.append(PPToken("string", f"\"{self.current_file}\"", token.space))
+                continue
+            macro = self.macros.get(token.text)
+            if macro is None:
+                result.append(token)
+                continue
+            if macro.params is None:
+                hideset = token.hideset | {macro.name}
+                expansion = self.substitute(macro, {}, hideset, token.space)
+                stack.extend(reversed(expansion))
+                continue
+            if not stack or stack[-1].text != "(":
+                result.append(token)
+                continue
+            args, rparen = self.collect_arguments(macro, stack)
+            hideset = (token.hideset & rparen.hideset) | {macro.name}
+            expansion = self.substitute(macro, args, hideset, token.space)
+            stack.extend(reversed(expansion))
+        return result
+
+    def collect_arguments(self, macro: Macro, stack: List[PPToken]) -> Tuple[Dict, PPToken]:
+        stack.pop()
+        args: List[List[PPToken]] = [[]]
+        depth = 0
+        while True:
+            if not stack:
+                self.error(f"unterminated argument list invoking macro `{macro.name}`")
+            token = stack.pop()
+            if token.text == ")" and depth == 0:
+                rparen = token
+                break
+            if token.text == "," and depth == 0 \
+                    and not (macro.variadic and len(args) == len(macro.params)):
+                args.append([])
+                continue
+            if token.text == "(":
+                depth += 1
+            elif token.text == ")":
+                depth -= 1
+            args[-1].append(token)
+
+        params = macro.params
+        if len(params) == 0 and args == [[]]:
+            args = []
+        if macro.variadic and len(args) == len(params) - 1:
+            args.append([])
+        if len(args) != len(params):
+            self.error(f"macro `{macro.name}` requires {len(params)} arguments, but {len(args)} given")
+        return dict(zip(params, args)), rparen
+
+    def substitute(self, macro: Macro, args: Dict[str, List[PPToken]],
+                   hideset: FrozenSet[str], space: bool) -> List[PPToken]:
+        result: List[PPToken] = []
+        body = macro.body
+        i = 0
+        while i < len(body):
+            token = body[i]
+            # stringification
+            if token.text == "#" and args and i + 1 < len(body) and body[i + 1].text in args:
+                result.append(stringify(args[body[i + 1].text])._replace(space=token.space))
+                i += 2
+                continue
+            # token pasting
+            if token.text == "##" and result and i + 1 < len(body):
+                right = body[i + 1]
+                i += 2
+                right_tokens = list(args.get(right.text, [right]))
+                # GNU extension: `, ## __VA_ARGS__` drops the comma if __VA_ARGS__ is empty
+                if right.text == "__VA_ARGS__" and macro.variadic and result[-1].text == ",":
+                    if not right_tokens:
+                        result.pop()
+                    result.extend(right_tokens)
+                    continue
+                if right_tokens:
+                    left = result.pop()
+                    result.append(self.paste(left, right_tokens[0]))
+                    result.extend(right_tokens[1:])
+                continue
+            if token.kind == "ident" and token.text in args:
+                arg = args[token.text]
+                i += 1
+                if i < len(body) and body[i].text == "##":
+                    # operand of ##: not expanded, an empty one is a placemarker
+                    result.extend(arg or [PLACEMARKER])
+                else:
+                    expanded = self.expand(arg)
+                    if expanded:
+                        expanded[0] = expanded[0]._replace(space=token.space)
+                    result.extend(expanded)
+                continue
+            result.append(token)
+            i += 1
+
+        result = [t._replace(hideset=t.hideset | hideset) for t in result if t is not PLACEMARKER]
+        if result:
+            result[0] = result[0]._replace(space=space)
+        return result
+
+    def paste(self, left: PPToken, right: PPToken) -> PPToken:
+        if left is PLACEMARKER:
+            return right
+        pasted = tokenize(left.text + right.text)
+        if len(pasted) != 1:
+            self.error(f"pasting `{left.text}` and `{right.text}` does not give a valid preprocessing token")
+        return pasted[0]._replace(space=left.space, hideset=left.hideset)
+
+    # #if expressions
+    def evaluate(self, tokens: List[PPToken]) -> int:
+        # `defined` is resolved before macro expansion
+        replaced = []
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token.text != "defined":
+                replaced.append(token)
+                i += 1
+                continue
+            if i + 1 < len(tokens) and tokens[i + 1].text == "(":
+                if i + 3 >= len(tokens) or tokens[i + 3].text != ")":
+                    self.error("missing `)` after `defined`")
+                name = tokens[i + 2].text
+                i += 4
+            elif i + 1 < len(tokens):
+                name = tokens[i + 1].text
+                i += 2
+            else:
+                self.error("no macro name given after `defined`")
+            replaced.append(PPToken("number", "1" if name in self.macros else "0", token.space))
+        expanded = self.expand(replaced)
+        if not expanded:
+            self.error("#if with no expression")
+        evaluator = _ExpressionEvaluator(expanded, self.error)
+        return evaluator.run()
+
+
+def _parse_integer(text: str) -> int:
+    text = text.rstrip("uUlL")
+    if text[:2] in ("0x", "0X"):
+        return int(text[2:], 16)
+    if text[:2] in ("0b", "0B"):
+        return int(text[2:], 2)
+    if len(text) > 1 and text[0] == "0":
+        return int(text[1:], 8)
+    return int(text, 10)
+
+
+_char_escapes = {
+    "n": 10, "t": 9, "r": 13, "0": 0, "a": 7, "b": 8, "f": 12, "v": 11,
+    "\\": 92, "'": 39, "\"": 34, "?": 63,
+}
+
+
+def _parse_char(text: str) -> int:
+    body = text[text.index("'") + 1:-1]
+    if body.startswith("\\"):
+        if body[1] in "xX":
+            return int(body[2:], 16)
+        if body[1].isdigit() and body[1] != "0" or len(body) > 2:
+            return int(body[1:], 8)
+        return _char_escapes.get(body[1], ord(body[1]))
+    return ord(body[0]) if body else 0
+
+
+def _truncated_division(a: int, b: int) -> int:
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+# operator: (precedence, function), higher precedence binds tighter
+_binary_operators = {
+    "*": (10, lambda a, b: a * b),
+    "/": (10, lambda a, b: _truncated_division(a, b)),
+    "%": (10, lambda a, b: a - _truncated_division(a, b) * b),
+    "+": (9, lambda a, b: a + b),
+    "-": (9, lambda a, b: a - b),
+    "<<": (8, lambda a, b: a << b),
+    ">>": (8, lambda a, b: a >> b),
+    "<": (7, lambda a, b: int(a < b)),
+    ">": (7, lambda a, b: int(a > b)),
+    "<=": (7, lambda a, b: int(a <= b)),
+    ">=": (7, lambda a, b: int(a >= b)),
+    "==": (6, lambda a, b: int(a == b)),
+    "!=": (6, lambda a, b: int(a != b)),
+    "&": (5, lambda a, b: a & b),
+    "^": (4, lambda a, b: a ^ b),
+    "|": (3, lambda a, b: a | b),
+    "&&": (2, None),
+    "||": (1, None),
+}
+
+
+class _ExpressionEvaluator:
+    """Evaluate integer constant expressions of #if and #elif"""
+    def __init__(self, tokens: List[PPToken], error):
+        self.tokens = tokens
+        self.position = 0
+        self.error = error
+
+    def peek(self) -> str:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position].text
+        return ""
+
+    def next(self) -> PPToken:
+        if self.position >= len(self.tokens):
+            self.error("unexpected end of #if expression")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def run(self) -> int:
+        value = self.conditional()
+        if self.position != len(self.tokens):
+            self.error(f"unexpected `{self.peek()}` in #if expression")
+        return value
+
+    def conditional(self) -> int:
+        condition = self.binary(1)
+        if self.peek() != "?":
+            return condition
+        self.next()
+        if_true = self.conditional()
+        if self.next().text != ":":
+            self.error("expected `:` in #if expression")
+        if_false = self.conditional()
+        return if_true if condition else if_false
+
+    def binary(self, min_precedence: int) -> int:
+        left = self.unary()
+        while self.peek() in _binary_operators:
+            op = self.peek()
+            precedence, function = _binary_operators[op]
+            if precedence < min_precedence:
+                break
+            self.next()
+            right = self.binary(precedence + 1)
+            if op == "&&":
+                left = int(bool(left) and bool(right))
+            elif op == "||":
+                left = int(bool(left) or bool(right))
+            elif op in ("/", "%") and right == 0:
+                self.error("division by zero in #if expression")
+            else:
+                left = function(left, right)
+        return left
+
+    def unary(self) -> int:
+        token = self.next()
+        if token.text == "(":
+            value = self.conditional()
+            if self.next().text != ")":
+                self.error("missing `)` in #if expression")
+            return value
+        if token.text == "!":
+            return int(not self.unary())
+        if token.text == "-":
+            return -self.unary()
+        if token.text == "+":
+            return self.unary()
+        if token.text == "~":
+            return ~self.unary()
+        if token.kind == "number":
+            try:
+                return _parse_integer(token.text)
+            except ValueError:
+                self.error(f"invalid integer `{token.text}` in #if expression")
+        if token.kind == "char":
+            return _parse_char(token.text)
+        if token.kind == "ident":
+            # identifiers left after macro expansion are 0
+            return 0
+        self.error(f"unexpected `{token.text}` in #if expression")
+
+
+def preprocess_file(filename: str, cpp_args: List[str] = None) -> str:
+    return Preprocessor.from_cpp_args(cpp_args).preprocess_file(filename)
+
+
+def get_include_path() -> str:
+    if os.name == "posix":
+        return sysconfig.get_path("include", "posix_user")
+    elif os.name == "nt":
+        return sysconfig.get_path("include", "nt")
+    return ""
+
+
+def with_include_path(cpp_args: Optional[List[str]]) -> List[str]:
+    cpp_args = list(cpp_args or [])
+    include_path = get_include_path()
+    if len(include_path) > 0:
+        cpp_args += ["-I", include_path]
+    return cpp_args
+
+
+def run_external_preprocessor(cpp_path: str, cpp_args: List[str], source_text: str = None) -> str:
+    """Invoke cpp_path, source_text is passed through a pipe if given"""
+    # Same as pycparser.preprocess_file(), without importing the whole parser
+    try:
+        return subprocess.check_output([cpp_path] + cpp_args, input=source_text, universal_newlines=True)
+    except OSError as e:
+        raise RuntimeError(f"Unable to invoke `{cpp_path}`. Make sure its path was passed correctly\n"
+                           f"Original error: {e}")
+
+
+def preprocess_source(filename: str, use_cpp=True, cpp_path="cpp", cpp_args=None) -> str:
+    """Run the builtin preprocessor or an external one (cpp_path), and return the preprocessed text"""
+    if not use_cpp:
+        with open(filename, "r") as f:
+            return f.read()
+    cpp_args = with_include_path(cpp_args)
+    if cpp_path == "builtin":
+        return preprocess_file(filename, cpp_args)
+    return run_external_preprocessor(cpp_path, cpp_args + [filename])
+
+
+def preprocess_source_text(source_text: str, filename: str = "<stdin>",
+                           use_cpp=True, cpp_path="cpp", cpp_args=None) -> str:
+    """Like preprocess_source(), but the source is already in memory.
+Quoted includes are searched in the directory of filename, which does not need to exist."""
+    if not use_cpp:
+        return source_text
+    cpp_args = with_include_path(cpp_args)
+    if cpp_path == "builtin":
+        return Preprocessor.from_cpp_args(cpp_args).preprocess_text(source_text, filename)
+    source_dir = os.path.dirname(os.path.abspath(filename))
+    # the linemarker keeps filename in diagnostics instead of "<stdin>"
+    marked_text = f"# 1 \"{filename}\"\n" + source_text
+    # like quoted includes of a file, search its directory first
+    return run_external_preprocessor(cpp_path, ["-I", source_dir] + cpp_args + ["-"], marked_text)
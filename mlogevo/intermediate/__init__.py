@@ -1,4 +1,4 @@
-from .ir_quadruple import Quadruple
+from .ir_quadruple import Quadruple, Opcode
 from .ir_quadruple import NOARG_INSTRUCTIONS, I1_INSTRUCTIONS
 from .ir_quadruple import I1O1_INSTRUCTIONS, I2O1_INSTRUCTIONS
 from .quadruple_from_text import TextQuadrupleParser
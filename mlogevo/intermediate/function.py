@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
 from dataclasses import dataclass
-from pycparser.c_ast import TypeDecl
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from pycparser.c_ast import TypeDecl
 
 
 # function_locals[variable_name] = variable_type (as TypeDecl/PtrDecl/Struct)
@@ -10,7 +12,7 @@ from pycparser.c_ast import TypeDecl
 @dataclass
 class Function:
     name: str
-    result_type: TypeDecl
+    result_type: "TypeDecl"
     params: list
     local_vars: dict
     instructions: list
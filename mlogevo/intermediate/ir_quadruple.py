@@ -1,6 +1,7 @@
-from dataclasses import dataclass, field
-from typing import List
+from enum import IntEnum
+from typing import Sequence
 import re
+import sys
 
 SUPPORTED_ARITHMETIC_TYPES = {
     "i32", "f64",
@@ -22,13 +23,15 @@ I1O1_INSTRUCTIONS = {
     "cvtf64_i32", "cvti32_f64",
     # __funcbegin function_name attribute
     "__funcbegin",
+    # __tailcall function_name caller: calls function_name, which returns to where caller would
+    "__tailcall",
 }
 I2O1_INSTRUCTIONS = {"eq_obj", "ne_obj", }
 O1_INSTRUCTIONS = { }
 COMPARISONS = {"eq_obj", "ne_obj", }
 NO_INPUT_INSTRUCTIONS = {
     "goto", "label", "__funcbegin", "__funcend",
-    "__call", "__return",
+    "__call", "__return", "__tailcall",
 }
 
 CORE_I1O1_ITEMS = {
@@ -106,37 +109,203 @@ def test_parameter_type(param: str) -> str:
     return "invalid"
 
 
-@dataclass
+# operand -> test_parameter_type(operand), bounded by clearing it when full
+_operand_kinds = {}
+OPERAND_KINDS_LIMIT = 65536
+
+
+def classify_operand(param: str) -> str:
+    """Memoized test_parameter_type()"""
+    kind = _operand_kinds.get(param)
+    if kind is None:
+        if type(param) is not str:
+            return test_parameter_type(param)
+        if len(_operand_kinds) >= OPERAND_KINDS_LIMIT:
+            _operand_kinds.clear()
+        kind = _operand_kinds[param] = test_parameter_type(param)
+    return kind
+
+
+class Opcode(IntEnum):
+    """Operation of an instruction, without its type suffix: set_i32 is (SET, "i32")"""
+    UNKNOWN = 0
+    NOOP = 1
+    GOTO = 2
+    LABEL = 3
+    IF = 4
+    IFNOT = 5
+    FUNCBEGIN = 6
+    FUNCEND = 7
+    CALL = 8
+    RETURN = 9
+    STRUCTBEGIN = 10
+    STRUCTEND = 11
+    ASM = 12
+    ASM_VOLATILE = 13
+    TAILCALL = 14
+    JUMPTABLE = 15
+    DECL = 20
+    SET = 21
+    MINUS = 22
+    READ = 23
+    WRITE = 24
+    NOT = 25
+    CVTF64 = 26
+    CVTI32 = 27
+    ADD = 40
+    SUB = 41
+    MUL = 42
+    DIV = 43
+    REM = 44
+    AND = 45
+    OR = 46
+    XOR = 47
+    LSH = 48
+    RSH = 49
+    LT = 60
+    GT = 61
+    LTEQ = 62
+    GTEQ = 63
+    EQ = 64
+    NE = 65
+
+
+# Instructions without type suffix
+UNTYPED_OPCODES = {
+    "noop": Opcode.NOOP,
+    "goto": Opcode.GOTO,
+    "label": Opcode.LABEL,
+    "if": Opcode.IF,
+    "ifnot": Opcode.IFNOT,
+    "__funcbegin": Opcode.FUNCBEGIN,
+    "__funcend": Opcode.FUNCEND,
+    "__call": Opcode.CALL,
+    "__return": Opcode.RETURN,
+    "__tailcall": Opcode.TAILCALL,
+    "__jumptable": Opcode.JUMPTABLE,
+    "__structbegin": Opcode.STRUCTBEGIN,
+    "__structend": Opcode.STRUCTEND,
+    "asm": Opcode.ASM,
+    "asm_volatile": Opcode.ASM_VOLATILE,
+}
+TYPE_SUFFIXES = SUPPORTED_ARITHMETIC_TYPES | {"obj", }
+COMPARISON_OPCODES = frozenset((Opcode.LT, Opcode.GT, Opcode.LTEQ, Opcode.GTEQ, Opcode.EQ, Opcode.NE))
+ASM_OPCODES = frozenset((Opcode.ASM, Opcode.ASM_VOLATILE))
+# instructions that run another function, which may read and write any variable but locals
+CALL_OPCODES = frozenset((Opcode.CALL, Opcode.TAILCALL))
+
+# instruction -> (opcode, type suffix), filled by parse_instruction()
+_instruction_info = {}
+
+
+def parse_instruction(instruction: str):
+    """Returns (opcode, type suffix) of instruction, e.g. ("add_f64") -> (Opcode.ADD, "f64")"""
+    info = _instruction_info.get(instruction)
+    if info is not None:
+        return info
+    if instruction in UNTYPED_OPCODES:
+        info = (UNTYPED_OPCODES[instruction], "")
+    else:
+        base, _, suffix = instruction.rpartition("_")
+        opcode = Opcode.__members__.get(base.upper())
+        if opcode is None or opcode in UNTYPED_OPCODES.values() or suffix not in TYPE_SUFFIXES:
+            info = (Opcode.UNKNOWN, "")
+        else:
+            info = (opcode, sys.intern(suffix))
+    _instruction_info[instruction] = info
+    return info
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+# Shared by every instruction without asm operands, assign a list before writing
+EMPTY_OPERANDS = ()
+
+
 class Quadruple:
-    """Quadruple IR, dataclass format."""
-    instruction: str
-    src1: str = ""
-    src2: str = ""
-    dest: str = ""
+    """Quadruple IR.
+The instruction string is kept for the text format, and parsed into opcode and type_suffix."""
+    __slots__ = ("_instruction", "opcode", "type_suffix", "src1", "src2", "dest", "relop",
+                 "input_vars", "output_vars", "raw_instructions")
+
+    def __init__(self, instruction: str, src1: str = "", src2: str = "", dest: str = "",
+                 relop: str = "", src1_type: str = None, src2_type: str = None,
+                 input_vars: Sequence[str] = EMPTY_OPERANDS,
+                 output_vars: Sequence[str] = EMPTY_OPERANDS,
+                 raw_instructions: Sequence[str] = EMPTY_OPERANDS):
+        # src1_type and src2_type are accepted for compatibility, they are derived from src1 and src2
+        self.instruction = instruction
+        self.src1 = _intern(src1)
+        self.src2 = _intern(src2)
+        self.dest = _intern(dest)
+
+        # For labels:
+        # instruction = "label"
+        # src1 = (label name)
 
-    # For labels:
-    # instruction = "label"
-    # src1 = (label name)
+        # For if and ifnot
+        # src1 relop src2, jump to dest
+        self.relop = relop
 
-    # For if and ifnot
-    # src1 relop src2, jump to dest
-    relop: str = ""
+        # For __jumptable
+        # jump to raw_instructions[src1], src1 is between 0 and the number of labels
 
-    # Tell if src1 or src2 is immediate integer or float
-    src1_type: str = "invalid"
-    src2_type: str = "invalid"
+        # For asm, instruction name is "asm" (w/o quotes)
+        self.input_vars = input_vars
+        self.output_vars = output_vars
+        self.raw_instructions = raw_instructions
 
-    # For asm, instruction name is "asm" (w/o quotes)
-    input_vars: List[str] = field(default_factory=list)
-    output_vars: List[str] = field(default_factory=list)
-    raw_instructions: List[str] = field(default_factory=list)
+    @property
+    def instruction(self) -> str:
+        return self._instruction
 
-    def __post_init__(self):
-        self.update_types()
+    @instruction.setter
+    def instruction(self, value: str):
+        self._instruction = _intern(value)
+        self.opcode, self.type_suffix = parse_instruction(value)
+
+    # Tell if src1 or src2 is immediate integer or float,
+    # computed when asked so they always follow src1 and src2
+    @property
+    def src1_type(self) -> str:
+        return classify_operand(self.src1)
+
+    @property
+    def src2_type(self) -> str:
+        return classify_operand(self.src2)
 
     def update_types(self):
-        self.src1_type = test_parameter_type(self.src1)
-        self.src2_type = test_parameter_type(self.src2)
+        """Kept for compatibility, src1_type and src2_type are never stale"""
+        pass
+
+    def __copy__(self):
+        result = Quadruple.__new__(Quadruple)
+        for name in Quadruple.__slots__:
+            setattr(result, name, getattr(self, name))
+        return result
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in Quadruple.__slots__)
+
+    def __setstate__(self, state):
+        for (name, value) in zip(Quadruple.__slots__, state):
+            setattr(self, name, value)
+
+    def __eq__(self, other):
+        if other.__class__ is not Quadruple:
+            return NotImplemented
+        return self.__getstate__() == other.__getstate__()
+
+    # mutable, like the dataclass it replaces
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Quadruple(instruction={self.instruction!r}, src1={self.src1!r}, src2={self.src2!r}, " \
+               f"dest={self.dest!r}, relop={self.relop!r}, src1_type={self.src1_type!r}, " \
+               f"src2_type={self.src2_type!r}, input_vars={self.input_vars!r}, " \
+               f"output_vars={self.output_vars!r}, raw_instructions={self.raw_instructions!r})"
 
     def dump(self) -> str:
         if self.instruction == "label":
@@ -153,12 +322,13 @@ class Quadruple:
             return F"{self.instruction} {self.src1} {self.src2} {self.dest}"
         if self.instruction in ("if", "ifnot"):
             return F"{self.instruction} {self.src1} {self.relop} {self.src2} goto {self.dest}"
+        if self.instruction == "__jumptable":
+            return " ".join([self.instruction, self.src1, *self.raw_instructions])
         # if self.instruction == "asm"
         opt_v = "v" if self.instruction == "asm_volatile" else ""
-        asm_begin = " ".join([f"__asm{opt_v}begin", str(len(self.input_vars)), ] + self.input_vars)
-        asm_end = " ".join([f"__asm{opt_v}end", str(len(self.output_vars)), ] + self.output_vars)
+        asm_begin = " ".join([f"__asm{opt_v}begin", str(len(self.input_vars)), *self.input_vars])
+        asm_end = " ".join([f"__asm{opt_v}end", str(len(self.output_vars)), *self.output_vars])
         result = [asm_begin, ]
         result.extend(self.raw_instructions)
         result.append(asm_end)
         return "\n".join(result)
-
@@ -30,12 +30,14 @@ class TextQuadrupleParser:
                 continue
             if inst in ("__asmbegin", "__asmvbegin") and not self.inside_asm_block:
                 self.inside_asm_block = True
-                self.current_asm = Quadruple("asm_volatile" if inst == "__asmvbegin" else "asm")
+                self.current_asm = Quadruple("asm_volatile" if inst == "__asmvbegin" else "asm",
+                                             raw_instructions=[])
                 self.current_asm.input_vars = tokens[2:]
                 continue
             if inst in ("__asmend", "__asmvend"):
                 self.inside_asm_block = False
                 self.current_asm.output_vars = tokens[2:]
+                results.append(self.current_asm)
                 continue
 
             if inst.startswith(":"):
@@ -66,7 +68,10 @@ class TextQuadrupleParser:
                     results.append(
                         Quadruple(inst, tokens[1], "", tokens[3], relop="") )
                 continue
-                
+            if inst == "__jumptable":
+                results.append(Quadruple(inst, tokens[1], raw_instructions=tokens[2:]))
+                continue
+
         return results
 
 
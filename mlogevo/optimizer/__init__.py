@@ -1,10 +1,10 @@
 """
 The __init__ of mlogevo.optimizer.
 Has 2 dictionary named machine_dependant_optimizers and machine_independant_optimizers
-Each of them looks like { optimizername: (function, target_scope) }
+Each of them looks like { optimizername: OptimizerPass(function, target_scope, rank, name, group) }
 optimizername: str, target_scope: str
 
-This module also provides append_optimizers() function
+This module also provides append_optimizers() function, and PassManager to run them
 """
 # Import mi_ and md_ first to register optimizers
 # optimizer functions are decorated by @register_optimizer
@@ -14,12 +14,24 @@ from . import mi_remove_unused_labels
 from . import mi_remove_unused_decls
 from . import mi_reorder_decls
 from . import mi_lcse
+from . import mi_sccp
+from . import mi_copy_propagation
+from . import mi_licm
+from . import mi_induction_variables
+from . import mi_dead_code_elimination
+from . import mi_simplify_cfg
+from . import mi_block_layout
 from . import mi_remove_unused_variables
+from . import mi_inline_functions
+from . import mi_loop_unrolling
+from . import mi_tail_calls
 
 from .optimizer_registry import \
     machine_dependent_optimizers, \
     machine_independent_optimizers, \
-    md_flags_per_level, mi_flags_per_level
+    md_flags_per_level, mi_flags_per_level, \
+    Changes, OptimizerPass
+from .pass_manager import PassManager, Program
 
 
 def _make_optimizers(choices: List, optimizers: Dict, options: List):
@@ -29,11 +41,10 @@ def _make_optimizers(choices: List, optimizers: Dict, options: List):
             excluded.add(option[3:])
     for option in options:
         if option in optimizers.keys():
-            if option in excluded:
+            # an optimizer of the -O level may be given again with -f
+            if option in excluded or optimizers[option] in choices:
                 continue
-            triplet = optimizers[option]
-            # name: (function, target, rank)
-            choices.append(triplet)
+            choices.append(optimizers[option])
     return choices
 
 
@@ -57,6 +68,8 @@ def append_optimizers(backend, machine_dependents, machine_independents, level=0
     _make_optimizers(md_optimizers, machine_dependent_optimizers, md_flags)
     _make_optimizers(mi_optimizers, machine_independent_optimizers, mi_flags)
 
-    # md_optimizers.sort(key=lambda triplet: triplet[2])
-    mi_optimizers.sort(key=lambda triplet: triplet[2])
-    backend.mi_optimizers = mi_optimizers
+    # md_optimizers.sort(key=lambda optimizer_pass: optimizer_pass.rank)
+    mi_optimizers.sort(key=lambda optimizer_pass: optimizer_pass.rank)
+    backend.mi_optimizers = [optimizer_pass for optimizer_pass in mi_optimizers if optimizer_pass.target != "program"]
+    backend.program_optimizers = [optimizer_pass for optimizer_pass in mi_optimizers
+                                  if optimizer_pass.target == "program"]
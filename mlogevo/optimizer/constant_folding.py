@@ -0,0 +1,150 @@
+"""
+Arithmetic of mlog processors (Mindustry's LogicOp and ConditionOp), to evaluate instructions at compile time.
+
+Numbers are Java doubles. Bitwise operators and shifts work on (long) casts, shift counts are taken
+modulo 64, and "equal" means closer than 0.000001. Results that are not exactly known
+(division by zero, NaN and infinity, which the processor turns into 0) are not folded.
+With -mstrict-32bit, the output masks every result by `op and x x 4294967295`.
+"""
+import math
+from typing import Optional
+
+from ..intermediate.ir_quadruple import Opcode, Quadruple, classify_operand
+
+MASK_32BIT = 0xFFFFFFFF
+EQUAL_EPSILON = 0.000001
+LONG_MIN = -(1 << 63)
+LONG_MAX = (1 << 63) - 1
+# integers up to this are exact in doubles, and printed without exponent
+EXACT_INTEGER_LIMIT = 1 << 53
+# builtin constants that read as numbers, branches compare conditions with false
+BUILTIN_NUMBERS = {"false": 0.0, "true": 1.0}
+
+FOLDABLE_TYPES = ("i32", "f64")
+UNARY_OPCODES = frozenset((Opcode.SET, Opcode.MINUS, Opcode.NOT, Opcode.CVTF64))
+BINARY_OPCODES = frozenset((
+    Opcode.ADD, Opcode.SUB, Opcode.MUL, Opcode.DIV, Opcode.REM,
+    Opcode.AND, Opcode.OR, Opcode.XOR, Opcode.LSH, Opcode.RSH,
+    Opcode.LT, Opcode.GT, Opcode.LTEQ, Opcode.GTEQ, Opcode.EQ, Opcode.NE,
+))
+
+
+def parse_number(operand: str) -> Optional[float]:
+    """Value of an immediate operand, as mlog reads it"""
+    if operand in BUILTIN_NUMBERS:
+        return BUILTIN_NUMBERS[operand]
+    kind = classify_operand(operand)
+    try:
+        if kind == "immediate_integer":
+            digits = operand.lstrip("+-")
+            if digits[:2] in ("0x", "0X"):
+                value = int(operand, 16)
+            else:
+                value = int(operand, 10)
+            return float(value)
+        if kind == "immediate_float":
+            value = float(operand)
+            return value if math.isfinite(value) else None
+    except ValueError:
+        pass
+    return None
+
+
+def format_number(value: float) -> Optional[str]:
+    """Immediate operand for value, None if it can not be written exactly"""
+    if not math.isfinite(value):
+        return None
+    if value == int(value) and abs(value) < EXACT_INTEGER_LIMIT:
+        return str(int(value))
+    text = repr(value)
+    return None if "e" in text else text
+
+
+def java_long(value: float) -> int:
+    """(long) value in Java: truncated and saturated"""
+    if math.isnan(value):
+        return 0
+    if math.isinf(value):
+        return LONG_MAX if value > 0 else LONG_MIN
+    return max(LONG_MIN, min(LONG_MAX, int(value)))
+
+
+def wrap_long(value: int) -> int:
+    value &= (1 << 64) - 1
+    return value - (1 << 64) if value > LONG_MAX else value
+
+
+def mask_32bit(value: float) -> float:
+    return float(java_long(value) & MASK_32BIT)
+
+
+def compare(relation: str, a: float, b: float) -> bool:
+    """relation: lt, gt, lteq, gteq, eq, ne"""
+    if relation == "lt":
+        return a < b
+    if relation == "gt":
+        return a > b
+    if relation == "lteq":
+        return a <= b
+    if relation == "gteq":
+        return a >= b
+    if relation == "eq":
+        return abs(a - b) < EQUAL_EPSILON
+    if relation == "ne":
+        return abs(a - b) >= EQUAL_EPSILON
+    raise ValueError(f"unknown relation {relation}")
+
+
+_RELATIONS = {
+    Opcode.LT: "lt", Opcode.GT: "gt", Opcode.LTEQ: "lteq",
+    Opcode.GTEQ: "gteq", Opcode.EQ: "eq", Opcode.NE: "ne",
+}
+
+
+def evaluate(opcode: Opcode, type_suffix: str, a: float, b: Optional[float] = None) -> Optional[float]:
+    """Result of the mlog instructions for opcode (see output.mlog_instructions), before masking"""
+    if opcode is Opcode.SET:
+        return a
+    if opcode is Opcode.MINUS:
+        result = 0.0 - a
+    elif opcode is Opcode.NOT:
+        # op xor x a 0xFFFFFFFF
+        result = float(wrap_long(java_long(a) ^ MASK_32BIT))
+    elif opcode is Opcode.CVTF64:
+        # op floor
+        result = float(math.floor(a))
+    elif opcode is Opcode.ADD:
+        result = a + b
+    elif opcode is Opcode.SUB:
+        result = a - b
+    elif opcode is Opcode.MUL:
+        result = a * b
+    elif opcode is Opcode.DIV:
+        if b == 0:
+            return None
+        # op idiv for i32, op div for f64
+        result = float(math.floor(a / b)) if type_suffix == "i32" else a / b
+    elif opcode is Opcode.REM:
+        if b == 0:
+            return None
+        # op mod: Java's %, the sign of a
+        result = math.fmod(a, b)
+    elif opcode is Opcode.AND:
+        result = float(java_long(a) & java_long(b))
+    elif opcode is Opcode.OR:
+        result = float(java_long(a) | java_long(b))
+    elif opcode is Opcode.XOR:
+        result = float(java_long(a) ^ java_long(b))
+    elif opcode is Opcode.LSH:
+        result = float(wrap_long(java_long(a) << (java_long(b) & 63)))
+    elif opcode is Opcode.RSH:
+        result = float(java_long(a) >> (java_long(b) & 63))
+    elif opcode in _RELATIONS:
+        result = 1.0 if compare(_RELATIONS[opcode], a, b) else 0.0
+    else:
+        return None
+    return result if math.isfinite(result) else None
+
+
+def is_foldable(ir: Quadruple) -> bool:
+    return ir.type_suffix in FOLDABLE_TYPES and (ir.opcode in UNARY_OPCODES or ir.opcode in BINARY_OPCODES)
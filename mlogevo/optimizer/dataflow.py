@@ -0,0 +1,469 @@
+"""
+Bit-vector dataflow analyses on a ControlFlowGraph.
+
+Variables, definitions and expressions are numbered densely, and sets of them are
+Python ints (bit i: item i), so meet and transfer functions are a few big-int
+operations per block whatever the number of variables.
+
+Calls and returns follow the calling convention of the frontend:
+- variables of the function ("_x@f", "___vtmp_1@f") are its own, every other variable
+  (globals, parameters and results of other functions, "result@f", "retaddr@f", builtins)
+  is observable by other functions;
+- __call may read and write every observable variable;
+- observable variables are live when the function leaves (return, or a jump out), and in
+  loops that never leave: main usually ends with one, and variables are inspected while it spins.
+
+Analyses are cached in graph.analyses, use get_liveness() and the like.
+"""
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from ..backend.control_flow_graph import ControlFlowGraph
+from ..intermediate.ir_quadruple import CALL_OPCODES, Opcode, Quadruple, classify_operand
+
+NO_VARIABLES = ()
+# no operands that are variables
+_NO_OPERANDS = frozenset((
+    Opcode.NOOP, Opcode.GOTO, Opcode.LABEL, Opcode.DECL, Opcode.FUNCBEGIN, Opcode.FUNCEND,
+    Opcode.CALL, Opcode.TAILCALL, Opcode.RETURN, Opcode.STRUCTBEGIN, Opcode.STRUCTEND, Opcode.UNKNOWN,
+))
+
+
+def is_local(name: str, function_name: str) -> bool:
+    """Only function_name reads and writes the variable"""
+    return name.endswith("@" + function_name) and not name.startswith(("result@", "retaddr@"))
+
+
+def used_variables(ir: Quadruple) -> Sequence[str]:
+    """Variables read by ir, calls excluded"""
+    opcode = ir.opcode
+    if opcode in _NO_OPERANDS:
+        return NO_VARIABLES
+    if opcode is Opcode.ASM or opcode is Opcode.ASM_VOLATILE:
+        return ir.input_vars
+    result = []
+    if classify_operand(ir.src1) == "variable":
+        result.append(ir.src1)
+    if classify_operand(ir.src2) == "variable":
+        result.append(ir.src2)
+    return result
+
+
+def defined_variables(ir: Quadruple) -> Sequence[str]:
+    """Variables written by ir, calls excluded"""
+    opcode = ir.opcode
+    if opcode in _NO_OPERANDS or opcode is Opcode.IF or opcode is Opcode.IFNOT:
+        return NO_VARIABLES
+    if opcode is Opcode.ASM or opcode is Opcode.ASM_VOLATILE:
+        return ir.output_vars
+    return (ir.dest, ) if ir.dest else NO_VARIABLES
+
+
+class Numbering:
+    """Dense numbering of hashable items, for bit-vector sets"""
+    def __init__(self, items: Iterable = ()):
+        self.index: Dict[object, int] = {}
+        self.items: List = []
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item) -> int:
+        index = self.index.get(item)
+        if index is None:
+            index = self.index[item] = len(self.items)
+            self.items.append(item)
+        return index
+
+    def bit(self, item) -> int:
+        """0 for unknown items"""
+        index = self.index.get(item)
+        return 0 if index is None else 1 << index
+
+    def bits(self, items: Iterable) -> int:
+        result = 0
+        for item in items:
+            index = self.index.get(item)
+            if index is not None:
+                result |= 1 << index
+        return result
+
+    def decode(self, bits: int) -> List:
+        result = []
+        while bits:
+            low = bits & -bits
+            result.append(self.items[low.bit_length() - 1])
+            bits ^= low
+        return result
+
+    def universe(self) -> int:
+        return (1 << len(self.items)) - 1
+
+
+def solve(graph: ControlFlowGraph, gen: Dict[int, int], kill: Dict[int, int], forward: bool, union: bool,
+          boundary: int, universe: int, boundary_blocks: Iterable[int] = None) -> Tuple[Dict[int, int], Dict[int, int]]:
+    """Worklist solver of out = gen | (in & ~kill) (forward), in = gen | (out & ~kill) (backward).
+union: meet is union (may problems) or intersection (must problems).
+boundary: met at boundary_blocks, by default the entry (forward) or blocks without successors (backward).
+Returns (block_in, block_out)."""
+    initial = 0 if union else universe
+    block_in = {block_id: initial for block_id in graph.order}
+    block_out = dict(block_in)
+    reachable = graph.reverse_postorder()
+    reachable_set = set(reachable)
+    others = [block_id for block_id in graph.order if block_id not in reachable_set]
+    if forward:
+        order = reachable + others
+        sources, before, after = graph.predecessors, block_in, block_out
+    else:
+        order = reachable[::-1] + others[::-1]
+        sources, before, after = graph.successors, block_out, block_in
+    if boundary_blocks is None:
+        boundary_blocks = [graph.entry] if forward else graph.exits
+    boundary_blocks = set(boundary_blocks)
+    dependents = graph.successors if forward else graph.predecessors
+
+    worklist = deque(order)
+    pending = set(order)
+    while worklist:
+        block_id = worklist.popleft()
+        pending.discard(block_id)
+        value = initial
+        if union:
+            for source in sources[block_id]:
+                value |= after[source]
+            if block_id in boundary_blocks:
+                value |= boundary
+        else:
+            for source in sources[block_id]:
+                value &= after[source]
+            if block_id in boundary_blocks:
+                value &= boundary
+        before[block_id] = value
+        result = gen[block_id] | (value & ~kill[block_id])
+        if result != after[block_id]:
+            after[block_id] = result
+            for dependent in dependents[block_id]:
+                if dependent not in pending:
+                    pending.add(dependent)
+                    worklist.append(dependent)
+    return block_in, block_out
+
+
+def leaving_blocks(graph: ControlFlowGraph) -> List[int]:
+    """Blocks that leave the function, and blocks of loops that never reach one of those"""
+    reaches_exit = set(graph.exits)
+    stack = list(graph.exits)
+    while stack:
+        for predecessor in graph.predecessors[stack.pop()]:
+            if predecessor not in reaches_exit:
+                reaches_exit.add(predecessor)
+                stack.append(predecessor)
+    return [block_id for block_id in graph.order if not graph.successors[block_id] or block_id not in reaches_exit]
+
+
+def number_variables(graph: ControlFlowGraph) -> Numbering:
+    variables = Numbering()
+    for block_id in graph.order:
+        for ir in graph.blocks[block_id].instructions:
+            for name in used_variables(ir):
+                variables.add(name)
+            for name in defined_variables(ir):
+                variables.add(name)
+    return variables
+
+
+def observable_bits(variables: Numbering, function_name: str) -> int:
+    return variables.bits(name for name in variables.items if not is_local(name, function_name))
+
+
+class Liveness:
+    """Variables that may be read before written, at entries and exits of blocks"""
+    def __init__(self, graph: ControlFlowGraph, function_name: str):
+        self.graph = graph
+        self.variables = number_variables(graph)
+        # read by calls, live when leaving the function
+        self.observable = observable_bits(self.variables, function_name)
+        use: Dict[int, int] = {}
+        definition: Dict[int, int] = {}
+        for block_id in graph.order:
+            block_use = block_def = 0
+            for ir in reversed(graph.blocks[block_id].instructions):
+                block_use, block_def = self.step(ir, block_use, block_def)
+            use[block_id] = block_use
+            definition[block_id] = block_def
+        self.live_in, self.live_out = solve(graph, use, definition, forward=False, union=True,
+                                            boundary=self.observable, universe=self.variables.universe(),
+                                            boundary_blocks=leaving_blocks(graph))
+
+    def step(self, ir: Quadruple, live: int, defined: int = 0) -> Tuple[int, int]:
+        """Backward transfer through one instruction: (live before ir, defined by ir or later)"""
+        if ir.opcode in CALL_OPCODES:
+            return live | self.observable, defined
+        written = self.variables.bits(defined_variables(ir))
+        live = (live & ~written) | self.variables.bits(used_variables(ir))
+        return live, defined | written
+
+    def live_after(self, block_id: int) -> List[int]:
+        """Live variables after each instruction of a block"""
+        instructions = self.graph.blocks[block_id].instructions
+        result = [0] * len(instructions)
+        live = self.live_out[block_id]
+        for i in range(len(instructions) - 1, -1, -1):
+            result[i] = live
+            live, _ = self.step(instructions[i], live)
+        return result
+
+    def is_live_out(self, block_id: int, name: str) -> bool:
+        return bool(self.live_out[block_id] & self.variables.bit(name))
+
+
+class Definition(NamedTuple):
+    """Instruction index in a block that writes a variable, block -1 is the function entry"""
+    block_id: int
+    index: int
+    variable: str
+
+
+class ReachingDefinitions:
+    """Definitions that may reach entries and exits of blocks.
+Every variable has a definition at the entry, Definition(-1, -1, name): its value before the function.
+A call defines every observable variable."""
+    def __init__(self, graph: ControlFlowGraph, function_name: str):
+        self.graph = graph
+        variables = number_variables(graph)
+        observable = [name for name in variables.items if not is_local(name, function_name)]
+        self.definitions = Numbering(Definition(-1, -1, name) for name in variables.items)
+        # (block id, instruction index) -> bits of definitions
+        self.instruction_definitions: Dict[Tuple[int, int], int] = {}
+        for block_id in graph.order:
+            for (i, ir) in enumerate(graph.blocks[block_id].instructions):
+                names = observable if ir.opcode in CALL_OPCODES else defined_variables(ir)
+                bits = 0
+                for name in names:
+                    bits |= 1 << self.definitions.add(Definition(block_id, i, name))
+                if bits:
+                    self.instruction_definitions[block_id, i] = bits
+        # variable -> bits of its definitions
+        self.definitions_of: Dict[str, int] = {}
+        for (i, definition) in enumerate(self.definitions.items):
+            self.definitions_of[definition.variable] = self.definitions_of.get(definition.variable, 0) | (1 << i)
+
+        gen: Dict[int, int] = {}
+        kill: Dict[int, int] = {}
+        for block_id in graph.order:
+            block_gen = block_kill = 0
+            for i in range(len(graph.blocks[block_id].instructions)):
+                bits = self.instruction_definitions.get((block_id, i))
+                if bits is None:
+                    continue
+                killed = self.killed_by(bits)
+                block_gen = (block_gen & ~killed) | bits
+                block_kill |= killed
+            gen[block_id] = block_gen
+            kill[block_id] = block_kill & ~block_gen
+        entry_definitions = (1 << len(variables)) - 1
+        self.reach_in, self.reach_out = solve(graph, gen, kill, forward=True, union=True,
+                                              boundary=entry_definitions, universe=self.definitions.universe())
+
+    def killed_by(self, bits: int) -> int:
+        """Definitions of the variables defined by bits"""
+        killed = 0
+        for definition in self.definitions.decode(bits):
+            killed |= self.definitions_of[definition.variable]
+        return killed
+
+    def reaching_before(self, block_id: int) -> List[int]:
+        """Definitions reaching each instruction of a block"""
+        result = []
+        reaching = self.reach_in[block_id]
+        for i in range(len(self.graph.blocks[block_id].instructions)):
+            result.append(reaching)
+            bits = self.instruction_definitions.get((block_id, i))
+            if bits is not None:
+                reaching = (reaching & ~self.killed_by(bits)) | bits
+        return result
+
+    def definitions_of_variable(self, name: str, reaching: int) -> List[Definition]:
+        """Definitions of a variable among reaching ones, empty if the variable is not in the function"""
+        return self.definitions.decode(reaching & self.definitions_of.get(name, 0))
+
+
+# Expressions worth keeping: no copies, declarations or asm
+_EXPRESSION_OPCODES = frozenset((
+    Opcode.MINUS, Opcode.NOT, Opcode.CVTF64, Opcode.CVTI32,
+    Opcode.ADD, Opcode.SUB, Opcode.MUL, Opcode.DIV, Opcode.REM,
+    Opcode.AND, Opcode.OR, Opcode.XOR, Opcode.LSH, Opcode.RSH,
+    Opcode.LT, Opcode.GT, Opcode.LTEQ, Opcode.GTEQ, Opcode.EQ, Opcode.NE,
+))
+
+
+def expression_of(ir: Quadruple) -> Optional[Tuple[str, str, str]]:
+    """(instruction, src1, src2) computed by ir, if it is an expression"""
+    if ir.opcode not in _EXPRESSION_OPCODES:
+        return None
+    return ir.instruction, ir.src1, ir.src2
+
+
+class AvailableExpressions:
+    """Expressions computed on every path to entries and exits of blocks, operands unchanged since"""
+    def __init__(self, graph: ControlFlowGraph, function_name: str):
+        self.graph = graph
+        self.expressions = Numbering()
+        # variable -> bits of expressions using it
+        self.expressions_using: Dict[str, int] = {}
+        for block_id in graph.order:
+            for ir in graph.blocks[block_id].instructions:
+                expression = expression_of(ir)
+                if expression is None or expression in self.expressions.index:
+                    continue
+                bit = 1 << self.expressions.add(expression)
+                for name in used_variables(ir):
+                    self.expressions_using[name] = self.expressions_using.get(name, 0) | bit
+        self.observable_operands = 0
+        for (name, bits) in self.expressions_using.items():
+            if not is_local(name, function_name):
+                self.observable_operands |= bits
+
+        gen: Dict[int, int] = {}
+        kill: Dict[int, int] = {}
+        for block_id in graph.order:
+            block_gen = block_kill = 0
+            for ir in graph.blocks[block_id].instructions:
+                block_gen, killed = self.step(ir, block_gen)
+                block_kill |= killed
+            gen[block_id] = block_gen
+            kill[block_id] = block_kill & ~block_gen
+        self.available_in, self.available_out = solve(graph, gen, kill, forward=True, union=False,
+                                                      boundary=0, universe=self.expressions.universe())
+
+    def step(self, ir: Quadruple, available: int) -> Tuple[int, int]:
+        """Forward transfer through one instruction: (available after ir, killed by ir)"""
+        if ir.opcode in CALL_OPCODES:
+            return available & ~self.observable_operands, self.observable_operands
+        killed = 0
+        for name in defined_variables(ir):
+            killed |= self.expressions_using.get(name, 0)
+        computed = self.expressions.bit(expression_of(ir))
+        # "add_i32 x 1 x" computes x + 1, then x changes
+        return (available | computed) & ~killed, killed
+
+    def available_before(self, block_id: int) -> List[int]:
+        """Expressions available before each instruction of a block"""
+        result = []
+        available = self.available_in[block_id]
+        for ir in self.graph.blocks[block_id].instructions:
+            result.append(available)
+            available, _ = self.step(ir, available)
+        return result
+
+
+class Copy(NamedTuple):
+    """set_t source dest: dest holds the value of source"""
+    dest: str
+    source: str
+
+
+def copy_of(ir: Quadruple) -> Optional[Copy]:
+    """The copy made by ir, if it sets a variable to another one"""
+    if ir.opcode is not Opcode.SET or ir.src1 == ir.dest or classify_operand(ir.src1) != "variable":
+        return None
+    # builtins change by themselves: "set x @time"
+    if ir.src1.startswith("@") or ir.dest.startswith("@"):
+        return None
+    return Copy(ir.dest, ir.src1)
+
+
+class AvailableCopies:
+    """Copies made on every path to entries and exits of blocks, neither variable written since"""
+    def __init__(self, graph: ControlFlowGraph, function_name: str):
+        self.graph = graph
+        self.copies = Numbering()
+        # variable -> bits of copies reading or writing it
+        self.copies_involving: Dict[str, int] = {}
+        # variable -> bits of copies writing it
+        self.copies_to: Dict[str, int] = {}
+        for block_id in graph.order:
+            for ir in graph.blocks[block_id].instructions:
+                copy = copy_of(ir)
+                if copy is None or copy in self.copies.index:
+                    continue
+                bit = 1 << self.copies.add(copy)
+                self.copies_to[copy.dest] = self.copies_to.get(copy.dest, 0) | bit
+                for name in copy:
+                    self.copies_involving[name] = self.copies_involving.get(name, 0) | bit
+        self.observable_copies = 0
+        for (name, bits) in self.copies_involving.items():
+            if not is_local(name, function_name):
+                self.observable_copies |= bits
+
+        gen: Dict[int, int] = {}
+        kill: Dict[int, int] = {}
+        for block_id in graph.order:
+            block_gen = block_kill = 0
+            for ir in graph.blocks[block_id].instructions:
+                block_gen, killed = self.step(ir, block_gen)
+                block_kill |= killed
+            gen[block_id] = block_gen
+            kill[block_id] = block_kill & ~block_gen
+        self.available_in, self.available_out = solve(graph, gen, kill, forward=True, union=False,
+                                                      boundary=0, universe=self.copies.universe())
+
+    def step(self, ir: Quadruple, available: int) -> Tuple[int, int]:
+        """Forward transfer through one instruction: (available after ir, killed by ir)"""
+        if ir.opcode in CALL_OPCODES:
+            return available & ~self.observable_copies, self.observable_copies
+        killed = 0
+        for name in defined_variables(ir):
+            killed |= self.copies_involving.get(name, 0)
+        return (available & ~killed) | self.copies.bit(copy_of(ir)), killed
+
+    def available_before(self, block_id: int) -> List[int]:
+        """Copies available before each instruction of a block"""
+        result = []
+        available = self.available_in[block_id]
+        for ir in self.graph.blocks[block_id].instructions:
+            result.append(available)
+            available, _ = self.step(ir, available)
+        return result
+
+    def source_of(self, name: str, available: int) -> Optional[str]:
+        """The variable name is a copy of, among available copies, following chains of them"""
+        source = None
+        seen = {name}
+        while True:
+            bits = available & self.copies_to.get(name, 0)
+            if not bits:
+                return source
+            # writing dest kills its other copies, so there is only one
+            name = self.copies.items[bits.bit_length() - 1].source
+            if name in seen:
+                return source
+            seen.add(name)
+            source = name
+
+
+def _cached(graph: ControlFlowGraph, analysis, function_name: str):
+    key = f"{analysis.__name__}@{function_name}"
+    result = graph.analyses.get(key)
+    if result is None:
+        result = graph.analyses[key] = analysis(graph, function_name)
+    return result
+
+
+def get_liveness(graph: ControlFlowGraph, function_name: str) -> Liveness:
+    return _cached(graph, Liveness, function_name)
+
+
+def get_reaching_definitions(graph: ControlFlowGraph, function_name: str) -> ReachingDefinitions:
+    return _cached(graph, ReachingDefinitions, function_name)
+
+
+def get_available_expressions(graph: ControlFlowGraph, function_name: str) -> AvailableExpressions:
+    return _cached(graph, AvailableExpressions, function_name)
+
+
+def get_available_copies(graph: ControlFlowGraph, function_name: str) -> AvailableCopies:
+    return _cached(graph, AvailableCopies, function_name)
@@ -0,0 +1,283 @@
+import json
+from typing import Dict, List, Optional, Tuple
+
+from ..backend.basic_block import BasicBlock
+from ..backend.control_flow_graph import ControlFlowGraph
+from ..intermediate.ir_quadruple import Opcode, Quadruple
+from .mi_simplify_cfg import NO_CODE_OPCODES, invert, is_invertible, simplify_control_flow
+from .optimizer_registry import Changes, register_optimizer
+
+# -fprofile-generate counts the runs of the block at position N of function f in the global __profile_f_N
+PROFILE_PREFIX = "__profile_"
+# Without a profile, a loop runs its body this many times for each time it is entered
+LOOP_WEIGHT = 10
+
+# (source block, destination block) -> how often control goes that way
+EdgeWeights = Dict[Tuple[int, int], float]
+
+
+def profile_counter(function_name: str, position: int) -> str:
+    return f"{PROFILE_PREFIX}{function_name}_{position}"
+
+
+def read_profile(filename: str) -> Dict[str, Dict[int, int]]:
+    """Block counts by function, from the JSON report of mlog_arithmetic_runner
+(counters are in its "variables"), or from a JSON object of counters"""
+    with open(filename) as f:
+        report = json.load(f)
+    profile: Dict[str, Dict[int, int]] = {}
+    for (name, value) in report.get("variables", report).items():
+        if not name.startswith(PROFILE_PREFIX) or not isinstance(value, (int, float)):
+            continue
+        function_name, _, position = name[len(PROFILE_PREFIX):].rpartition("_")
+        if function_name and position.isdigit():
+            profile.setdefault(function_name, {})[int(position)] = int(value)
+    return profile
+
+
+def is_idle_loop(block: BasicBlock) -> bool:
+    """:L goto L, where programs wait (and mlog_arithmetic_runner stops)"""
+    code = [ir for ir in block.instructions if ir.opcode not in NO_CODE_OPCODES]
+    return len(code) == 1 and code[0].opcode is Opcode.GOTO and block.jump_destination == block.id
+
+
+# Machine-independent
+# Input: control flow graph
+# Adds one to a counter at the start of every reachable block, see read_profile().
+# Runs right before reorder-blocks, which reads the counters back with -fprofile-use=file
+# when the program is compiled again with the same options.
+@register_optimizer(
+    name="profile-generate",
+    target="basic_block_graph",
+    is_machine_dependent=False,
+    rank=29,
+    optimize_level=4
+)
+def instrument_blocks(
+        graph: ControlFlowGraph,
+        current_function_name: str,
+        functions: Dict,
+        known_variable_types: Dict[str, str],
+) -> Changes:
+    reachable = graph.reachable()
+    for (position, block_id) in enumerate(graph.order):
+        block = graph.blocks[block_id]
+        if block_id not in reachable or is_idle_loop(block):
+            continue
+        instructions = block.instructions
+        i = 0
+        while i < len(instructions) and instructions[i].opcode in (Opcode.FUNCBEGIN, Opcode.LABEL, Opcode.DECL):
+            i += 1
+        counter = profile_counter(current_function_name, position)
+        instructions.insert(i, Quadruple("add_i32", counter, "1", counter))
+    return Changes.INSTRUCTIONS if reachable else Changes.NONE
+
+
+def fall_through(graph: ControlFlowGraph, position: int) -> Optional[int]:
+    """Block reached by falling out of the block at position, None if it never falls through"""
+    block = graph.blocks[graph.order[position]]
+    if not block.will_continue or position + 1 >= len(graph.order):
+        return None
+    return graph.order[position + 1]
+
+
+def static_weights(graph: ControlFlowGraph) -> EdgeWeights:
+    """Blocks run LOOP_WEIGHT times more often for every loop they are in,
+and a branch stays in the loop LOOP_WEIGHT - 1 times out of LOOP_WEIGHT"""
+    depths = graph.loop_depths()
+    loops = list(graph.natural_loops().values())
+    weights: EdgeWeights = {}
+    for block_id in graph.reachable():
+        frequency = float(LOOP_WEIGHT ** depths[block_id])
+        successors = graph.successors[block_id]
+        leaving = [any(block_id in body and successor not in body for body in loops) for successor in successors]
+        for (successor, leaves) in zip(successors, leaving):
+            if len(successors) == 1 or all(leaving) or not any(leaving):
+                probability = 1 / len(successors)
+            else:
+                probability = 1 / LOOP_WEIGHT if leaves else 1 - 1 / LOOP_WEIGHT
+            weights[(block_id, successor)] = frequency * probability
+    return weights
+
+
+def profile_weights(graph: ControlFlowGraph, counts: Dict[int, int]) -> EdgeWeights:
+    """Edge counts from block counts: exact when one of the two successors of a branch
+is only reached from it, otherwise at most the count of either end.
+Each entry of a jump table gets the count of its destination if only reached from the table."""
+    weights: EdgeWeights = {}
+    for block_id in graph.reachable():
+        count = counts[block_id]
+        successors = graph.successors[block_id]
+        if len(successors) == 1:
+            weights[(block_id, successors[0])] = count
+            continue
+        if len(successors) > 2:
+            for successor in successors:
+                if graph.predecessors[successor] == [block_id]:
+                    weights[(block_id, successor)] = counts[successor]
+                else:
+                    weights[(block_id, successor)] = min(count, counts[successor])
+            continue
+        for (successor, other) in (successors, successors[::-1]) if successors else ():
+            if graph.predecessors[other] == [block_id]:
+                weights[(block_id, successor)] = max(count - counts[other], 0)
+            elif graph.predecessors[successor] == [block_id]:
+                weights[(block_id, successor)] = counts[successor]
+            else:
+                weights[(block_id, successor)] = min(count, counts[successor])
+    return weights
+
+
+class BlockLayout:
+    """New order of the blocks of a function, and the jumps it needs.
+The entry stays first and the block of __funcend last; if that block is nothing but
+__funcend, falling into it is the same as __return, which can be anywhere."""
+    def __init__(self, graph: ControlFlowGraph, function_name: str):
+        self.graph = graph
+        self.function_name = function_name
+        self.position = {block_id: i for (i, block_id) in enumerate(graph.order)}
+        self.fall_through = {block_id: fall_through(graph, i) for (i, block_id) in enumerate(graph.order)}
+        self.last = graph.order[-1]
+        code = [ir for ir in graph.blocks[self.last].instructions if ir.opcode not in NO_CODE_OPCODES]
+        self.return_only = len(code) == 1 and code[0].opcode is Opcode.FUNCEND
+        counts = graph.block_counts
+        if counts:
+            self.weights = profile_weights(graph, {block_id: counts.get(i, 0)
+                                                   for (block_id, i) in self.position.items()})
+        else:
+            self.weights = static_weights(graph)
+
+    def can_fall_into(self, source: int, destination: int) -> bool:
+        """source can be placed right before destination"""
+        if destination == self.graph.entry:
+            return False
+        if self.fall_through[source] == destination:
+            return True
+        instructions = self.graph.blocks[source].instructions
+        if instructions and instructions[-1].opcode is Opcode.JUMPTABLE:
+            # jumps wherever its destination is
+            return False
+        # if c goto destination -> ifnot c goto <fall through>
+        return not instructions or instructions[-1].opcode not in (Opcode.IF, Opcode.IFNOT) \
+            or is_invertible(instructions[-1])
+
+    def chains(self) -> List[List[int]]:
+        """Chains of blocks joined by the edges that save the most jumps when they fall through"""
+        graph = self.graph
+        reachable = graph.reachable()
+        chain_of: Dict[int, List[int]] = {block_id: [block_id] for block_id in graph.order
+                                          if block_id in reachable and not (block_id == self.last and self.return_only)}
+        weights = self.weights
+        # a branch costs the same whether it jumps or not: placing either successor after it saves
+        # the goto to the less frequent one, an unconditional edge saves its goto
+        saved = {}
+        for block_id in reachable:
+            successors = graph.successors[block_id]
+            for successor in successors:
+                saved[(block_id, successor)] = min(weights[(block_id, other)] for other in successors)
+        edges = sorted(weights, key=lambda edge: (-saved[edge], -weights[edge],
+                                                  self.fall_through[edge[0]] != edge[1], self.position[edge[0]]))
+        for (source, destination) in edges:
+            if source not in chain_of or destination not in chain_of:
+                continue
+            head, tail = chain_of[source], chain_of[destination]
+            if head is tail or head[-1] != source or tail[0] != destination:
+                continue
+            # the entry stays first, the last block last
+            if graph.entry in head and self.last in tail or not self.can_fall_into(source, destination):
+                continue
+            head.extend(tail)
+            for block_id in tail:
+                chain_of[block_id] = head
+        result = []
+        seen = set()
+        for block_id in graph.order:
+            chain = chain_of.get(block_id)
+            if chain is not None and id(chain) not in seen:
+                seen.add(id(chain))
+                result.append(chain)
+        # in the order of their earliest block, so the entry chain comes first
+        if self.last in chain_of:
+            last_chain = chain_of[self.last]
+            result.remove(last_chain)
+            result.append(last_chain)
+        return result
+
+    def order(self) -> List[int]:
+        result = [block_id for chain in self.chains() for block_id in chain]
+        placed = set(result)
+        result.extend(block_id for block_id in self.graph.order if block_id not in placed and block_id != self.last)
+        if self.last not in placed:
+            result.append(self.last)
+        return result
+
+    def label_of(self, block_id: int) -> str:
+        instructions = self.graph.blocks[block_id].instructions
+        for ir in instructions:
+            if ir.opcode is Opcode.LABEL:
+                return ir.src1
+        # labels are global in the output
+        label = f"__MLOGEV_LAYOUT_{self.function_name}_{self.position[block_id]}__"
+        instructions.insert(0, Quadruple("label", label))
+        return label
+
+    def apply(self, order: List[int]):
+        """Reorders the blocks, with jumps for blocks that no longer fall through where they did"""
+        graph = self.graph
+        for (i, block_id) in enumerate(order):
+            block = graph.blocks[block_id]
+            instructions = block.instructions
+            following = order[i + 1] if i + 1 < len(order) else None
+            last_ir = instructions[-1] if instructions else None
+            destination = self.fall_through[block_id]
+            if destination is None or destination == following:
+                if last_ir is not None and following is not None and (
+                        last_ir.opcode is Opcode.GOTO and block.jump_destination == following
+                        or last_ir.opcode is Opcode.RETURN and following == self.last and self.return_only):
+                    instructions.pop()
+                continue
+            if last_ir is not None and last_ir.opcode in (Opcode.IF, Opcode.IFNOT) and is_invertible(last_ir):
+                target = block.jump_destination
+                if target == following:
+                    instructions[-1] = invert(last_ir, self.label_of(destination))
+                    continue
+                # neither follows: the more frequent one is where the branch jumps, the other one takes a goto
+                if self.weights.get((block_id, destination), 0) > self.weights.get((block_id, target), 0):
+                    instructions[-1] = invert(last_ir, self.label_of(destination))
+                    destination = target
+            if destination == self.last and self.return_only:
+                instructions.append(Quadruple("__return", self.function_name))
+            else:
+                instructions.append(Quadruple("goto", self.label_of(destination)))
+        graph.order = order
+
+
+# Machine-independent
+# Input: control flow graph
+# Block placement (Pettis & Hansen): chains blocks along their most frequent edges so that
+# these fall through, and adds the jumps other edges then need. Edge frequencies come from
+# loop nesting, or from block counts with -fprofile-use=file (see profile-generate).
+# Jumps are then cleaned up as in simplify-cfg.
+@register_optimizer(
+    name="reorder-blocks",
+    target="basic_block_graph",
+    is_machine_dependent=False,
+    rank=30,
+    optimize_level=2
+)
+def reorder_blocks(
+        graph: ControlFlowGraph,
+        current_function_name: str,
+        functions: Dict,
+        known_variable_types: Dict[str, str],
+) -> Changes:
+    if len(graph.order) < 3:
+        return Changes.NONE
+    layout = BlockLayout(graph, current_function_name)
+    order = layout.order()
+    if order == graph.order:
+        return Changes.NONE
+    layout.apply(order)
+    # blocks emptied by removed jumps, jumps to them
+    simplify_control_flow(graph, current_function_name, functions, known_variable_types)
+    return Changes.ALL
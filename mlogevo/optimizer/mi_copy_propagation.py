@@ -0,0 +1,203 @@
+from typing import Dict, List, Set
+
+from ..backend.control_flow_graph import ControlFlowGraph
+from ..intermediate.ir_quadruple import CALL_OPCODES, Opcode, Quadruple, classify_operand
+from .dataflow import copy_of, defined_variables, get_available_copies, get_liveness, is_local, used_variables
+from .optimizer_registry import Changes, register_optimizer
+
+# With -mstrict-32bit, set masks what it copies (see constant_folding), copies are not copies
+NOT_COPYING = "strict-32bit"
+
+
+def is_self_copy(ir: Quadruple) -> bool:
+    return ir.opcode is Opcode.SET and ir.src1 == ir.dest
+
+
+def rename_operands(ir: Quadruple, renamed: Dict[str, str], include_dest: bool) -> Quadruple:
+    """ir with variables renamed, ir itself if none is; asm is never renamed, its operands are in its text"""
+    if ir.opcode in (Opcode.ASM, Opcode.ASM_VOLATILE, Opcode.DECL):
+        return ir
+    src1, src2 = ir.src1, ir.src2
+    if classify_operand(src1) == "variable":
+        src1 = renamed.get(src1, src1)
+    if classify_operand(src2) == "variable":
+        src2 = renamed.get(src2, src2)
+    dest = renamed.get(ir.dest, ir.dest) if include_dest and ir.opcode not in (Opcode.GOTO, Opcode.IF, Opcode.IFNOT) \
+        else ir.dest
+    if (src1, src2, dest) == (ir.src1, ir.src2, ir.dest):
+        return ir
+    return Quadruple(ir.instruction, src1, src2, dest, ir.relop, raw_instructions=ir.raw_instructions)
+
+
+# Machine-independent
+# Input: control flow graph
+# Global copy propagation: after "set_t y x", reads of x become reads of y
+# wherever the copy is made on every path and neither variable has changed since.
+# The copies themselves are left to dead-code-elimination.
+@register_optimizer(
+    name="copy-propagation",
+    target="basic_block_graph",
+    is_machine_dependent=False,
+    rank=13,
+    optimize_level=1,
+    group="simplify"
+)
+def propagate_copies(
+        graph: ControlFlowGraph,
+        current_function_name: str,
+        functions: Dict,
+        known_variable_types: Dict[str, str],
+) -> Changes:
+    if NOT_COPYING in graph.machine_dependents:
+        return Changes.NONE
+    copies = get_available_copies(graph, current_function_name)
+    if len(copies.copies) == 0:
+        return Changes.NONE
+    changes = Changes.NONE
+    for block_id in graph.reverse_postorder():
+        block = graph.blocks[block_id]
+        instructions = []
+        for (ir, available) in zip(block.instructions, copies.available_before(block_id)):
+            sources = {}
+            if available and ir.opcode not in (Opcode.ASM, Opcode.ASM_VOLATILE):
+                for name in used_variables(ir):
+                    source = copies.source_of(name, available)
+                    if source is not None:
+                        sources[name] = source
+            new_ir = rename_operands(ir, sources, False) if sources else ir
+            if is_self_copy(new_ir):
+                changes |= Changes.INSTRUCTIONS
+                continue
+            if new_ir is not ir:
+                changes |= Changes.INSTRUCTIONS
+            instructions.append(new_ir)
+        block.instructions = instructions
+    return changes
+
+
+class Interference:
+    """Pairs of variables of a function that hold different values at the same time,
+from liveness: a variable interferes with everything live where it is written,
+but a copy does not make its source and dest interfere"""
+    def __init__(self, graph: ControlFlowGraph, function_name: str):
+        liveness = get_liveness(graph, function_name)
+        self.variables = variables = liveness.variables
+        # variable index -> bits of variables interfering with it
+        self.edges: List[int] = [0] * len(variables)
+        if graph.entry != -1:
+            # parameters, and variables read before written
+            self.add(liveness.live_in[graph.entry], 0, 0)
+        for block_id in graph.reverse_postorder():
+            instructions = graph.blocks[block_id].instructions
+            for (ir, live) in zip(instructions, liveness.live_after(block_id)):
+                if ir.opcode in CALL_OPCODES:
+                    continue
+                written = variables.bits(defined_variables(ir))
+                if not written:
+                    continue
+                copy = copy_of(ir)
+                self.add(written, live, variables.bit(copy.source) if copy is not None else 0)
+
+    def add(self, written: int, live: int, excluded: int):
+        """Every variable of written interferes with the others, and with live ones except excluded"""
+        others = (written | live) & ~excluded
+        for name in self.variables.decode(written):
+            index = self.variables.index[name]
+            neighbours = others & ~(1 << index)
+            self.edges[index] |= neighbours
+            for neighbour in self.variables.decode(neighbours):
+                self.edges[self.variables.index[neighbour]] |= 1 << index
+
+    def interferes(self, a: str, b: str) -> bool:
+        return bool(self.edges[self.variables.index[a]] & self.variables.bit(b))
+
+    def merge(self, kept: str, removed: str):
+        """kept now holds removed as well"""
+        kept_index, removed_index = self.variables.index[kept], self.variables.index[removed]
+        neighbours = self.edges[removed_index]
+        self.edges[kept_index] |= neighbours
+        for neighbour in self.variables.decode(neighbours):
+            self.edges[self.variables.index[neighbour]] |= 1 << kept_index
+
+
+# Machine-independent
+# Input: control flow graph
+# Copy coalescing: the source and dest of "set_t y x" become one variable when they never
+# hold different values at the same time, and the copy goes away.
+# Only variables of the function are merged, and parameters and asm operands keep their names.
+@register_optimizer(
+    name="coalesce-copies",
+    target="basic_block_graph",
+    is_machine_dependent=False,
+    rank=16,
+    optimize_level=2,
+    group="simplify"
+)
+def coalesce_copies(
+        graph: ControlFlowGraph,
+        current_function_name: str,
+        functions: Dict,
+        known_variable_types: Dict[str, str],
+) -> Changes:
+    if NOT_COPYING in graph.machine_dependents:
+        return Changes.NONE
+    declared_types: Dict[str, str] = {}
+    fixed: Set[str] = set()
+    copies = []
+    for block_id in graph.order:
+        for ir in graph.blocks[block_id].instructions:
+            if ir.opcode is Opcode.DECL:
+                declared_types[ir.dest] = ir.type_suffix
+                if ir.src1 == "argument":
+                    fixed.add(ir.dest)
+            elif ir.opcode in (Opcode.ASM, Opcode.ASM_VOLATILE):
+                fixed.update(ir.input_vars)
+                fixed.update(ir.output_vars)
+    reachable = graph.reachable()
+    for block_id in graph.order:
+        if block_id not in reachable:
+            continue
+        for ir in graph.blocks[block_id].instructions:
+            copy = copy_of(ir)
+            if copy is not None and all(is_local(name, current_function_name) for name in copy):
+                copies.append(copy)
+    if not copies:
+        return Changes.NONE
+
+    interference = Interference(graph, current_function_name)
+    # removed variable -> the variable it is merged into
+    renamed: Dict[str, str] = {}
+
+    def representative(name: str) -> str:
+        while name in renamed:
+            name = renamed[name]
+        return name
+
+    for copy in copies:
+        dest, source = representative(copy.dest), representative(copy.source)
+        if dest == source or dest in fixed and source in fixed:
+            continue
+        if declared_types.get(dest) is None or declared_types.get(dest) != declared_types.get(source):
+            continue
+        if interference.interferes(dest, source):
+            continue
+        # keep the name of the parameter, or the one that is not a temporary
+        if dest in fixed or source not in fixed and source.startswith("___vtmp_"):
+            kept, removed = dest, source
+        else:
+            kept, removed = source, dest
+        interference.merge(kept, removed)
+        renamed[removed] = kept
+    if not renamed:
+        return Changes.NONE
+
+    renamed = {name: representative(name) for name in renamed}
+    for block_id in graph.order:
+        block = graph.blocks[block_id]
+        instructions = []
+        for ir in block.instructions:
+            new_ir = rename_operands(ir, renamed, True)
+            if not is_self_copy(new_ir):
+                instructions.append(new_ir)
+        block.instructions = instructions
+    return Changes.INSTRUCTIONS
@@ -0,0 +1,114 @@
+from collections import deque
+from typing import Dict
+
+from ..backend.control_flow_graph import ControlFlowGraph
+from ..intermediate.ir_quadruple import CALL_OPCODES, Opcode, Quadruple
+from .dataflow import defined_variables, leaving_blocks, number_variables, observable_bits, used_variables
+from .optimizer_registry import Changes, register_optimizer
+
+# Instructions without side effects, removed when nothing reads what they write
+PURE_OPCODES = frozenset((
+    Opcode.SET, Opcode.MINUS, Opcode.NOT, Opcode.CVTF64, Opcode.CVTI32,
+    Opcode.ADD, Opcode.SUB, Opcode.MUL, Opcode.DIV, Opcode.REM,
+    Opcode.AND, Opcode.OR, Opcode.XOR, Opcode.LSH, Opcode.RSH,
+    Opcode.LT, Opcode.GT, Opcode.LTEQ, Opcode.GTEQ, Opcode.EQ, Opcode.NE,
+))
+# Kept in unreachable blocks: the end of the function, and declarations for remove-unused-decls
+KEPT_UNREACHABLE_OPCODES = frozenset((Opcode.DECL, Opcode.FUNCEND))
+
+
+def empty_blocks(graph: ControlFlowGraph, block_ids) -> bool:
+    """Removes instructions of blocks that never run, returns True if any"""
+    changed = False
+    for block_id in block_ids:
+        block = graph.blocks[block_id]
+        kept = [ir for ir in block.instructions if ir.opcode in KEPT_UNREACHABLE_OPCODES]
+        if len(kept) != len(block.instructions):
+            block.instructions = kept
+            changed = True
+    return changed
+
+
+def is_removable(ir: Quadruple) -> bool:
+    # Like GCC, asm without outputs is volatile
+    return ir.opcode in PURE_OPCODES or ir.opcode is Opcode.ASM and len(ir.output_vars) > 0
+
+
+# Machine-independent
+# Input: control flow graph
+# Faint code elimination: an instruction is dead if nothing live reads what it writes,
+# reads of dead instructions do not count, so chains of dead instructions go at once.
+@register_optimizer(
+    name="dead-code-elimination",
+    target="basic_block_graph",
+    is_machine_dependent=False,
+    rank=15,
+    optimize_level=1,
+    group="simplify"
+)
+def eliminate_dead_code(
+        graph: ControlFlowGraph,
+        current_function_name: str,
+        functions: Dict,
+        known_variable_types: Dict[str, str],
+) -> Changes:
+    reachable = graph.reachable()
+    changes = Changes.ALL if empty_blocks(graph, set(graph.order) - reachable) else Changes.NONE
+
+    variables = number_variables(graph)
+    observable = observable_bits(variables, current_function_name)
+    # mask of each instruction: (read, written), None for calls
+    operands = {}
+
+    def transfer(ir: Quadruple, live: int) -> int:
+        """Live variables before ir, ir does nothing if it is dead"""
+        key = id(ir)
+        if key not in operands:
+            if ir.opcode in CALL_OPCODES:
+                operands[key] = None
+            else:
+                operands[key] = (variables.bits(used_variables(ir)), variables.bits(defined_variables(ir)))
+        if operands[key] is None:
+            return live | observable
+        read, written = operands[key]
+        if is_removable(ir) and not live & written:
+            return live
+        return (live & ~written) | read
+
+    # live variables, increasing until they are stable
+    live_in = {block_id: 0 for block_id in graph.order}
+    live_out = {block_id: 0 for block_id in graph.order}
+    boundary_blocks = set(leaving_blocks(graph))
+    order = [block_id for block_id in reversed(graph.reverse_postorder())]
+    worklist = deque(order)
+    pending = set(order)
+    while worklist:
+        block_id = worklist.popleft()
+        pending.discard(block_id)
+        live = observable if block_id in boundary_blocks else 0
+        for successor in graph.successors[block_id]:
+            live |= live_in[successor]
+        live_out[block_id] = live
+        for ir in reversed(graph.blocks[block_id].instructions):
+            live = transfer(ir, live)
+        if live != live_in[block_id]:
+            live_in[block_id] = live
+            for predecessor in graph.predecessors[block_id]:
+                if predecessor in reachable and predecessor not in pending:
+                    pending.add(predecessor)
+                    worklist.append(predecessor)
+
+    for block_id in order:
+        block = graph.blocks[block_id]
+        live = live_out[block_id]
+        kept = []
+        for ir in reversed(block.instructions):
+            if is_removable(ir) and not live & operands[id(ir)][1]:
+                continue
+            live = transfer(ir, live)
+            kept.append(ir)
+        if len(kept) != len(block.instructions):
+            kept.reverse()
+            block.instructions = kept
+            changes |= Changes.INSTRUCTIONS
+    return changes
@@ -1,5 +1,5 @@
 from ..intermediate.function import Function
-from .optimizer_registry import register_optimizer
+from .optimizer_registry import Changes, register_optimizer
 
 
 # Machine-independent
@@ -12,13 +12,14 @@ from .optimizer_registry import register_optimizer
     rank=1,
     optimize_level=1
 )
-def deduplicate_tail_return(func: Function) -> Function:
+def deduplicate_tail_return(func: Function) -> Changes:
     return_ir = func.instructions[-1]
     if return_ir.instruction != "__funcend":
-        return func
+        return Changes.NONE
+    length = len(func.instructions)
     func.instructions.pop()
     while len(func.instructions) > 0 \
             and func.instructions[-1].instruction == "__return":
         func.instructions.pop()
     func.instructions.append(return_ir)
-    return func
+    return Changes.ALL if len(func.instructions) != length else Changes.NONE
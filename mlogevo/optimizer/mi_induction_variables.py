@@ -0,0 +1,418 @@
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from ..backend.basic_block import BASIC_BLOCK_EXITS
+from ..backend.control_flow_graph import ControlFlowGraph
+from ..intermediate.ir_quadruple import Opcode, Quadruple
+from .constant_folding import EXACT_INTEGER_LIMIT, format_number, parse_number
+from .dataflow import defined_variables, get_liveness, is_local, used_variables
+from .mi_dead_code_elimination import PURE_OPCODES
+from .mi_licm import LoopInvariants, find_preheader, make_preheader
+from .optimizer_registry import Changes, register_optimizer
+
+# The output masks every result with -mstrict-32bit: i * k is no longer a line
+NOT_LINEAR = "strict-32bit"
+
+# relation of a and b -> relation of -a and -b
+NEGATED_RELATIONS = {"lt": "gt", "gt": "lt", "lteq": "gteq", "gteq": "lteq", "eq": "eq", "ne": "ne"}
+
+
+class BasicInduction(NamedTuple):
+    """i = i + step, the only write to i in the loop"""
+    name: str
+    ir: Quadruple
+    block_id: int
+    step: float
+
+
+class DerivedInduction(NamedTuple):
+    """Written once in the loop, by ir, as scale * i + offset where i is the current value of
+a basic induction variable. scale is scale_number, times scale_variable if there is one."""
+    name: str
+    ir: Quadruple
+    block_id: int
+    basic: BasicInduction
+    # the induction variable ir reads, None for the basic one
+    parent: Optional["DerivedInduction"]
+    scale_number: float
+    scale_variable: Optional[str]
+
+    def chain(self) -> List["DerivedInduction"]:
+        """Derived induction variables from the basic one to this one"""
+        result = []
+        derived = self
+        while derived is not None:
+            result.append(derived)
+            derived = derived.parent
+        return result[::-1]
+
+    def operand(self) -> str:
+        return self.parent.name if self.parent is not None else self.basic.name
+
+
+def replace_operand(ir: Quadruple, old: str, new: str, dest: str) -> Quadruple:
+    return Quadruple(ir.instruction, new if ir.src1 == old else ir.src1, new if ir.src2 == old else ir.src2,
+                     dest, ir.relop)
+
+
+def is_integer(value: Optional[float]) -> bool:
+    return value is not None and value == int(value)
+
+
+class InductionVariables:
+    """Induction variables of a natural loop, and what replacing them saves on every iteration"""
+    def __init__(self, graph: ControlFlowGraph, header: int, body: Set[int], function_name: str):
+        self.graph = graph
+        self.function_name = function_name
+        self.liveness = get_liveness(graph, function_name)
+        self.invariants = LoopInvariants(graph, header, body, function_name, self.liveness)
+        self.blocks = self.invariants.blocks
+        # instructions of the loop writing only local variables nothing reads
+        self.dead: Set[int] = set()
+        for block_id in self.blocks:
+            instructions = graph.blocks[block_id].instructions
+            for (ir, live) in zip(instructions, self.liveness.live_after(block_id)):
+                written = defined_variables(ir)
+                if ir.opcode in PURE_OPCODES and written and all(is_local(name, function_name) for name in written) \
+                        and not live & self.liveness.variables.bits(written):
+                    self.dead.add(id(ir))
+        # variable -> number of instructions reading it, those in self.dead excluded
+        self.reads: Counter = Counter()
+        for block_id in graph.order:
+            for ir in graph.blocks[block_id].instructions:
+                if id(ir) not in self.dead:
+                    self.reads.update(set(used_variables(ir)))
+        self.basics: Dict[str, BasicInduction] = {}
+        for block_id in self.blocks:
+            for ir in graph.blocks[block_id].instructions:
+                basic = self.as_basic(ir, block_id)
+                if basic is not None:
+                    self.basics[basic.name] = basic
+        self.derived: Dict[str, DerivedInduction] = {}
+        for block_id in self.blocks:
+            self.find_derived(block_id)
+
+    def is_invariant(self, operand: str) -> bool:
+        return parse_number(operand) is not None or self.invariants.is_invariant(operand)
+
+    def as_basic(self, ir: Quadruple, block_id: int) -> Optional[BasicInduction]:
+        name = ir.dest
+        if ir.opcode not in (Opcode.ADD, Opcode.SUB) or not is_local(name, self.function_name) \
+                or self.invariants.definitions[name] != 1:
+            return None
+        if ir.src1 == name:
+            step = parse_number(ir.src2)
+        elif ir.src2 == name and ir.opcode is Opcode.ADD:
+            step = parse_number(ir.src1)
+        else:
+            return None
+        if not is_integer(step) or step == 0:
+            return None
+        return BasicInduction(name, ir, block_id, step if ir.opcode is Opcode.ADD else -step)
+
+    def find_derived(self, block_id: int):
+        """Derived induction variables of a block: only the basic ones are known at its start,
+and derived ones are stale once their basic one is incremented"""
+        current: Dict[str, Optional[DerivedInduction]] = {name: None for name in self.basics}
+        for ir in self.graph.blocks[block_id].instructions:
+            derived = self.as_derived(ir, block_id, current)
+            if derived is not None:
+                self.derived[derived.name] = derived
+                current[derived.name] = derived
+                continue
+            for name in defined_variables(ir):
+                basic = self.basics.get(name)
+                if basic is not None and basic.ir is ir:
+                    current = {key: value for (key, value) in current.items()
+                               if value is None or value.basic is not basic}
+                else:
+                    current.pop(name, None)
+
+    def as_derived(self, ir: Quadruple, block_id: int,
+                   current: Dict[str, Optional[DerivedInduction]]) -> Optional[DerivedInduction]:
+        opcode = ir.opcode
+        name = ir.dest
+        if id(ir) in self.dead or name.startswith("@") or name in self.basics \
+                or self.invariants.definitions[name] != 1:
+            return None
+        if opcode in (Opcode.MINUS, Opcode.CVTI32):
+            operand, other, sign = ir.src1, None, -1.0 if opcode is Opcode.MINUS else 1.0
+        elif opcode in (Opcode.ADD, Opcode.SUB, Opcode.MUL):
+            if ir.src1 in current and ir.src2 not in current:
+                operand, other, sign = ir.src1, ir.src2, 1.0
+            elif ir.src2 in current and ir.src1 not in current:
+                operand, other, sign = ir.src2, ir.src1, -1.0 if opcode is Opcode.SUB else 1.0
+            else:
+                return None
+            if not self.is_invariant(other):
+                return None
+        else:
+            return None
+        if operand not in current:
+            return None
+        parent = current[operand]
+        basic = parent.basic if parent is not None else self.basics[operand]
+        scale_number = parent.scale_number if parent is not None else 1.0
+        scale_variable = parent.scale_variable if parent is not None else None
+        if opcode is Opcode.MUL:
+            constant = parse_number(other)
+            if constant is not None:
+                # a running sum of integers is exact, of fractions it is not
+                if not is_integer(constant):
+                    return None
+                scale_number *= constant
+            elif scale_variable is None and ir.type_suffix == "i32":
+                scale_variable = other
+            else:
+                return None
+        if abs(scale_number * basic.step) >= EXACT_INTEGER_LIMIT:
+            return None
+        return DerivedInduction(name, ir, block_id, basic, parent, scale_number * sign, scale_variable)
+
+    def leaves(self, basic: BasicInduction) -> List[DerivedInduction]:
+        """Derived induction variables of basic read by something else than another one"""
+        chain_reads = Counter(derived.operand() for derived in self.derived.values())
+        return [derived for derived in self.derived.values()
+                if derived.basic is basic and self.reads[derived.name] > chain_reads[derived.name]]
+
+    def removed(self, selected: List[DerivedInduction]) -> Set[str]:
+        """Derived induction variables whose instructions go away: the selected ones become copies,
+the ones only they read are no longer read"""
+        result = {derived.name for derived in selected}
+        changed = True
+        while changed:
+            changed = False
+            for derived in self.derived.values():
+                if derived.name in result or not is_local(derived.name, self.function_name):
+                    continue
+                readers = [other for other in self.derived.values() if other.operand() == derived.name]
+                if readers and self.reads[derived.name] == len(readers) \
+                        and all(reader.name in result for reader in readers):
+                    result.add(derived.name)
+                    changed = True
+        return result
+
+    def update_anchor(self, derived: DerivedInduction) -> Quadruple:
+        """The instruction after which the new variable of derived is increased: the increment of
+its basic variable, or what still reads derived after it in the same block"""
+        basic = derived.basic
+        instructions = self.graph.blocks[basic.block_id].instructions
+        increment = instructions.index(basic.ir)
+        anchor = increment
+        if derived.block_id == basic.block_id and instructions.index(derived.ir) < increment:
+            for position in range(increment + 1, len(instructions)):
+                ir = instructions[position]
+                if id(ir) in self.dead or derived.name not in used_variables(ir):
+                    continue
+                if ir.instruction in BASIC_BLOCK_EXITS:
+                    return basic.ir
+                anchor = position
+        return instructions[anchor]
+
+    def copy_stays(self, derived: DerivedInduction) -> bool:
+        """The copy replacing derived is read where the new variable has moved on: after it is increased,
+in the next iteration, or after the loop"""
+        bit = self.liveness.variables.bit(derived.name)
+        instructions = self.graph.blocks[derived.basic.block_id].instructions
+        anchor = instructions.index(self.update_anchor(derived))
+        live_after = self.liveness.live_after(derived.basic.block_id)[anchor]
+        return bool((live_after | self.invariants.live_at_header | self.invariants.live_after) & bit)
+
+    def saving(self, selected: List[DerivedInduction]) -> int:
+        """Instructions saved per iteration: the ones removed, minus the additions and the copies that stay"""
+        return len(self.removed(selected)) - len(selected) - sum(self.copy_stays(derived) for derived in selected)
+
+    def exit_tests(self, basic: BasicInduction, selected: List[DerivedInduction]) -> Optional[List[Quadruple]]:
+        """Comparisons of basic with invariants, if nothing else reads it in the loop once selected are replaced,
+and nothing reads it after the loop"""
+        if self.liveness.variables.bit(basic.name) & self.invariants.live_after:
+            return None
+        removed = self.removed(selected)
+        removed_ir = {id(self.derived[name].ir) for name in removed}
+        tests = []
+        for block_id in self.blocks:
+            for ir in self.graph.blocks[block_id].instructions:
+                if ir is basic.ir or id(ir) in self.dead or id(ir) in removed_ir \
+                        or basic.name not in used_variables(ir):
+                    continue
+                if ir.opcode not in (Opcode.IF, Opcode.IFNOT):
+                    return None
+                other = ir.src2 if ir.src1 == basic.name else ir.src1
+                if other == basic.name or not self.is_invariant(other) or ir.relop.endswith("_obj"):
+                    return None
+                tests.append(ir)
+        return tests
+
+    def plan(self, basic: BasicInduction) -> Tuple[List[DerivedInduction], Optional[List[Quadruple]], int]:
+        """(derived induction variables to replace, exit tests to rewrite or None, saving per iteration)"""
+        leaves = self.leaves(basic)
+        selected = []
+        for leaf in leaves:
+            if self.saving(selected + [leaf]) > self.saving(selected):
+                selected.append(leaf)
+        best = (selected, None, self.saving(selected))
+        # linear function test replacement: the loop counts with a derived variable, the increment goes
+        for candidates in (selected, leaves):
+            if not any(leaf.scale_variable is None for leaf in candidates):
+                continue
+            tests = self.exit_tests(basic, candidates)
+            if tests is not None:
+                saving = self.saving(candidates) + 1
+                if saving > best[2]:
+                    best = (candidates, tests, saving)
+        return best
+
+
+class Rewriter:
+    """New variables and the code that keeps them up to date"""
+    def __init__(self, graph: ControlFlowGraph, function_name: str, preheader: int):
+        self.graph = graph
+        self.function_name = function_name
+        self.preheader: List[Quadruple] = []
+        self.preheader_id = preheader
+        self.declarations: List[Quadruple] = []
+        self.number = 0
+        for block_id in graph.order:
+            for ir in graph.blocks[block_id].instructions:
+                for name in (*used_variables(ir), *defined_variables(ir)):
+                    prefix = name.partition("@")[0]
+                    if prefix.startswith("___vtmp_") and prefix[8:].isdigit():
+                        self.number = max(self.number, int(prefix[8:]))
+
+    def temporary(self, type_suffix: str) -> str:
+        self.number += 1
+        name = f"___vtmp_{self.number}@{self.function_name}"
+        self.declarations.append(Quadruple(f"decl_{type_suffix}", "default", "", name))
+        return name
+
+    def evaluate(self, derived: DerivedInduction, value: str, dest: str):
+        """dest = the value of derived when its basic variable is value, before the loop"""
+        for link in derived.chain():
+            self.preheader.append(replace_operand(link.ir, link.operand(), value, dest))
+            value = dest
+
+    def step(self, derived: DerivedInduction) -> str:
+        step = derived.scale_number * derived.basic.step
+        if derived.scale_variable is None:
+            return format_number(step)
+        if step == 1:
+            return derived.scale_variable
+        result = self.temporary(derived.ir.type_suffix)
+        self.preheader.append(Quadruple(f"mul_{derived.ir.type_suffix}", derived.scale_variable,
+                                        format_number(step), result))
+        return result
+
+    def finish(self):
+        preheader = self.graph.blocks[self.preheader_id].instructions
+        position = len(preheader)
+        if preheader and preheader[-1].opcode is Opcode.GOTO:
+            position -= 1
+        preheader[position:position] = self.preheader
+        entry = self.graph.blocks[self.graph.entry].instructions
+        position = 0
+        while position < len(entry) and entry[position].opcode in (Opcode.FUNCBEGIN, Opcode.DECL):
+            position += 1
+        entry[position:position] = self.declarations
+
+
+class Rewrite:
+    """Changes to the instructions of a loop, made at once: instructions replaced or removed,
+and instructions added after others"""
+    def __init__(self):
+        # old instruction -> new ones, None to remove it
+        self.replaced: Dict[int, Optional[List[Quadruple]]] = {}
+        self.after: Dict[int, List[Quadruple]] = {}
+
+    def reduce(self, induction: InductionVariables, rewriter: Rewriter, basic: BasicInduction,
+               selected: List[DerivedInduction], tests: Optional[List[Quadruple]]):
+        running = {}
+        for derived in selected:
+            type_suffix = derived.ir.type_suffix
+            name = running[derived.name] = rewriter.temporary(type_suffix)
+            rewriter.evaluate(derived, basic.name, name)
+            anchor = induction.update_anchor(derived)
+            self.after.setdefault(id(anchor), []).append(
+                Quadruple(f"add_{type_suffix}", name, rewriter.step(derived), name))
+            self.replaced[id(derived.ir)] = [Quadruple(f"set_{type_suffix}", name, "", derived.name)]
+        for name in induction.removed(selected):
+            self.replaced.setdefault(id(induction.derived[name].ir), None)
+        if tests is None:
+            return
+        counter = next(derived for derived in selected if derived.scale_variable is None)
+        name = running[counter.name]
+        for ir in tests:
+            other = ir.src2 if ir.src1 == basic.name else ir.src1
+            bound = rewriter.temporary(counter.ir.type_suffix)
+            rewriter.evaluate(counter, other, bound)
+            relation = ir.relop.rpartition("_")[0]
+            if counter.scale_number < 0:
+                relation = NEGATED_RELATIONS[relation]
+            relop = f"{relation}_{counter.ir.type_suffix}"
+            if ir.src1 == basic.name:
+                self.replaced[id(ir)] = [Quadruple(ir.instruction, name, bound, ir.dest, relop)]
+            else:
+                self.replaced[id(ir)] = [Quadruple(ir.instruction, bound, name, ir.dest, relop)]
+        # basic is only read by its increment now
+        self.replaced[id(basic.ir)] = None
+
+    def apply(self, graph: ControlFlowGraph, blocks: List[int]):
+        for block_id in blocks:
+            block = graph.blocks[block_id]
+            instructions = []
+            for ir in block.instructions:
+                replacement = self.replaced.get(id(ir), [ir])
+                if replacement is not None:
+                    instructions.extend(replacement)
+                instructions.extend(self.after.get(id(ir), ()))
+            block.instructions = instructions
+
+
+# Machine-independent
+# Input: control flow graph
+# Strength reduction of induction variables: in a loop counting with i = i + c, a value computed
+# as i * k + b (k and b loop invariant) becomes a variable of its own, set before the loop and
+# increased by k * c along with i. When i is then only compared with invariants, the comparisons
+# use the new variable and i goes away (linear function test replacement).
+# Done when it saves instructions on every iteration: a multiplication alone costs as much as an addition.
+@register_optimizer(
+    name="induction-variables",
+    target="basic_block_graph",
+    is_machine_dependent=False,
+    rank=14,
+    optimize_level=2,
+    group="simplify"
+)
+def reduce_induction_variables(
+        graph: ControlFlowGraph,
+        current_function_name: str,
+        functions: Dict,
+        known_variable_types: Dict[str, str],
+) -> Changes:
+    if NOT_LINEAR in graph.machine_dependents:
+        return Changes.NONE
+    changes = Changes.NONE
+    # inner loops first, they run the most
+    for (header, body) in sorted(graph.natural_loops().items(), key=lambda item: len(item[1])):
+        induction = InductionVariables(graph, header, body, current_function_name)
+        plans = [(basic, *induction.plan(basic)) for basic in induction.basics.values()]
+        plans = [plan for plan in plans if plan[3] > 0]
+        if not plans:
+            continue
+        preheader = find_preheader(graph, header, body)
+        made = preheader is None
+        if made:
+            preheader = make_preheader(graph, header, body, current_function_name)
+            if preheader is None:
+                continue
+        rewriter = Rewriter(graph, current_function_name, preheader)
+        rewrite = Rewrite()
+        for (basic, selected, tests, _) in plans:
+            rewrite.reduce(induction, rewriter, basic, selected, tests)
+        rewrite.apply(graph, induction.blocks)
+        rewriter.finish()
+        graph.analyses.clear()
+        if made:
+            # the graph has a new block, other loops wait for the next run
+            return Changes.ALL
+        changes |= Changes.INSTRUCTIONS
+    return changes
@@ -0,0 +1,185 @@
+import logging
+from typing import Dict, List
+
+from ..backend.call_graph import CallGraph
+from ..backend.control_flow_graph import ControlFlowGraph
+from ..intermediate.function import Function
+from ..intermediate.ir_quadruple import Opcode, Quadruple
+from .dataflow import Liveness, is_local
+from .mi_block_layout import LOOP_WEIGHT
+from .mi_simplify_cfg import JUMP_OPCODES, retarget, retarget_table
+from .optimizer_registry import Changes, register_optimizer
+from .pass_manager import Program
+
+logger = logging.getLogger("inline-functions")
+
+# instructions of a call that inlining removes: op add retaddr, jump to the function and set @counter back
+CALL_OVERHEAD = 3
+
+
+def can_inline(function: Function, call_graph: CallGraph) -> bool:
+    if function.name == "main" or "noinline" in function.attributes:
+        return False
+    if call_graph.is_recursive(function.name):
+        return False
+    # asm jumping to labels of the function would jump to another copy
+    return not any(ir.opcode in (Opcode.ASM, Opcode.ASM_VOLATILE)
+                   and any(line.split()[:1] == ["jump"] for line in ir.raw_instructions)
+                   for ir in function.instructions)
+
+
+def call_frequency(function: Function, callee: str) -> float:
+    """Estimated times callee is called each time function runs, calls in loops run LOOP_WEIGHT times more"""
+    graph = ControlFlowGraph(function.instructions)
+    depths = graph.loop_depths()
+    return sum(float(LOOP_WEIGHT ** depths[block_id])
+               for block_id in graph.order for ir in graph.blocks[block_id].instructions
+               if ir.opcode is Opcode.CALL and ir.src1 == callee)
+
+
+def renamed_variables(function: Function, caller: str) -> Dict[str, str]:
+    """Locals of function -> their names as locals of caller.
+Locals read before they are written keep their values between calls, and their names."""
+    graph = ControlFlowGraph(function.instructions)
+    liveness = Liveness(graph, function.name)
+    kept = set(liveness.variables.decode(liveness.live_in[graph.entry]))
+    arguments = {ir.dest for ir in function.instructions if ir.opcode is Opcode.DECL and ir.src1 == "argument"}
+    names = {}
+    for name in liveness.variables.items:
+        if is_local(name, function.name) and (name in arguments or name not in kept):
+            names[name] = f"{name}@{caller}"
+    # "_" and a C identifier are the other locals, none of them has two "@"
+    names[f"result@{function.name}"] = f"_@result@{function.name}@{caller}"
+    return names
+
+
+def rename(ir: Quadruple, names: Dict[str, str]) -> Quadruple:
+    """ir with variables renamed, ir itself if none of them is"""
+    opcode = ir.opcode
+    if opcode in (Opcode.LABEL, Opcode.GOTO, Opcode.CALL, Opcode.RETURN, Opcode.FUNCBEGIN, Opcode.FUNCEND):
+        return ir
+    if opcode is Opcode.DECL:
+        if ir.dest not in names:
+            return ir
+        # arguments of inlined calls are set like any other local
+        return Quadruple(ir.instruction, "default" if ir.src1 == "argument" else ir.src1, ir.src2, names[ir.dest])
+    if opcode in (Opcode.ASM, Opcode.ASM_VOLATILE):
+        # asm templates are expanded in place, always copied
+        return Quadruple(ir.instruction, ir.src1, ir.src2, ir.dest, ir.relop,
+                         input_vars=[names.get(name, name) for name in ir.input_vars],
+                         output_vars=[names.get(name, name) for name in ir.output_vars],
+                         raw_instructions=list(ir.raw_instructions))
+    if ir.src1 not in names and ir.src2 not in names and ir.dest not in names:
+        return ir
+    dest = ir.dest if opcode in (Opcode.IF, Opcode.IFNOT) else names.get(ir.dest, ir.dest)
+    return Quadruple(ir.instruction, names.get(ir.src1, ir.src1), names.get(ir.src2, ir.src2), dest, ir.relop,
+                     raw_instructions=ir.raw_instructions)
+
+
+def jump_label(ir: Quadruple) -> str:
+    return ir.src1 if ir.opcode is Opcode.GOTO else ir.dest
+
+
+def inline_callee(caller: Function, callee: Function) -> List[Quadruple]:
+    """Instructions of caller with the body of callee in place of every call to it"""
+    names = renamed_variables(callee, caller.name)
+    labels = {ir.src1 for ir in caller.instructions if ir.opcode is Opcode.LABEL}
+    callee_labels = {ir.src1 for ir in callee.instructions if ir.opcode is Opcode.LABEL}
+    declared = {ir.dest for ir in caller.instructions if ir.opcode is Opcode.DECL}
+    declarations = []
+    for ir in callee.instructions:
+        if ir.opcode is Opcode.DECL:
+            ir = rename(ir, names)
+            if ir.dest not in declared:
+                declared.add(ir.dest)
+                declarations.append(ir)
+    number = 0
+    body = []
+    for ir in caller.instructions:
+        if ir.opcode is Opcode.FUNCBEGIN:
+            body.append(ir)
+            body.extend(declarations)
+            continue
+        if ir.opcode is not Opcode.CALL or ir.src1 != callee.name:
+            body.append(rename(ir, names))
+            continue
+        # labels are global in the output
+        while f"__MLOGEV_INLINED_{callee.name}_{caller.name}_{number}__" in labels:
+            number += 1
+        prefix = f"__MLOGEV_INLINED_{callee.name}_{caller.name}_{number}_"
+        return_label = prefix + "_"
+        labels.add(return_label)
+        for inst in callee.instructions:
+            opcode = inst.opcode
+            if opcode in (Opcode.FUNCBEGIN, Opcode.FUNCEND, Opcode.DECL):
+                continue
+            if opcode is Opcode.RETURN:
+                body.append(Quadruple("goto", return_label))
+            elif opcode is Opcode.LABEL:
+                body.append(Quadruple("label", prefix + inst.src1))
+            elif opcode in JUMP_OPCODES and jump_label(inst) in callee_labels:
+                body.append(retarget(rename(inst, names), prefix + jump_label(inst)))
+            elif opcode is Opcode.JUMPTABLE:
+                body.append(retarget_table(rename(inst, names), [prefix + label if label in callee_labels else label
+                                                                 for label in inst.raw_instructions]))
+            else:
+                body.append(rename(inst, names))
+        body.append(Quadruple("label", return_label))
+    return body
+
+
+# Machine-independent
+# Input: the whole program, once its functions are optimized
+# Function inlining: callees go first (see CallGraph.bottom_up), recursive functions and noinline ones stay
+@register_optimizer(
+    name="inline-functions",
+    target="program",
+    is_machine_dependent=False,
+    rank=40,
+    optimize_level=2,
+)
+def inline_functions(program: Program) -> Changes:
+    """Inlines functions into all their callers when it saves instructions, or when the calls it saves
+(in loops, LOOP_WEIGHT times more) are worth the instructions it adds and they fit.
+Callees are inlined before their callers, which may then be inlined too."""
+    inlined = 0
+    inlined_calls = 0
+    size = program.size()
+    for name in CallGraph(program.functions).bottom_up():
+        call_graph = CallGraph(program.functions)
+        callers = call_graph.callers.get(name)
+        callee = program.functions.get(name)
+        if callee is None or not callers or not all(caller in program.functions for caller in callers):
+            continue
+        if not can_inline(callee, call_graph):
+            continue
+        callee_size = program.count_instructions(callee.instructions)
+        calls = sum(callers.values())
+        # every call becomes the body without its last return, and the function is gone
+        cost = calls * (callee_size - CALL_OVERHEAD) - callee_size
+        saved = CALL_OVERHEAD * sum(call_frequency(program.functions[caller], name) for caller in callers)
+        if cost > 0 and (saved < cost or size + cost > program.max_instructions):
+            logger.debug(f"{name}: inlining {calls} calls would add {cost} instructions to save {saved:g}")
+            continue
+        functions = dict(program.functions)
+        for caller in callers:
+            replaced = Function(**vars(program.functions[caller]))
+            replaced.instructions = inline_callee(replaced, callee)
+            program.reoptimize(replaced)
+            program.functions[caller] = replaced
+        del program.functions[name]
+        new_size = program.size()
+        if new_size > max(size, program.max_instructions):
+            program.functions.clear()
+            program.functions.update(functions)
+            logger.debug(f"{name}: does not fit in {program.max_instructions} instructions once inlined")
+            continue
+        logger.info(f"{name}: inlined into {', '.join(callers)} (calls: {calls}), "
+                    f"{new_size - size:+} instructions")
+        size = new_size
+        inlined += 1
+        inlined_calls += calls
+    logger.info(f"{inlined} functions inlined ({inlined_calls} calls), {size} instructions")
+    program.statistics["inlined_functions"] = inlined
+    program.statistics["inlined_calls"] = inlined_calls
+    return Changes.ALL if inlined else Changes.NONE
@@ -0,0 +1,211 @@
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+from ..backend.basic_block import BASIC_BLOCK_EXITS, BasicBlock, extract_destination_label
+from ..backend.control_flow_graph import ControlFlowGraph
+from ..intermediate.ir_quadruple import CALL_OPCODES, Opcode, Quadruple
+from .dataflow import Liveness, defined_variables, get_liveness, is_local, used_variables
+from .mi_dead_code_elimination import PURE_OPCODES
+from .mi_simplify_cfg import JUMP_OPCODES, retarget, retarget_table
+from .optimizer_registry import Changes, register_optimizer
+
+
+def find_preheader(graph: ControlFlowGraph, header: int, body: Set[int]) -> Optional[int]:
+    """The block outside the loop that is the only way into it, and that only leads to it"""
+    reachable = graph.reachable()
+    outside = [block_id for block_id in graph.predecessors[header] if block_id not in body and block_id in reachable]
+    if len(outside) != 1 or graph.successors[outside[0]] != [header]:
+        return None
+    # code goes before its goto, or at its end if it falls into the header
+    instructions = graph.blocks[outside[0]].instructions
+    if instructions and instructions[-1].opcode is not Opcode.GOTO \
+            and instructions[-1].instruction in BASIC_BLOCK_EXITS:
+        return None
+    return outside[0]
+
+
+def make_preheader(graph: ControlFlowGraph, header: int, body: Set[int], function_name: str) -> Optional[int]:
+    """A new empty block right before the header, that jumps into the loop from outside now go to.
+None if a block of the loop falls into the header."""
+    position = graph.order.index(header)
+    header_instructions = graph.blocks[header].instructions
+    if position == 0 or header_instructions[0].opcode is not Opcode.LABEL:
+        return None
+    previous = graph.order[position - 1]
+    if previous in body and header in graph.successors[previous] \
+            and graph.blocks[previous].instructions[-1].opcode not in JUMP_OPCODES:
+        return None
+    header_labels = {ir.src1 for ir in header_instructions if ir.opcode is Opcode.LABEL}
+    labels = {ir.src1 for block in graph.blocks.values() for ir in block.instructions if ir.opcode is Opcode.LABEL}
+    number = 0
+    # labels are global in the output
+    while f"__MLOGEV_PREHEADER_{function_name}_{number}__" in labels:
+        number += 1
+    label = f"__MLOGEV_PREHEADER_{function_name}_{number}__"
+    for predecessor in graph.predecessors[header]:
+        instructions = graph.blocks[predecessor].instructions
+        if predecessor not in body and instructions[-1].opcode in JUMP_OPCODES \
+                and extract_destination_label(instructions[-1]) in header_labels:
+            instructions[-1] = retarget(instructions[-1], label)
+        elif predecessor not in body and instructions[-1].opcode is Opcode.JUMPTABLE:
+            instructions[-1] = retarget_table(instructions[-1], [label if entry in header_labels else entry
+                                                                 for entry in instructions[-1].raw_instructions])
+    block_id = max(graph.blocks) + 1
+    graph.blocks[block_id] = BasicBlock(block_id, [Quadruple("label", label)])
+    graph.order.insert(position, block_id)
+    return block_id
+
+
+class LoopInvariants:
+    """Instructions of a natural loop that compute the same thing on every iteration,
+and can move before the loop"""
+    def __init__(self, graph: ControlFlowGraph, header: int, body: Set[int], function_name: str,
+                 liveness: Liveness):
+        self.graph = graph
+        self.function_name = function_name
+        self.liveness = liveness
+        self.blocks = [block_id for block_id in graph.reverse_postorder() if block_id in body]
+        instructions = [ir for block_id in self.blocks for ir in graph.blocks[block_id].instructions]
+        self.has_call = any(ir.opcode in CALL_OPCODES for ir in instructions)
+        # variable -> number of instructions of the loop writing it
+        self.definitions = Counter(name for ir in instructions for name in defined_variables(ir))
+        self.live_at_header = liveness.live_in[header]
+        # blocks leaving the loop (or the function), and what is live after the loop
+        self.exiting = []
+        self.live_after = 0
+        for block_id in self.blocks:
+            successors = graph.successors[block_id]
+            leaving = [successor for successor in successors if successor not in body]
+            if leaving or not successors:
+                self.exiting.append(block_id)
+            for successor in leaving:
+                self.live_after |= liveness.live_in[successor]
+            if not successors:
+                self.live_after |= liveness.observable
+        self.asm_movable = self.may_move_asm(instructions)
+        # variables written by instructions already moved out
+        self.moved: Set[str] = set()
+
+    def may_move_asm(self, instructions: List[Quadruple]) -> bool:
+        """asm results (sensor reads of MlogObject fields among them) do not change in the loop:
+nothing in it is volatile or a call, and the loop does not wait for them to change,
+that is, it ends, and never because of what asm read"""
+        if self.has_call or not self.exiting or any(ir.opcode is Opcode.ASM_VOLATILE for ir in instructions):
+            return False
+        # variables computed from asm results
+        tainted = {name for ir in instructions if ir.opcode is Opcode.ASM for name in ir.output_vars}
+        changed = bool(tainted)
+        while changed:
+            changed = False
+            for ir in instructions:
+                if any(name in tainted for name in used_variables(ir)):
+                    for name in defined_variables(ir):
+                        if name not in tainted:
+                            tainted.add(name)
+                            changed = True
+        for block_id in self.exiting:
+            last = self.graph.blocks[block_id].instructions[-1]
+            if last.opcode in (Opcode.IF, Opcode.IFNOT) and any(name in tainted for name in used_variables(last)):
+                return False
+        return True
+
+    def is_invariant(self, name: str) -> bool:
+        # builtins like @time and @unit change by themselves
+        if name.startswith("@"):
+            return False
+        if self.has_call and not is_local(name, self.function_name):
+            return False
+        return self.definitions[name] == 0 or name in self.moved
+
+    def can_move(self, ir: Quadruple, block_id: int) -> bool:
+        if ir.opcode is Opcode.ASM:
+            if not self.asm_movable or not ir.output_vars:
+                return False
+        elif ir.opcode not in PURE_OPCODES:
+            return False
+        if not all(self.is_invariant(name) for name in used_variables(ir)):
+            return False
+        variables = self.liveness.variables
+        for name in defined_variables(ir):
+            if name.startswith("@") or self.definitions[name] != 1 or name in self.moved:
+                return False
+            if self.has_call and not is_local(name, self.function_name):
+                return False
+            bit = variables.bit(name)
+            # read before written in an iteration
+            if self.live_at_header & bit:
+                return False
+            # read after the loop, but not written on every way out
+            if self.live_after & bit and not all(self.graph.dominates(block_id, exiting)
+                                                  for exiting in self.exiting):
+                return False
+        return True
+
+    def take(self) -> List[Quadruple]:
+        """Removes loop invariant instructions from the loop, in an order they can run in"""
+        result = []
+        changed = True
+        while changed:
+            changed = False
+            for block_id in self.blocks:
+                block = self.graph.blocks[block_id]
+                kept = []
+                for ir in block.instructions:
+                    if self.can_move(ir, block_id):
+                        self.moved.update(defined_variables(ir))
+                        result.append(ir)
+                        changed = True
+                    else:
+                        kept.append(ir)
+                block.instructions = kept
+        return result
+
+
+# Machine-independent
+# Input: control flow graph
+# Loop-invariant code motion: instructions of a natural loop whose operands do not change in it
+# move to its preheader, the block through which every entry goes (one is made if needed).
+# Calls may change globals, and asm (the sensor reads of MlogObject fields too) only moves out of
+# loops without calls and asm volatile that do not wait for what it reads, see LoopInvariants.
+@register_optimizer(
+    name="licm",
+    target="basic_block_graph",
+    is_machine_dependent=False,
+    rank=14,
+    optimize_level=2,
+    group="simplify"
+)
+def move_loop_invariants(
+        graph: ControlFlowGraph,
+        current_function_name: str,
+        functions: Dict,
+        known_variable_types: Dict[str, str],
+) -> Changes:
+    loops = graph.natural_loops()
+    changes = Changes.NONE
+    # outer loops first: what does not change in them goes the furthest
+    for (header, body) in sorted(loops.items(), key=lambda item: -len(item[1])):
+        liveness = get_liveness(graph, current_function_name)
+        invariants = LoopInvariants(graph, header, body, current_function_name, liveness)
+        preheader = find_preheader(graph, header, body)
+        if preheader is None:
+            if not any(invariants.can_move(ir, block_id) for block_id in invariants.blocks
+                       for ir in graph.blocks[block_id].instructions):
+                continue
+            preheader = make_preheader(graph, header, body, current_function_name)
+            if preheader is None:
+                continue
+            graph.blocks[preheader].instructions.extend(invariants.take())
+            # the graph has a new block, other loops wait for the next run
+            return Changes.ALL
+        moved = invariants.take()
+        if not moved:
+            continue
+        instructions = graph.blocks[preheader].instructions
+        position = len(instructions)
+        if instructions and instructions[-1].opcode is Opcode.GOTO:
+            position -= 1
+        instructions[position:position] = moved
+        graph.analyses.clear()
+        changes |= Changes.INSTRUCTIONS
+    return changes
@@ -0,0 +1,338 @@
+import copy
+import logging
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from ..backend.control_flow_graph import ControlFlowGraph
+from ..intermediate.ir_quadruple import Opcode, Quadruple
+from .constant_folding import FOLDABLE_TYPES, compare, evaluate, mask_32bit, parse_number
+from .dataflow import defined_variables, is_local
+from .mi_simplify_cfg import JUMP_OPCODES, retarget, retarget_table
+from .optimizer_registry import Changes, register_optimizer
+from .pass_manager import Program
+
+logger = logging.getLogger("unroll-loops")
+
+# loops running up to this many times are unrolled completely
+MAX_COPIES = 32
+# copies of the body in a partially unrolled loop, the largest that fits is taken
+PARTIAL_FACTORS = (8, 4, 2)
+# loops running more times than this are not unrolled
+MAX_TRIPS = 10000
+
+
+class CountedLoop(NamedTuple):
+    """A natural loop left by a single conditional jump, which compares a counter going up
+or down by a constant with a constant, and that runs a number of times known when compiling"""
+    header: int
+    # blocks of the loop as they are placed, from the header
+    blocks: List[int]
+    # the block with the jump leaving the loop, and where it goes
+    exiting: int
+    exit_block: int
+    # times the header runs
+    trips: int
+    # the first label of the header
+    label: str
+
+
+class Unrolling(NamedTuple):
+    """copies of the loop body one after another: the last `looping` of them still loop,
+the others run once (the loop is gone if looping is 0)"""
+    copies: int
+    looping: int
+    # estimated instructions added to the program
+    cost: int
+
+    def stays(self, copy_number: int) -> Optional[bool]:
+        """Whether the exit test of a copy stays in the loop, None if it is still tested"""
+        if copy_number < self.copies - 1:
+            return True
+        return None if self.looping else False
+
+    def next_copy(self, copy_number: int) -> Optional[int]:
+        """Copy the back edges of a copy go to, None after the last iteration"""
+        if copy_number + 1 < self.copies:
+            return copy_number + 1
+        return self.copies - self.looping if self.looping else None
+
+
+def loop_jumps_out(ir: Quadruple) -> bool:
+    """asm jumping to labels of the loop would jump to the first copy only"""
+    return ir.opcode in (Opcode.ASM, Opcode.ASM_VOLATILE) \
+        and any(line.split()[:1] == ["jump"] for line in ir.raw_instructions)
+
+
+def initial_value(graph: ControlFlowGraph, header: int, body: Set[int], name: str) -> Optional[float]:
+    """Constant value of a variable when the loop is entered, found on the only way into it"""
+    reachable = graph.reachable()
+    outside = [block_id for block_id in graph.predecessors[header] if block_id not in body and block_id in reachable]
+    visited = set()
+    while len(outside) == 1 and outside[0] not in visited:
+        block_id = outside[0]
+        visited.add(block_id)
+        for ir in reversed(graph.blocks[block_id].instructions):
+            if name in defined_variables(ir):
+                return parse_number(ir.src1) if ir.opcode is Opcode.SET else None
+        outside = [predecessor for predecessor in graph.predecessors[block_id] if predecessor in reachable]
+    return None
+
+
+def find_counted_loop(graph: ControlFlowGraph, header: int, body: Set[int], function_name: str) \
+        -> Optional[CountedLoop]:
+    header_instructions = graph.blocks[header].instructions
+    if header == graph.entry or header_instructions[0].opcode is not Opcode.LABEL:
+        return None
+    # the copies replace the loop where it is
+    positions = sorted(graph.order.index(block_id) for block_id in body)
+    if positions[-1] - positions[0] + 1 != len(positions):
+        return None
+    blocks = [graph.order[position] for position in positions]
+    start = blocks.index(header)
+    blocks = blocks[start:] + blocks[:start]
+    leaving = [(block_id, successor) for block_id in blocks
+               for successor in graph.successors[block_id] if successor not in body]
+    if len(leaving) != 1 or any(not graph.successors[block_id] for block_id in blocks):
+        return None
+    exiting, exit_block = leaving[0]
+    branch = graph.blocks[exiting].instructions[-1]
+    if branch.opcode not in (Opcode.IF, Opcode.IFNOT) or len(graph.successors[exiting]) != 2 \
+            or graph.blocks[exit_block].instructions[0].opcode is Opcode.FUNCBEGIN:
+        return None
+    instructions = [ir for block_id in blocks for ir in graph.blocks[block_id].instructions]
+    if any(loop_jumps_out(ir) for ir in instructions) \
+            or any(ir.opcode in JUMP_OPCODES and graph.blocks[block_id].jump_destination == -1
+                   for block_id in blocks for ir in graph.blocks[block_id].instructions[-1:]) \
+            or any(-1 in graph.blocks[block_id].table_destinations for block_id in blocks):
+        return None
+    # the exit test runs once on every iteration
+    latches = [block_id for block_id in graph.predecessors[header] if block_id in body]
+    if not all(graph.dominates(exiting, latch) for latch in latches):
+        return None
+    relation, _, type_suffix = branch.relop.rpartition("_")
+    if type_suffix not in FOLDABLE_TYPES:
+        return None
+    definitions = Counter(name for ir in instructions for name in defined_variables(ir))
+    for (counter, bound) in ((branch.src1, branch.src2), (branch.src2, branch.src1)):
+        bound_value = parse_number(bound)
+        if bound_value is None or not is_local(counter, function_name) or definitions[counter] != 1:
+            continue
+        for block_id in blocks:
+            for ir in graph.blocks[block_id].instructions:
+                if counter in defined_variables(ir):
+                    trips = count_trips(graph, header, body, exiting, block_id, ir, counter, bound_value, relation)
+                    if trips is not None:
+                        return CountedLoop(header, blocks, exiting, exit_block, trips, header_instructions[0].src1)
+    return None
+
+
+def count_trips(graph: ControlFlowGraph, header: int, body: Set[int], exiting: int, block_id: int,
+                increment: Quadruple, counter: str, bound: float, relation: str) -> Optional[int]:
+    """Times the header runs, the counter changing by increment once on every iteration"""
+    if increment.opcode not in (Opcode.ADD, Opcode.SUB) or increment.type_suffix not in FOLDABLE_TYPES:
+        return None
+    if increment.src1 == counter:
+        step = parse_number(increment.src2)
+    elif increment.src2 == counter and increment.opcode is Opcode.ADD:
+        step = parse_number(increment.src1)
+    else:
+        return None
+    latches = [latch for latch in graph.predecessors[header] if latch in body]
+    if step is None or not all(graph.dominates(block_id, latch) for latch in latches):
+        return None
+    # the counter changes before the test, or after it
+    incremented_first = graph.dominates(block_id, exiting)
+    value = initial_value(graph, header, body, counter)
+    if value is None:
+        return None
+    branch = graph.blocks[exiting].instructions[-1]
+    stays_if_jumps = graph.blocks[exiting].jump_destination in body
+    strict_32bit = "strict-32bit" in graph.machine_dependents
+
+    def advance(current: float) -> float:
+        result = evaluate(increment.opcode, increment.type_suffix, current, step)
+        return mask_32bit(result) if strict_32bit else result
+
+    for trips in range(1, MAX_TRIPS + 1):
+        tested = advance(value) if incremented_first else value
+        a, b = (tested, bound) if branch.src1 == counter else (bound, tested)
+        jumps = compare(relation, a, b) == (branch.opcode is Opcode.IF)
+        if jumps != stays_if_jumps:
+            return trips
+        value = advance(value)
+    return None
+
+
+def plan_unrolling(loop: CountedLoop, loop_size: int, budget: int) -> Optional[Unrolling]:
+    """Unrolls completely if it fits in budget, or else as many times as fits"""
+    if loop.trips <= MAX_COPIES and (loop.trips - 1) * loop_size <= budget:
+        return Unrolling(loop.trips, 0, (loop.trips - 1) * loop_size)
+    for factor in PARTIAL_FACTORS:
+        if factor >= loop.trips:
+            continue
+        # iterations that do not fill a group of factor run before the loop
+        copies = factor + loop.trips % factor
+        if (copies - 1) * loop_size <= budget:
+            return Unrolling(copies, factor, (copies - 1) * loop_size)
+    return None
+
+
+def unroll(graph: ControlFlowGraph, loop: CountedLoop, unrolling: Unrolling, function_name: str) \
+        -> Tuple[List[Quadruple], str]:
+    """Instructions of the function with the loop unrolled, and the label of what still loops"""
+    body = set(loop.blocks)
+    labels = {ir.src1 for block in graph.blocks.values() for ir in block.instructions if ir.opcode is Opcode.LABEL}
+    number = 0
+
+    def new_label() -> str:
+        nonlocal number
+        # labels are global in the output
+        while f"__MLOGEV_UNROLL_{function_name}_{number}__" in labels:
+            number += 1
+        label = f"__MLOGEV_UNROLL_{function_name}_{number}__"
+        labels.add(label)
+        return label
+
+    # every block of the loop and its exit may be jumped to from a copy
+    for block_id in [*loop.blocks, loop.exit_block]:
+        instructions = graph.blocks[block_id].instructions
+        if instructions[0].opcode is not Opcode.LABEL:
+            instructions.insert(0, Quadruple("label", new_label()))
+    loop_labels = [ir.src1 for block_id in loop.blocks for ir in graph.blocks[block_id].instructions
+                   if ir.opcode is Opcode.LABEL]
+    # copy -> label of the loop -> its name in the copy, the first copy keeps them
+    renamed: List[Dict[str, str]] = [{label: label for label in loop_labels}]
+    renamed.extend({label: new_label() for label in loop_labels} for _ in range(1, unrolling.copies))
+
+    # (copy, block id), copy is -1 outside the loop
+    def place_of(copy_number: int, block_id: int) -> Tuple[int, int]:
+        if block_id not in body:
+            return -1, block_id
+        if block_id == loop.header:
+            next_copy = unrolling.next_copy(copy_number)
+            return (-1, loop.exit_block) if next_copy is None else (next_copy, block_id)
+        return copy_number, block_id
+
+    def label_of(place: Tuple[int, int]) -> str:
+        copy_number, block_id = place
+        label = graph.blocks[block_id].instructions[0].src1
+        return label if copy_number == -1 else renamed[copy_number][label]
+
+    positions = [graph.order.index(block_id) for block_id in loop.blocks]
+    first, last = min(positions), max(positions)
+    places = [(copy_number, block_id) for copy_number in range(unrolling.copies) for block_id in loop.blocks]
+    # what the last copy falls into
+    places.append((-1, graph.order[last + 1]) if last + 1 < len(graph.order) else None)
+    result = [ir for block_id in graph.order[:first] for ir in graph.blocks[block_id].instructions]
+    for (index, (copy_number, block_id)) in enumerate(places[:-1]):
+        block = graph.blocks[block_id]
+        continues = block.will_continue
+        for ir in block.instructions:
+            if ir.opcode is Opcode.LABEL:
+                ir = Quadruple("label", renamed[copy_number][ir.src1])
+            elif ir.opcode in JUMP_OPCODES:
+                destination = block.jump_destination
+                stays = unrolling.stays(copy_number) if block_id == loop.exiting else None
+                if stays is not None:
+                    wanted = [successor for successor in graph.successors[block_id]
+                              if (successor in body) == stays][0]
+                    if wanted != destination:
+                        # falls through instead
+                        continue
+                    ir = Quadruple("goto")
+                    continues = False
+                ir = retarget(ir, label_of(place_of(copy_number, destination)))
+            elif ir.opcode is Opcode.JUMPTABLE:
+                ir = retarget_table(ir, [label_of(place_of(copy_number, destination))
+                                         for destination in block.table_destinations])
+            elif ir.opcode in (Opcode.ASM, Opcode.ASM_VOLATILE):
+                # asm templates are expanded in place
+                ir = copy.copy(ir)
+            result.append(ir)
+        position = graph.order.index(block_id)
+        if continues and position + 1 < len(graph.order):
+            falls_to = place_of(copy_number, graph.order[position + 1])
+            if places[index + 1] != falls_to:
+                result.append(Quadruple("goto", label_of(falls_to)))
+    for block_id in graph.order[last + 1:]:
+        result.extend(graph.blocks[block_id].instructions)
+    looping = renamed[unrolling.copies - unrolling.looping][loop.label] if unrolling.looping else ""
+    return result, looping
+
+
+def find_candidates(program: Program, function_name: str, done: Set[Tuple[str, str]], budget: int):
+    """(sort key, graph, loop, unrolling) of loops of a function that may be unrolled"""
+    function = program.functions[function_name]
+    graph = ControlFlowGraph(function.instructions, program.machine_dependents)
+    depths = graph.loop_depths()
+    for (header, body) in graph.natural_loops().items():
+        label = graph.blocks[header].instructions[0].src1
+        if (function_name, label) in done:
+            continue
+        loop = find_counted_loop(graph, header, body, function_name)
+        unrolling = None
+        if loop is not None:
+            loop_size = program.count_instructions(
+                [ir for block_id in loop.blocks for ir in graph.blocks[block_id].instructions])
+            unrolling = plan_unrolling(loop, loop_size, budget)
+        if unrolling is None:
+            done.add((function_name, label))
+            continue
+        # inner loops first, then the cheapest
+        yield (-depths[header], unrolling.cost), graph, loop, unrolling
+
+
+# Machine-independent
+# Input: the whole program, once its functions are optimized
+# Loop unrolling: loops with a trip count known when compiling become copies of their body with the
+# exit test resolved, completely up to MAX_COPIES iterations, or else in groups of PARTIAL_FACTORS copies
+# testing once per group, with the iterations left over copied before the loop. The output must fit in a
+# processor (-mmax-instructions=N, 1000 by default): loops are unrolled one at a time, inner ones first, and
+# a function that no longer fits once optimized again gets its loop back.
+@register_optimizer(
+    name="unroll-loops",
+    target="program",
+    is_machine_dependent=False,
+    rank=50,
+    optimize_level=3,
+)
+def unroll_loops(program: Program) -> Changes:
+    # (function name, label of a loop header) that are left alone
+    done: Set[Tuple[str, str]] = set()
+    size = program.size()
+    unrolled = 0
+    while True:
+        budget = program.max_instructions - size
+        best = None
+        for name in program.functions:
+            for candidate in find_candidates(program, name, done, budget):
+                if best is None or candidate[0] < best[1][0]:
+                    best = (name, candidate)
+        if best is None:
+            break
+        name, (_, graph, loop, unrolling) = best
+        function = program.functions[name]
+        saved = function.instructions
+        function.instructions, looping = unroll(graph, loop, unrolling, name)
+        program.reoptimize(function)
+        new_size = program.size()
+        if new_size > program.max_instructions:
+            function.instructions = saved
+            done.add((name, loop.label))
+            logger.debug(f"{name}: loop {loop.label} does not fit in {program.max_instructions} instructions "
+                         f"with {unrolling.copies} copies")
+            continue
+        size = new_size
+        unrolled += 1
+        left = f"{program.max_instructions - size} of {program.max_instructions} instructions left"
+        if looping:
+            done.add((name, looping))
+            logger.info(f"{name}: loop {loop.label} unrolled {unrolling.looping} times, "
+                        f"{unrolling.copies - unrolling.looping} iterations copied before it, {left}")
+        else:
+            logger.info(f"{name}: loop {loop.label} unrolled completely into {unrolling.copies} copies, {left}")
+    logger.info(f"{unrolled} loops unrolled, {program.max_instructions - size} of {program.max_instructions} "
+                f"instructions left")
+    program.statistics["unrolled_loops"] = unrolled
+    program.statistics["instruction_budget_left"] = program.max_instructions - size
+    return Changes.ALL if unrolled else Changes.NONE
@@ -1,5 +1,6 @@
 from ..intermediate.function import Function
-from .optimizer_registry import register_optimizer
+from ..intermediate.ir_quadruple import Opcode
+from .optimizer_registry import Changes, register_optimizer
 
 
 @register_optimizer(
@@ -9,13 +10,13 @@ from .optimizer_registry import register_optimizer
     rank=98,
     optimize_level=0
 )
-def remove_decls(func: Function) -> Function:
+def remove_decls(func: Function) -> Changes:
     start = func.instructions[0]
     decls = []
     referred = set()
     body = []
     for ir in func.instructions[1:-1]:
-        if ir.instruction.startswith("decl_"):
+        if ir.opcode is Opcode.DECL:
             decls.append(ir)
             continue
         body.append(ir)
@@ -28,5 +29,8 @@ def remove_decls(func: Function) -> Function:
             referred.add(var)
     end = func.instructions[-1]
     referred_decls = [x for x in decls if x.dest in referred or "argument" in x.src1]
-    func.instructions = [start, ] + referred_decls + body + [end, ]
-    return func
+    result = [start, ] + referred_decls + body + [end, ]
+    changed = len(result) != len(func.instructions) \
+        or any(a is not b for (a, b) in zip(result, func.instructions))
+    func.instructions = result
+    return Changes.INSTRUCTIONS if changed else Changes.NONE
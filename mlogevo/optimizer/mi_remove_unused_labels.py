@@ -1,5 +1,5 @@
 from ..intermediate.function import Function
-from .optimizer_registry import register_optimizer
+from .optimizer_registry import Changes, register_optimizer
 
 
 @register_optimizer(
@@ -9,23 +9,27 @@ from .optimizer_registry import register_optimizer
     rank=1,
     optimize_level=1
 )
-def remove_unused_labels(func: Function) -> Function:
+def remove_unused_labels(func: Function) -> Changes:
     insts = func.instructions
     used_labels = set()
     # IR instructions that uses labels:
-    # if, ifnot, goto
+    # if, ifnot, goto, __jumptable
     # if, ifnot: label in dest
     # goto: label in src1
+    # __jumptable: labels in raw_instructions
     for inst in insts:
         if inst.instruction in ("if", "ifnot"):
             used_labels.add(inst.dest)
         elif inst.instruction == "goto":
             used_labels.add(inst.src1)
+        elif inst.instruction == "__jumptable":
+            used_labels.update(inst.raw_instructions)
 
     result_insts = []
     # label: name in src1
     for inst in insts:
         if inst.instruction != "label" or inst.src1 in used_labels:
             result_insts.append(inst)
+    changed = len(result_insts) != len(insts)
     func.instructions = result_insts
-    return func
+    return Changes.ALL if changed else Changes.NONE
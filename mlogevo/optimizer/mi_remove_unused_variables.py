@@ -1,7 +1,7 @@
 from typing import Set
 from ..intermediate.function import Function
-from ..intermediate.ir_quadruple import I1_INSTRUCTIONS, Quadruple
-from .optimizer_registry import register_optimizer
+from ..intermediate.ir_quadruple import I1_INSTRUCTIONS, Opcode, Quadruple
+from .optimizer_registry import Changes, register_optimizer
 
 
 # run AFTER LCSE
@@ -10,9 +10,10 @@ from .optimizer_registry import register_optimizer
     target="function",
     is_machine_dependent=False,
     rank=20,
-    optimize_level=1
+    optimize_level=1,
+    group="simplify"
 )
-def remove_unused_variables(func: Function) -> Function:
+def remove_unused_variables(func: Function) -> Changes:
     insts = func.instructions
     referred_variables = {"", }
     involved_functions = {func.name, }
@@ -20,10 +21,10 @@ def remove_unused_variables(func: Function) -> Function:
     for inst in insts:
         if inst in ("goto", "__funcbegin", "__funcend"):
             continue
-        if inst.instruction.startswith("decl_"):
+        if inst.opcode is Opcode.DECL:
             continue
         # TODO: call vs __call
-        if inst.instruction == "__call":
+        if inst.instruction in ("__call", "__tailcall"):
             involved_functions.add(inst.src1)
 
         referred_variables.add(inst.src1)
@@ -33,15 +34,16 @@ def remove_unused_variables(func: Function) -> Function:
 
     result_insts = []
     for inst in insts:
-        if inst.instruction.startswith("decl_") \
+        if inst.opcode is Opcode.DECL \
                 and should_remove_name(inst.src1, func.name, referred_variables, involved_functions):
             continue
         if inst.dest.endswith(f"@{func.name}") \
                 and should_remove_name(inst.dest, func.name, referred_variables, involved_functions):
             continue
         result_insts.append(inst)
+    changed = len(result_insts) != len(insts)
     func.instructions = result_insts
-    return func
+    return Changes.INSTRUCTIONS if changed else Changes.NONE
 
 
 def should_remove_name(name: str, function_name: str, referred: Set, involved_functions: Set):
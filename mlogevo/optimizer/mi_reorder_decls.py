@@ -1,5 +1,6 @@
 from ..intermediate.function import Function
-from .optimizer_registry import register_optimizer
+from ..intermediate.ir_quadruple import Opcode
+from .optimizer_registry import Changes, register_optimizer
 
 
 @register_optimizer(
@@ -9,15 +10,17 @@ from .optimizer_registry import register_optimizer
     rank=2,
     optimize_level=0
 )
-def reorder_decls(func: Function) -> Function:
+def reorder_decls(func: Function) -> Changes:
     start = func.instructions[0]
     decls = []
     body = []
     for ir in func.instructions[1:-1]:
-        if ir.instruction.startswith("decl_"):
+        if ir.opcode is Opcode.DECL:
             decls.append(ir)
         else:
             body.append(ir)
     end = func.instructions[-1]
-    func.instructions = [start, ] + decls + body + [end, ]
-    return func
+    result = [start, ] + decls + body + [end, ]
+    changed = any(a is not b for (a, b) in zip(result, func.instructions))
+    func.instructions = result
+    return Changes.INSTRUCTIONS if changed else Changes.NONE
@@ -0,0 +1,214 @@
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..backend.control_flow_graph import ControlFlowGraph
+from ..intermediate.ir_quadruple import CALL_OPCODES, Opcode, Quadruple, classify_operand
+from .constant_folding import BUILTIN_NUMBERS, FOLDABLE_TYPES, UNARY_OPCODES, compare, evaluate, format_number, \
+    is_foldable, mask_32bit, parse_number
+from .dataflow import defined_variables, is_local
+from .mi_dead_code_elimination import empty_blocks
+from .optimizer_registry import Changes, register_optimizer
+
+# variable -> value, variables not in it are unknown
+Constants = Dict[str, float]
+
+
+def operand_value(operand: str, constants: Constants) -> Optional[float]:
+    if operand not in BUILTIN_NUMBERS and classify_operand(operand) == "variable":
+        return constants.get(operand)
+    return parse_number(operand)
+
+
+def fold(ir: Quadruple, constants: Constants, strict_32bit: bool) -> Optional[float]:
+    """Value written by ir, None if unknown"""
+    if not is_foldable(ir):
+        return None
+    a = operand_value(ir.src1, constants)
+    if a is None:
+        return None
+    b = None
+    if ir.opcode not in UNARY_OPCODES:
+        b = operand_value(ir.src2, constants)
+        if b is None:
+            return None
+    result = evaluate(ir.opcode, ir.type_suffix, a, b)
+    if result is not None and strict_32bit:
+        result = mask_32bit(result)
+    return result
+
+
+def branch_taken(ir: Quadruple, constants: Constants) -> Optional[bool]:
+    """Whether if/ifnot jumps, None if unknown"""
+    relation, _, type_suffix = ir.relop.rpartition("_")
+    if type_suffix not in FOLDABLE_TYPES:
+        return None
+    a, b = operand_value(ir.src1, constants), operand_value(ir.src2, constants)
+    if a is None or b is None:
+        return None
+    return compare(relation, a, b) == (ir.instruction == "if")
+
+
+def table_entry(ir: Quadruple, constants: Constants) -> Optional[int]:
+    """Position of the label __jumptable jumps to, None if unknown"""
+    index = operand_value(ir.src1, constants)
+    if index is None or index != int(index) or not 0 <= index < len(ir.raw_instructions):
+        return None
+    return int(index)
+
+
+def transfer(ir: Quadruple, constants: Constants, function_name: str, strict_32bit: bool):
+    if ir.opcode in CALL_OPCODES:
+        for name in [name for name in constants if not is_local(name, function_name)]:
+            del constants[name]
+        return
+    # "add_i32 _x@f 1 _x@f" reads before it writes
+    value = fold(ir, constants, strict_32bit) if ir.dest else None
+    for name in defined_variables(ir):
+        constants.pop(name, None)
+    if value is not None:
+        constants[ir.dest] = value
+
+
+def meet(states: List[Constants]) -> Constants:
+    result = dict(states[0])
+    for state in states[1:]:
+        for name in [name for (name, value) in result.items() if state.get(name) != value]:
+            del result[name]
+    return result
+
+
+class ConstantPropagation:
+    """Conditional constant propagation: blocks and edges are executable until proven otherwise,
+and variables keep a constant value while every executable path to them agrees"""
+    def __init__(self, graph: ControlFlowGraph, function_name: str):
+        self.graph = graph
+        self.function_name = function_name
+        self.strict_32bit = "strict-32bit" in graph.machine_dependents
+        self.position = {block_id: i for (i, block_id) in enumerate(graph.order)}
+        self.executable_edges: Set[Tuple[int, int]] = set()
+        self.state_out: Dict[int, Constants] = {}
+        self.solve()
+
+    def executable_successors(self, block_id: int, constants: Constants) -> List[int]:
+        block = self.graph.blocks[block_id]
+        if block.instructions and block.instructions[-1].opcode is Opcode.JUMPTABLE:
+            entry = table_entry(block.instructions[-1], constants)
+            if entry is None:
+                return self.graph.successors[block_id]
+            destination = block.table_destinations[entry]
+            return [destination] if destination != -1 else []
+        if not block.instructions or block.instructions[-1].instruction not in ("if", "ifnot"):
+            return self.graph.successors[block_id]
+        taken = branch_taken(block.instructions[-1], constants)
+        if taken is None:
+            return self.graph.successors[block_id]
+        if taken:
+            return [block.jump_destination] if block.jump_destination != -1 else []
+        i = self.position[block_id] + 1
+        return [self.graph.order[i]] if i < len(self.graph.order) else []
+
+    def state_in(self, block_id: int) -> Constants:
+        if block_id == self.graph.entry:
+            # parameters and globals may be anything
+            return {}
+        return meet([self.state_out[predecessor] for predecessor in self.graph.predecessors[block_id]
+                     if (predecessor, block_id) in self.executable_edges])
+
+    def solve(self):
+        if self.graph.entry == -1:
+            return
+        worklist = deque([self.graph.entry])
+        pending = {self.graph.entry}
+        while worklist:
+            block_id = worklist.popleft()
+            pending.discard(block_id)
+            constants = self.state_in(block_id)
+            for ir in self.graph.blocks[block_id].instructions:
+                transfer(ir, constants, self.function_name, self.strict_32bit)
+            changed = self.state_out.get(block_id) != constants
+            self.state_out[block_id] = constants
+            for successor in self.executable_successors(block_id, constants):
+                edge = (block_id, successor)
+                if (changed or edge not in self.executable_edges) and successor not in pending:
+                    pending.add(successor)
+                    worklist.append(successor)
+                self.executable_edges.add(edge)
+
+    def rewrite(self, block_id: int) -> Tuple[List[Quadruple], Changes]:
+        """Instructions of an executable block, with constants folded and propagated"""
+        constants = self.state_in(block_id)
+        result = []
+        changes = Changes.NONE
+        for ir in self.graph.blocks[block_id].instructions:
+            new_ir = ir
+            if ir.instruction in ("if", "ifnot"):
+                taken = branch_taken(ir, constants)
+                if taken is not None:
+                    changes |= Changes.ALL
+                    if taken:
+                        result.append(Quadruple("goto", ir.dest))
+                    continue
+                if ir.relop.rpartition("_")[2] in FOLDABLE_TYPES:
+                    new_ir = self.substitute(ir, constants)
+            elif ir.opcode is Opcode.JUMPTABLE:
+                entry = table_entry(ir, constants)
+                if entry is not None:
+                    new_ir = Quadruple("goto", ir.raw_instructions[entry])
+                    changes |= Changes.ALL
+            elif ir.dest and is_foldable(ir):
+                value = fold(ir, constants, self.strict_32bit)
+                text = None if value is None else format_number(value)
+                if text is not None:
+                    # "set_f64 0.0 x" stays as it is
+                    if ir.opcode is not Opcode.SET or classify_operand(ir.src1) == "variable":
+                        new_ir = Quadruple(f"set_{ir.type_suffix}", text, "", ir.dest)
+                else:
+                    new_ir = self.substitute(ir, constants)
+            if new_ir is not ir:
+                changes |= Changes.INSTRUCTIONS
+            result.append(new_ir)
+            transfer(ir, constants, self.function_name, self.strict_32bit)
+        return result, changes
+
+    def substitute(self, ir: Quadruple, constants: Constants) -> Quadruple:
+        """ir with variable operands replaced by their values"""
+        operands = []
+        for operand in (ir.src1, ir.src2):
+            value = constants.get(operand) if classify_operand(operand) == "variable" else None
+            text = None if value is None else format_number(value)
+            operands.append(operand if text is None else text)
+        if operands == [ir.src1, ir.src2]:
+            return ir
+        return Quadruple(ir.instruction, operands[0], operands[1], ir.dest, ir.relop)
+
+
+# Machine-independent
+# Input: control flow graph
+# Folds instructions whose operands are known on every executable path,
+# resolves branches (and jump tables) on constants and removes blocks that no executable edge leads to.
+@register_optimizer(
+    name="sccp",
+    target="basic_block_graph",
+    is_machine_dependent=False,
+    rank=12,
+    optimize_level=1,
+    group="simplify"
+)
+def propagate_constants(
+        graph: ControlFlowGraph,
+        current_function_name: str,
+        functions: Dict,
+        known_variable_types: Dict[str, str],
+) -> Changes:
+    propagation = ConstantPropagation(graph, current_function_name)
+    changes = Changes.NONE
+    never_run = [block_id for block_id in graph.order if block_id not in propagation.state_out]
+    if empty_blocks(graph, never_run):
+        changes |= Changes.ALL
+    for block_id in graph.order:
+        if block_id not in propagation.state_out:
+            continue
+        instructions, block_changes = propagation.rewrite(block_id)
+        graph.blocks[block_id].instructions = instructions
+        changes |= block_changes
+    return changes
@@ -0,0 +1,242 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+from ..backend.basic_block import BasicBlock, NO_CONTINUES, extract_destination_label
+from ..backend.control_flow_graph import ControlFlowGraph
+from ..intermediate.ir_quadruple import Opcode, Quadruple
+from .optimizer_registry import Changes, register_optimizer
+
+JUMP_OPCODES = (Opcode.GOTO, Opcode.IF, Opcode.IFNOT)
+# Output nothing, and can be jumped over
+NO_CODE_OPCODES = (Opcode.LABEL, Opcode.DECL)
+
+
+def retarget(ir: Quadruple, label: str) -> Quadruple:
+    if ir.opcode is Opcode.GOTO:
+        return Quadruple("goto", label)
+    return Quadruple(ir.instruction, ir.src1, ir.src2, label, ir.relop)
+
+
+def retarget_table(ir: Quadruple, labels: List[str]) -> Quadruple:
+    """__jumptable jumping to labels, a goto if they are all the same"""
+    if len(set(labels)) == 1:
+        return Quadruple("goto", labels[0])
+    return Quadruple("__jumptable", ir.src1, raw_instructions=labels)
+
+
+def invert(ir: Quadruple, label: str) -> Quadruple:
+    """if <-> ifnot, jumping to label"""
+    return Quadruple("ifnot" if ir.opcode is Opcode.IF else "if", ir.src1, ir.src2, label, ir.relop)
+
+
+def is_invertible(ir: Quadruple) -> bool:
+    # "if a eq_obj b" is strictEqual, "ifnot a eq_obj b" is notEqual: not the opposite
+    return not ir.relop.endswith("_obj")
+
+
+class ControlFlowCleanup:
+    """One round of cleanup on the blocks of a function, in their order.
+Blocks are edited in place and never reordered: a block that moves is appended
+to its predecessor, and its own place becomes empty."""
+    def __init__(self, graph: ControlFlowGraph):
+        self.blocks: List[BasicBlock] = [graph.blocks[block_id] for block_id in graph.order]
+        # label -> position of its block
+        self.label_position: Dict[str, int] = {}
+        # label -> number of jumps to it
+        self.references: Dict[str, int] = defaultdict(int)
+        # labels asm may jump to
+        self.pinned: Set[str] = set()
+        for (position, block) in enumerate(self.blocks):
+            for ir in block.instructions:
+                if ir.opcode is Opcode.LABEL:
+                    self.label_position[ir.src1] = position
+                elif ir.opcode in JUMP_OPCODES:
+                    self.references[extract_destination_label(ir)] += 1
+                elif ir.opcode is Opcode.JUMPTABLE:
+                    for label in ir.raw_instructions:
+                        self.references[label] += 1
+                elif ir.opcode in (Opcode.ASM, Opcode.ASM_VOLATILE):
+                    for line in ir.raw_instructions:
+                        tokens = line.split()
+                        if len(tokens) > 1 and tokens[0] == "jump":
+                            self.pinned.add(tokens[1])
+
+    def code(self, position: int) -> List[Quadruple]:
+        return [ir for ir in self.blocks[position].instructions if ir.opcode not in NO_CODE_OPCODES]
+
+    def labels(self, position: int) -> List[str]:
+        return [ir.src1 for ir in self.blocks[position].instructions if ir.opcode is Opcode.LABEL]
+
+    def next_code(self, position: int) -> Optional[int]:
+        """Position of the block executed after falling out of position"""
+        for next_position in range(position + 1, len(self.blocks)):
+            if self.code(next_position):
+                return next_position
+        return None
+
+    def falls_into(self, position: int, label: str) -> bool:
+        """Falling out of position reaches label"""
+        target = self.label_position.get(label)
+        return target is not None and target > position \
+            and all(not self.code(between) for between in range(position + 1, target))
+
+    def resolve(self, label: str) -> str:
+        """The label a jump to label ends up at, through blocks that only jump or do nothing"""
+        seen = {label}
+        while True:
+            position = self.label_position.get(label)
+            if position is None:
+                return label
+            code = self.code(position)
+            if len(code) == 1 and code[0].opcode is Opcode.GOTO:
+                following = code[0].src1
+            elif not code:
+                following = None
+                for next_position in range(position + 1, len(self.blocks)):
+                    labels = self.labels(next_position)
+                    if labels:
+                        following = labels[0]
+                        break
+                    if self.code(next_position):
+                        break
+                if following is None:
+                    return label
+            else:
+                return label
+            if following in seen:
+                return label
+            seen.add(following)
+            label = following
+
+    def replace_jump(self, position: int, ir: Optional[Quadruple]):
+        """Replaces the jump ending a block, or removes it"""
+        instructions = self.blocks[position].instructions
+        self.references[extract_destination_label(instructions[-1])] -= 1
+        if ir is None:
+            instructions.pop()
+            return
+        instructions[-1] = ir
+        if ir.opcode in JUMP_OPCODES:
+            self.references[extract_destination_label(ir)] += 1
+
+    def can_move_after(self, position: int, target: int) -> bool:
+        """The block at target runs only after the jump ending position, and never falls through"""
+        if target == position or target == 0:
+            return False
+        labels = self.labels(target)
+        if sum(self.references[label] for label in labels) != 1 or any(label in self.pinned for label in labels):
+            return False
+        code = self.code(target)
+        if not code or code[-1].opcode not in (Opcode.GOTO, Opcode.RETURN):
+            return False
+        for previous in range(target - 1, -1, -1):
+            previous_code = self.code(previous)
+            if previous_code:
+                return previous_code[-1].instruction in NO_CONTINUES
+        return True
+
+    def run(self) -> bool:
+        changed = False
+        for position in range(len(self.blocks)):
+            instructions = self.blocks[position].instructions
+            if not instructions:
+                continue
+            last = instructions[-1]
+            if last.opcode is Opcode.RETURN:
+                # __return right before __funcend
+                following = self.next_code(position)
+                if following is not None and self.code(following)[0].opcode is Opcode.FUNCEND:
+                    instructions.pop()
+                    changed = True
+                continue
+            if last.opcode is Opcode.JUMPTABLE:
+                labels = [self.resolve(label) for label in last.raw_instructions]
+                if labels != list(last.raw_instructions):
+                    for label in last.raw_instructions:
+                        self.references[label] -= 1
+                    instructions[-1] = retarget_table(last, labels)
+                    for label in instructions[-1].raw_instructions or labels[:1]:
+                        self.references[label] += 1
+                    changed = True
+                continue
+            if last.opcode not in JUMP_OPCODES:
+                continue
+            label = extract_destination_label(last)
+            target_label = self.resolve(label)
+            if target_label != label:
+                self.replace_jump(position, retarget(last, target_label))
+                last = instructions[-1]
+                changed = True
+            if self.falls_into(position, target_label):
+                # jumps have no side effects, conditions neither
+                self.replace_jump(position, None)
+                changed = True
+                continue
+            target = self.label_position.get(target_label)
+            if target is None:
+                continue
+            if last.opcode is Opcode.GOTO:
+                target_code = self.code(target)
+                if len(target_code) == 1 and target_code[0].opcode in (Opcode.RETURN, Opcode.FUNCEND):
+                    # both are "set @counter retaddr@f" (or "end")
+                    self.replace_jump(position, Quadruple("__return", target_code[0].src1))
+                    changed = True
+                elif self.can_move_after(position, target):
+                    self.replace_jump(position, None)
+                    moved = self.blocks[target].instructions
+                    instructions.extend(ir for ir in moved if ir.opcode is not Opcode.LABEL)
+                    for moved_label in self.labels(target):
+                        del self.label_position[moved_label]
+                    self.blocks[target].instructions = []
+                    changed = True
+                continue
+            # if c goto L; goto M; :L  ->  ifnot c goto M; :L
+            following = self.next_code(position)
+            if following is None or not is_invertible(last):
+                continue
+            following_code = self.code(following)
+            if len(following_code) != 1 or following_code[0].opcode is not Opcode.GOTO \
+                    or not all(not self.code(between) for between in range(position + 1, following)) \
+                    or any(self.references[label] > 0 or label in self.pinned for label in self.labels(following)) \
+                    or not self.falls_into(following, target_label):
+                continue
+            self.replace_jump(position, invert(last, following_code[0].src1))
+            self.replace_jump(following, None)
+            changed = True
+
+        # blocks without labels merge with the previous one
+        for block in self.blocks:
+            kept = [ir for ir in block.instructions if ir.opcode is not Opcode.LABEL
+                    or self.references[ir.src1] > 0 or ir.src1 in self.pinned]
+            if len(kept) != len(block.instructions):
+                block.instructions = kept
+                changed = True
+        return changed
+
+
+# Machine-independent
+# Input: control flow graph
+# Jump threading (jump tables included), removal of jumps to the next instruction, if/ifnot inversion
+# over an unconditional goto, and block merging: blocks only reached by a goto move
+# right after it, and labels nothing jumps to go away.
+@register_optimizer(
+    name="simplify-cfg",
+    target="basic_block_graph",
+    is_machine_dependent=False,
+    rank=17,
+    optimize_level=1,
+    group="simplify"
+)
+def simplify_control_flow(
+        graph: ControlFlowGraph,
+        current_function_name: str,
+        functions: Dict,
+        known_variable_types: Dict[str, str],
+) -> Changes:
+    changes = Changes.NONE
+    # every round removes a jump, a label or a block, or changes nothing
+    for _ in range(len(graph.order) * 2 + 1):
+        if not ControlFlowCleanup(graph).run():
+            break
+        changes = Changes.ALL
+    return changes
@@ -0,0 +1,106 @@
+import logging
+from typing import List, Optional
+
+from ..intermediate.function import Function
+from ..intermediate.ir_quadruple import Opcode, Quadruple
+from .dataflow import is_local
+from .optimizer_registry import Changes, register_optimizer
+from .pass_manager import Program
+
+logger = logging.getLogger("optimize-sibling-calls")
+
+
+def tail_return(instructions: List[Quadruple], position: int, function_name: str) -> Optional[int]:
+    """Position of the return the call at position is followed by, if nothing but copies of the result
+to locals are in between: the call is then the last thing the function does"""
+    result = f"result@{function_name}"
+    # variable -> what it holds since the call
+    values = {}
+    for i in range(position + 1, len(instructions)):
+        ir = instructions[i]
+        if ir.opcode in (Opcode.RETURN, Opcode.FUNCEND):
+            return i if values.get(result, result) == result else None
+        if ir.opcode is Opcode.DECL:
+            continue
+        if ir.opcode is Opcode.SET and (ir.dest == result or is_local(ir.dest, function_name)):
+            values[ir.dest] = values.get(ir.src1, ir.src1)
+            continue
+        return None
+    return None
+
+
+# Machine-independent
+# Input: whole function, decls are before anything else (see reorder-decls)
+@register_optimizer(
+    name="tail-recursion",
+    target="function",
+    is_machine_dependent=False,
+    rank=3,
+    optimize_level=1
+)
+def eliminate_tail_recursion(func: Function) -> Changes:
+    """return f(n - 1, acc * n); in f jumps back to the beginning of f: the frontend sets the parameters
+once all arguments are evaluated, and result@f is already f's result"""
+    instructions = func.instructions
+    start = f"__MLOGEV_TAIL_RECURSION_{func.name}__"
+    result = []
+    position = 0
+    while position < len(instructions):
+        ir = instructions[position]
+        end = tail_return(instructions, position, func.name) \
+            if ir.opcode is Opcode.CALL and ir.src1 == func.name else None
+        if end is None:
+            result.append(ir)
+            position += 1
+            continue
+        result.append(Quadruple("goto", start))
+        if instructions[end].opcode is Opcode.FUNCEND:
+            result.append(instructions[end])
+        position = end + 1
+    if len(result) == len(instructions):
+        return Changes.NONE
+    entry = 1
+    while entry < len(result) and result[entry].opcode is Opcode.DECL:
+        entry += 1
+    result.insert(entry, Quadruple("label", start))
+    func.instructions = result
+    return Changes.ALL
+
+
+def returns_after(instructions: List[Quadruple], position: int) -> bool:
+    for ir in instructions[position + 1:]:
+        if ir.opcode is not Opcode.LABEL:
+            return ir.opcode in (Opcode.RETURN, Opcode.FUNCEND)
+    return False
+
+
+# Machine-independent
+# Input: the whole program, after every other program optimizer
+@register_optimizer(
+    name="optimize-sibling-calls",
+    target="program",
+    is_machine_dependent=False,
+    rank=60,
+    optimize_level=2,
+)
+def optimize_sibling_calls(program: Program) -> Changes:
+    """A call right before the caller returns becomes __tailcall: the callee returns to where the caller
+would have, which saves the return of the caller. Last of the program optimizers, none of them knows
+__tailcall."""
+    tail_calls = 0
+    for function in program.functions.values():
+        instructions = function.instructions
+        result = []
+        for (position, ir) in enumerate(instructions):
+            if ir.opcode is Opcode.CALL and returns_after(instructions, position):
+                result.append(Quadruple("__tailcall", ir.src1, "", function.name))
+                tail_calls += 1
+            elif ir.opcode is Opcode.RETURN and result and result[-1].opcode is Opcode.TAILCALL:
+                # never reached
+                continue
+            else:
+                result.append(ir)
+        function.instructions = result
+    logger.info(f"{tail_calls} tail calls")
+    program.statistics["tail_calls"] = tail_calls
+    return Changes.ALL if tail_calls else Changes.NONE
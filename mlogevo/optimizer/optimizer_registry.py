@@ -1,4 +1,36 @@
-# name: (function, target, rank)
+from enum import IntFlag
+from typing import Callable, NamedTuple
+
+
+class Changes(IntFlag):
+    """What an optimizer has changed, its return value"""
+    NONE = 0
+    # instructions inside basic blocks
+    INSTRUCTIONS = 1
+    # labels, jumps or block boundaries
+    CONTROL_FLOW = 2
+    ALL = INSTRUCTIONS | CONTROL_FLOW
+
+
+def as_changes(result) -> Changes:
+    """Optimizers that return anything else than Changes or a bool may have changed everything"""
+    if isinstance(result, Changes):
+        return result
+    if isinstance(result, bool):
+        return Changes.ALL if result else Changes.NONE
+    return Changes.ALL
+
+
+class OptimizerPass(NamedTuple):
+    function: Callable
+    target: str
+    rank: int
+    name: str = ""
+    # adjacent passes of the same group repeat until nothing changes, "" runs once
+    group: str = ""
+
+
+# name: OptimizerPass
 machine_independent_optimizers = {}
 machine_dependent_optimizers = {}
 
@@ -18,23 +50,29 @@ mi_flags_per_level = (
 
 
 # Collect optimizers, has side effects
-def register_optimizer(name, target, is_machine_dependent, rank=999, optimize_level=4):
+def register_optimizer(name, target, is_machine_dependent, rank=999, optimize_level=4, group=""):
     """name: in command line, -fremove-unused-labels <-> remove-unused-labels
-target: function, basic_block, basic_block_graph
+target: function, basic_block, basic_block_graph, program
+    function: optimizer(function)
+    basic_block: optimizer(block, function_name, all_functions, variable_types), for each block
+    basic_block_graph: optimizer(graph, function_name, all_functions, variable_types),
+        graph is a backend.control_flow_graph.ControlFlowGraph
+    program: optimizer(program), once all functions are optimized, see pass_manager.Program
+    optimizers return Changes, basic_block optimizers never change control flow
 rank: the lower rank is, the earlier it executes
+group: see pass_manager.PassManager
     """
     def decorator(func):
         def wrapper(*args, **kwargs):
-            func(*args, **kwargs)
+            return func(*args, **kwargs)
         # print(name, target, func)
         dest = machine_independent_optimizers
         flags_per_level = mi_flags_per_level
         if is_machine_dependent:
             dest = machine_dependent_optimizers
             flags_per_level = md_flags_per_level
-        dest[name] = (func, target, rank)
+        dest[name] = OptimizerPass(func, target, rank, name, group)
         flags_per_level[optimize_level].append(name)
 
         return wrapper
     return decorator
-
@@ -0,0 +1,172 @@
+"""
+Runs the optimizers of a function in rank order.
+
+Every optimizer returns Changes. The control flow graph is shared by block and graph
+optimizers until one of them changes control flow, or a function optimizer changes
+anything; analyses kept in graph.analyses are dropped whenever instructions change.
+
+Adjacent optimizers of the same group run again, as a whole, while any of them still
+changes something: at most max_iterations times. An optimizer that has spent more than
+time_budget seconds on a function is not repeated (this makes the output depend on
+the machine, so there is no time budget by default).
+
+Optimizers with target "program" run once all functions are optimized, on a Program:
+they may replace the instructions of functions, and have them optimized again.
+"""
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from ..backend.control_flow_graph import ControlFlowGraph
+from ..intermediate.function import Function
+from ..intermediate.ir_quadruple import Quadruple
+from .optimizer_registry import Changes, OptimizerPass, as_changes
+
+# -O level -> max_iterations
+DEFAULT_ITERATIONS = (1, 1, 4, 8)
+# -mmax-instructions=N: instructions a processor holds
+DEFAULT_MAX_INSTRUCTIONS = 1000
+
+
+@dataclass
+class PassStatistics:
+    runs: int = 0
+    # runs that changed something
+    changes: int = 0
+    seconds: float = 0.0
+
+
+class FunctionState:
+    """A function being optimized, its instructions are in either the function or the graph"""
+    def __init__(self, function: Function, machine_dependents: Sequence[str] = (),
+                 block_counts: Optional[Dict[int, int]] = None):
+        self.function = function
+        self.machine_dependents = machine_dependents
+        self.block_counts = block_counts
+        self.graph: Optional[ControlFlowGraph] = None
+        # function.instructions is the same as the graph
+        self.synced = True
+
+    def get_graph(self) -> ControlFlowGraph:
+        if self.graph is None:
+            self.graph = ControlFlowGraph(self.function.instructions, self.machine_dependents, self.block_counts)
+            self.synced = True
+        return self.graph
+
+    def get_function(self) -> Function:
+        if not self.synced:
+            self.function.instructions = self.graph.instructions()
+            self.synced = True
+        return self.function
+
+    def changed(self, changes: Changes, on_graph: bool):
+        if not changes:
+            return
+        if not on_graph:
+            self.graph = None
+            return
+        self.synced = False
+        if changes & Changes.CONTROL_FLOW:
+            self.get_function()
+            self.graph = None
+        else:
+            self.graph.analyses.clear()
+
+
+class Program:
+    """The functions of the output, for optimizers with target "program"."""
+    def __init__(self, global_instructions: List[Quadruple], functions: Dict[str, Function],
+                 all_functions: Dict[str, Function], variable_types: Dict[str, str],
+                 machine_dependents: Sequence[str], max_instructions: int,
+                 count_instructions: Callable[[List[Quadruple]], int],
+                 reoptimize: Callable[[Function], None]):
+        self.global_instructions = global_instructions
+        # functions in the output, inline functions are not
+        self.functions = functions
+        self.all_functions = all_functions
+        self.variable_types = variable_types
+        self.machine_dependents = machine_dependents
+        self.max_instructions = max_instructions
+        # instructions of an IR list in the output, labels excluded
+        self.count_instructions = count_instructions
+        # runs the "simplify" optimizers on a function whose instructions were replaced
+        self.reoptimize = reoptimize
+        # what optimizers did, name -> number (see CompileResult.stats)
+        self.statistics: Dict[str, float] = {}
+
+    def size(self) -> int:
+        """Instructions of the output"""
+        return self.count_instructions(self.global_instructions) \
+            + sum(self.count_instructions(function.instructions) for function in self.functions.values())
+
+
+def optimizer_name(optimizer_pass: OptimizerPass) -> str:
+    return optimizer_pass.name or optimizer_pass.function.__name__
+
+
+class PassManager:
+    def __init__(self, passes: List[OptimizerPass], max_iterations=1, time_budget: Optional[float] = None,
+                 statistics: Optional[Dict[str, PassStatistics]] = None, machine_dependents: Sequence[str] = (),
+                 profile: Optional[Dict[str, Dict[int, int]]] = None):
+        self.machine_dependents = machine_dependents
+        # -fprofile-use: function name -> block counts (see ControlFlowGraph)
+        self.profile = profile
+        self.max_iterations = max(max_iterations, 1)
+        self.time_budget = time_budget
+        # optimizer name -> statistics of all runs
+        self.statistics: Dict[str, PassStatistics] = {} if statistics is None else statistics
+        # [(passes, repeat)]
+        self.schedule: List[tuple] = []
+        for optimizer_pass in passes:
+            optimizer_pass = OptimizerPass(*optimizer_pass)
+            if optimizer_pass.group and self.schedule and self.schedule[-1][0][-1].group == optimizer_pass.group:
+                self.schedule[-1][0].append(optimizer_pass)
+            else:
+                self.schedule.append(([optimizer_pass], optimizer_pass.group != ""))
+
+    def run_pass(self, optimizer_pass: OptimizerPass, state: FunctionState,
+                 all_functions: Dict[str, Function], variable_types: Dict[str, str]) -> Changes:
+        optimizer, target = optimizer_pass.function, optimizer_pass.target
+        name = state.function.name
+        if target == "function":
+            changes = as_changes(optimizer(state.get_function()))
+        elif target == "basic_block":
+            graph = state.get_graph()
+            changes = Changes.NONE
+            for block_id in graph.order:
+                changes |= as_changes(optimizer(graph.blocks[block_id], name, all_functions, variable_types))
+        elif target == "basic_block_graph":
+            changes = as_changes(optimizer(state.get_graph(), name, all_functions, variable_types))
+        else:
+            raise ValueError(f"unknown optimizer target {target}")
+        state.changed(changes, target != "function")
+        return changes
+
+    def run(self, function: Function, all_functions: Dict[str, Function],
+            variable_types: Dict[str, str]) -> Changes:
+        block_counts = None if self.profile is None else self.profile.get(function.name, {})
+        state = FunctionState(function, self.machine_dependents, block_counts)
+        result = Changes.NONE
+        # optimizer name -> seconds spent on this function
+        spent: Dict[str, float] = {}
+        for (passes, repeat) in self.schedule:
+            for iteration in range(self.max_iterations if repeat else 1):
+                changes = Changes.NONE
+                for optimizer_pass in passes:
+                    name = optimizer_name(optimizer_pass)
+                    if iteration > 0 and self.time_budget is not None and spent[name] > self.time_budget:
+                        continue
+                    begin = time.perf_counter()
+                    pass_changes = self.run_pass(optimizer_pass, state, all_functions, variable_types)
+                    seconds = time.perf_counter() - begin
+                    spent[name] = spent.get(name, 0.0) + seconds
+                    statistics = self.statistics.setdefault(name, PassStatistics())
+                    statistics.runs += 1
+                    statistics.changes += int(pass_changes != Changes.NONE)
+                    statistics.seconds += seconds
+                    changes |= pass_changes
+                result |= changes
+                if not changes:
+                    break
+        state.get_function()
+        return result
@@ -59,6 +59,12 @@ def mlog_jump_always(label: str) -> List[str]:
     return [inst, ]
 
 
+@mlog_ir_impl("__jumptable")
+def mlog_jump_table(index, labels) -> List[str]:
+    # @counter is the address of the next instruction, the first jump of the table
+    return [F"op add @counter @counter {index}", *(F"jump {label} always 0 0" for label in labels)]
+
+
 @mlog_ir_impl("if")
 def mlog_jump_if(arg1, rel_op, arg2, label) -> List[str]:
     op = rel_op.split("_")[0]
@@ -213,6 +219,16 @@ def mlog_call(function_name) -> List[str]:
     ]
 
 
+@mlog_ir_impl("__tailcall")
+def mlog_tail_call(function_name, caller) -> List[str]:
+    # returns where caller would have, main() returns to the start of the program (like "end")
+    return_address = "0" if caller == "main" else F"retaddr@{caller}"
+    return [
+        F"set retaddr@{function_name} {return_address}",
+        F"jump {function_name} always 1 1"
+    ]
+
+
 @mlog_ir_impl("__funcend")
 @mlog_ir_impl("__return")
 def mlog_return(function_name) -> List[str]:
@@ -42,6 +42,15 @@ class IRtoMlogConverter(AbstractIRConverter):
             results = strip_labels(results)
         return "\n".join(results)
 
+    def count_instructions(self, ir_list) -> int:
+        """Instructions of the output for ir_list, labels excluded"""
+        count = 0
+        for quadruple in ir_list:
+            for line in self.convert_single_quadruple(quadruple):
+                if line.strip() and not line.endswith(":"):
+                    count += 1
+        return count
+
     def convert_single_quadruple(self, quadruple: Quadruple) -> List[str]:
         instruction = quadruple.instruction
         src1, src2, dest = quadruple.src1, quadruple.src2, quadruple.dest
@@ -58,6 +67,10 @@ class IRtoMlogConverter(AbstractIRConverter):
             return handler(src1)
         if instruction in O1_INSTRUCTIONS:
             return handler(dest)
+        if instruction == "__tailcall":
+            return handler(src1, dest)
+        if instruction == "__jumptable":
+            return handler(src1, quadruple.raw_instructions)
         if instruction in I1O1_INSTRUCTIONS:
             result = handler(src1, dest)
             if self.strict_32bit:
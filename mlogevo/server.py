@@ -0,0 +1,192 @@
+"""
+Compile server: `mlogevo --serve [SOCKET]`
+
+Reads one JSON request per line, from stdin or from every client of a Unix socket:
+    {"id": 1, "source": "void main() {...}", "filename": "a.c", "flags": ["-O2"], "include_dirs": ["inc"]}
+and answers one JSON line per request:
+    {"id": 1, "status": 0, "output": "...", "diagnostics": []}
+    {"id": 1, "status": 1, "output": null, "diagnostics": [{"coord": "a.c:3", "message": "..."}]}
+
+Only "source" is required. Worker processes (up to -j) keep the parser, the builtin
+preprocessor's header cache and one backend per set of flags between requests.
+On stdio, answers may come out of order, match them by "id".
+"""
+import json
+import os
+import socketserver
+import sys
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Set, TYPE_CHECKING
+
+from .frontend import CompilationError
+from .api import CompileOptions, compile_source
+from .driver import make_cache, options_from_args
+if TYPE_CHECKING:
+    from .backend import Backend
+
+# Per-process state, created by initialize_server_worker()
+_worker_backends: Dict[str, "Backend"] = {}
+
+
+def initialize_server_worker():
+    # Load parser tables and optimizers before the first request arrives
+    from .frontend.gnuc_parser import get_parser
+    get_parser()
+    from .backend import backend
+
+
+def get_backend(options: CompileOptions):
+    key = json.dumps(options.cache_options(), sort_keys=True)
+    if key not in _worker_backends:
+        _worker_backends[key] = options.make_backend()
+    return _worker_backends[key]
+
+
+def compile_request(args, source_text: str, filename: str) -> dict:
+    """Runs in a worker, returns the response without "id" """
+    cache = make_cache(args)
+    options = options_from_args(args)
+    try:
+        output = compile_source(source_text, options, filename, get_backend(options), cache).output
+        return {"status": 0, "output": output, "diagnostics": []}
+    except CompilationError as exception:
+        error_info = exception.error_info
+        # coord may be a pycparser Coord
+        diagnostic = {"coord": str(error_info.get("coord") or filename),
+                      "message": str(error_info.get("reason", exception))}
+    # cpp and parser failures
+    except Exception as exception:
+        diagnostic = {"coord": filename, "message": str(exception)}
+    finally:
+        if cache is not None:
+            cache.record_stats()
+    return {"status": 1, "output": None, "diagnostics": [diagnostic]}
+
+
+def error_response(request_id, message: str) -> dict:
+    return {"id": request_id, "status": 1, "output": None,
+            "diagnostics": [{"coord": "", "message": message}]}
+
+
+class CompileServer:
+    def __init__(self, parser, workers: int):
+        self.parser = parser
+        self.workers = workers
+        if workers == 1:
+            # no need to fork, compile in a background thread of this process
+            self.executor: Executor = ThreadPoolExecutor(max_workers=1, initializer=initialize_server_worker)
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=initialize_server_worker)
+        # requests not answered yet, cancelled when the server stops
+        self.pending: Set[Future] = set()
+        self.pending_lock = threading.Lock()
+
+    def parse_request_args(self, request: dict):
+        """Parse "flags" like the command line, raises ValueError if invalid"""
+        flags: List[str] = list(request.get("flags", []))
+        for include_dir in request.get("include_dirs", []):
+            flags += ["-I", include_dir]
+        try:
+            # any positional argument will do, the source comes from the request
+            args = self.parser.parse_args(flags + ["--", request.get("filename", "<stdin>")])
+        except SystemExit:
+            raise ValueError(f"invalid flags: {' '.join(flags)}")
+        # stdout may be the channel of responses
+        args.print_basic_blocks = False
+        return args
+
+    def submit(self, line: str, callback):
+        """Parse one request line and compile it in a worker, callback receives the response"""
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict) or not isinstance(request.get("source"), str):
+                raise ValueError("request should be a JSON object with a \"source\" string")
+            request_id = request.get("id")
+            args = self.parse_request_args(request)
+        except ValueError as e:
+            callback(error_response(request_id, str(e)))
+            return
+        future = self.executor.submit(compile_request, args, request["source"],
+                                      request.get("filename", "<stdin>"))
+        with self.pending_lock:
+            self.pending.add(future)
+
+        def done(finished_future):
+            with self.pending_lock:
+                self.pending.discard(finished_future)
+            if finished_future.cancelled():
+                return
+            try:
+                response = finished_future.result()
+            except Exception as e:
+                response = error_response(request_id, f"internal error: {e!r}")
+            callback({"id": request_id, **response})
+        future.add_done_callback(done)
+
+    def serve_stdio(self, input_file=sys.stdin, output_file=sys.stdout):
+        output_lock = threading.Lock()
+
+        def write_response(response: dict):
+            with output_lock:
+                output_file.write(json.dumps(response) + "\n")
+                output_file.flush()
+
+        for line in input_file:
+            if line.strip():
+                self.submit(line, write_response)
+        # answer everything before closing
+        self.executor.shutdown(wait=True)
+
+    def stop(self):
+        """Cancel the requests still waiting for a worker, without waiting for the running ones"""
+        # not shutdown(cancel_futures=True), which needs Python 3.9
+        with self.pending_lock:
+            pending = list(self.pending)
+        for future in pending:
+            future.cancel()
+        self.executor.shutdown(wait=False)
+
+    def serve_unix_socket(self, path: str):
+        compile_server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    responses = []
+                    finished = threading.Event()
+
+                    def receive(response: dict):
+                        responses.append(response)
+                        finished.set()
+                    compile_server.submit(line.decode(), receive)
+                    finished.wait()
+                    self.wfile.write(json.dumps(responses[0]).encode() + b"\n")
+                    self.wfile.flush()
+
+        if os.path.exists(path):
+            os.unlink(path)
+        # one thread per client, they share the workers
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+            server.daemon_threads = True
+            print(f"mlogevo: listening on {path}", file=sys.stderr)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.unlink(path)
+                compile_server.stop()
+
+
+def serve(parser, args):
+    from .batch import get_worker_count
+    workers = get_worker_count(args.jobs, os.cpu_count() or 1)
+    compile_server = CompileServer(parser, workers)
+    if args.serve == "-":
+        compile_server.serve_stdio()
+    else:
+        compile_server.serve_unix_socket(args.serve)
@@ -0,0 +1,63 @@
+"""
+Watch mode: `mlogevo --watch a.c -o a.mlog`
+
+Recompiles whenever the source file or one of its headers changes. The backend
+keeps optimized functions between compilations (see backend.function_cache),
+so only edited functions and their callers are optimized again.
+"""
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from .api import compile_source
+from .driver import options_from_args, report_compilation_error, write_output
+from .frontend import CompilationError
+
+POLL_INTERVAL = 0.25
+
+
+def snapshot(paths: List[str]) -> Dict[str, Optional[int]]:
+    result = {}
+    for path in paths:
+        try:
+            result[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            result[path] = None
+    return result
+
+
+def compile_once(source_file: str, output_file: str, options, backend) -> List[str]:
+    """Compile and report to stderr, returns the files to watch"""
+    begin = time.perf_counter()
+    try:
+        with open(source_file, "r") as f:
+            result = compile_source(f, options, source_file, backend)
+    except CompilationError as exception:
+        report_compilation_error(exception, source_file)
+        return [source_file]
+    # cpp and parser failures
+    except Exception as exception:
+        print(f"{source_file}: error: {exception}", file=sys.stderr)
+        return [source_file]
+    write_output(result.output, output_file)
+    function_cache = backend.function_cache
+    total = function_cache.hits + function_cache.misses
+    print(f"{source_file}: compiled in {(time.perf_counter() - begin) * 1000:.0f} ms, "
+          f"optimized {function_cache.misses} of {total} functions", file=sys.stderr)
+    return result.dependencies or [source_file]
+
+
+def watch(args, source_file: str, output_file: str):
+    options = options_from_args(args)
+    # -print-basic-blocks disables the function cache, and it is meant for single runs anyway
+    options.dump_blocks = False
+    backend = options.make_backend()
+    backend.enable_function_cache()
+    try:
+        while True:
+            watched = snapshot(compile_once(source_file, output_file, options, backend))
+            while snapshot(list(watched.keys())) == watched:
+                time.sleep(POLL_INTERVAL)
+    except KeyboardInterrupt:
+        pass